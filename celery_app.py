@@ -1,5 +1,5 @@
 from celery import Celery
-from config import REDIS_URL
+from config import REDIS_URL, SHEETS_FLUSH_INTERVAL, NOTIFY_FLUSH_INTERVAL
 
 celery_app = Celery(
     "tasks",
@@ -17,6 +17,14 @@ celery_app.conf.update(
         "check-pending-every-30s": {
             "task": "tasks.periodic_check_pending_transactions",
             "schedule": 20.0,
+        },
+        "flush-sheets-queue": {
+            "task": "tasks.flush_sheets_queue",
+            "schedule": SHEETS_FLUSH_INTERVAL,
+        },
+        "flush-notifications": {
+            "task": "tasks.flush_notifications",
+            "schedule": NOTIFY_FLUSH_INTERVAL,
         }
     }
 )
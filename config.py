@@ -19,10 +19,20 @@ GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY')
 
 # URL для получения курсов валют
 CSV_URL = os.getenv('CSV_URL')
+CSV_RATES_TTL = float(os.getenv('CSV_RATES_TTL', '60'))   # сек между перепроверками CSV (If-None-Match / If-Modified-Since)
 
 LOGO_PATH = os.getenv('LOGO_PATH')
+# QR коды кошельков (utils/generate_qr_code.py): картинки в памяти и на диске, file_id из Telegram — в Redis
+QR_CACHE_DIR = os.getenv('QR_CACHE_DIR', '.cache/qr')
+QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', '32'))     # картинок в памяти процесса
 # URL для получения адресов кошельков
 WALLET_SHEET_URL = os.getenv('WALLET_SHEET_URL')
+# Интервал фонового обновления адресов кошельков из Google Sheets (сек)
+WALLET_REFRESH_INTERVAL = int(os.getenv('WALLET_REFRESH_INTERVAL', '300'))
+# Интервал перечитывания правил комиссий (лист «Комиссии»), сек; таблица пересобирается только при изменении листа
+COMMISSION_REFRESH_INTERVAL = int(os.getenv('COMMISSION_REFRESH_INTERVAL', '60'))
+# Курс USDT/USD (лист «Курсы»): сколько секунд отдаётся значение из памяти до фонового обновления
+EXCHANGE_RATE_TTL = int(os.getenv('EXCHANGE_RATE_TTL', '60'))
 
 # API ключи для проверки транзакций
 TRONSCAN_API_KEY = os.getenv('TRONSCAN_API_KEY')
@@ -30,10 +40,72 @@ ETHERSCAN_API_KEY = os.getenv('ETHERSCAN_API_KEY')
 BSCSCAN_API_KEY = os.getenv('BSCSCAN_API_KEY')
 # TRONSCAN не требует API ключа для базовых запросов
 
+# Пул HTTP соединений (utils/http_session.py)
+HTTP_POOL_LIMIT = int(os.getenv('HTTP_POOL_LIMIT', '100'))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv('HTTP_POOL_LIMIT_PER_HOST', '20'))
+
+# Уведомления из воркеров (utils/notifier.py): общий Bot и его пул соединений
+NOTIFY_POOL_LIMIT = int(os.getenv('NOTIFY_POOL_LIMIT', '20'))
+TELEGRAM_API_SERVER = os.getenv('TELEGRAM_API_SERVER')                  # свой Bot API сервер, например http://127.0.0.1:8081
+
+# Очередь исходящих сообщений Telegram (utils/notify_queue.py): лимиты Bot API и сводки для админов
+NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', '25'))       # сообщений в секунду на бота
+NOTIFY_GLOBAL_BURST = int(os.getenv('NOTIFY_GLOBAL_BURST', '5'))        # всплеск сверх rate (за секунду не больше rate + burst)
+NOTIFY_CHAT_RATE = float(os.getenv('NOTIFY_CHAT_RATE', '1'))            # в секунду в один личный чат
+NOTIFY_GROUP_RATE = float(os.getenv('NOTIFY_GROUP_RATE', str(20 / 60))) # в секунду в одну группу
+NOTIFY_FLUSH_INTERVAL = float(os.getenv('NOTIFY_FLUSH_INTERVAL', '1'))  # период запуска sender (сек)
+NOTIFY_FLUSH_MAX_SECONDS = float(os.getenv('NOTIFY_FLUSH_MAX_SECONDS', '10'))  # макс. длительность одного прохода
+NOTIFY_FLUSH_MAX_ITEMS = int(os.getenv('NOTIFY_FLUSH_MAX_ITEMS', '200'))      # чатов за один проход, сводок в одной склейке
+NOTIFY_DIGEST_THRESHOLD = int(os.getenv('NOTIFY_DIGEST_THRESHOLD', '20'))  # с какой длины очереди чата склеивать сводки
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '5'))            # попыток до dead-letter
+
 TRC20_CONFIRMATIONS = int(os.getenv('TRC20_CONFIRMATIONS'))
 TRONSCAN_API = os.getenv('TRONSCAN_API')
+
+# TRC20: проверка через историю входящих переводов наших кошельков (networks/tron_watcher.py)
+TRON_WATCH_ENABLED = os.getenv('TRON_WATCH_ENABLED', '1') == '1'
+TRON_WATCH_LOOKBACK = int(os.getenv('TRON_WATCH_LOOKBACK', str(3 * 60 * 60)))   # сек истории при первом опросе
+TRON_WATCH_PAGE_SIZE = int(os.getenv('TRON_WATCH_PAGE_SIZE', '50'))
+TRON_WATCH_MAX_PAGES = int(os.getenv('TRON_WATCH_MAX_PAGES', '20'))
 ERC20_CONFIRMATIONS = int(os.getenv('ERC20_CONFIRMATIONS'))
 
+# Лимит запросов к Etherscan (общий для бота и всех воркеров) и кэш последнего блока
+ETHERSCAN_RATE_LIMIT = float(os.getenv('ETHERSCAN_RATE_LIMIT', '5'))   # запросов в секунду
+ETHERSCAN_RATE_BURST = int(os.getenv('ETHERSCAN_RATE_BURST', '5'))     # максимальный всплеск
+LATEST_BLOCK_TTL = float(os.getenv('LATEST_BLOCK_TTL', '4'))           # сек
+
+# Пакетная проверка pending ERC20: параллельность и (опционально) JSON-RPC узел
+ERC20_BATCH_CONCURRENCY = int(os.getenv('ERC20_BATCH_CONCURRENCY', '10'))
+ETH_RPC_URL = os.getenv('ETH_RPC_URL')                                  # например https://.../v3/<key>
+ETH_RPC_BATCH_SIZE = int(os.getenv('ETH_RPC_BATCH_SIZE', '100'))
+
+# ERC20: проверка через логи Transfer USDT на наши кошельки (networks/eth_watcher.py)
+ETH_WATCH_ENABLED = os.getenv('ETH_WATCH_ENABLED', '1') == '1'
+ETH_WATCH_LOOKBACK_BLOCKS = int(os.getenv('ETH_WATCH_LOOKBACK_BLOCKS', '900'))  # блоков истории при первом опросе (~3 ч)
+ETH_WATCH_MAX_RANGE = int(os.getenv('ETH_WATCH_MAX_RANGE', '1000'))             # блоков на один getLogs
+ETH_WATCH_PAGE_SIZE = int(os.getenv('ETH_WATCH_PAGE_SIZE', '1000'))             # логов на страницу Etherscan
+
+# Кэш timestamp блоков: LRU в памяти процесса + (если TTL > 0) общий уровень в Redis
+BLOCK_TS_CACHE_SIZE = int(os.getenv('BLOCK_TS_CACHE_SIZE', '4096'))
+BLOCK_TS_REDIS_TTL = int(os.getenv('BLOCK_TS_REDIS_TTL', '86400'))     # сек, 0 — без Redis
+
+# Asyncio-воркер проверки pending транзакций (verifier.py)
+VERIFIER_INTERVAL = float(os.getenv('VERIFIER_INTERVAL', '5'))          # сек между тиками расписания
+VERIFIER_CONCURRENCY = int(os.getenv('VERIFIER_CONCURRENCY', '200'))    # одновременных проверок
+
+# Расписание проверок pending транзакций (Redis sorted set по времени следующей проверки)
+PENDING_RECHECK_INTERVAL = float(os.getenv('PENDING_RECHECK_INTERVAL', '20'))  # сек до повторной проверки
+PENDING_DUE_BATCH = int(os.getenv('PENDING_DUE_BATCH', '1000'))               # транзакций за тик
+PENDING_CHUNK_SIZE = int(os.getenv('PENDING_CHUNK_SIZE', '200'))              # транзакций на задачу воркера
+
+# Адаптивный интервал повторной проверки (utils/poll_policy.py)
+ETH_BLOCK_TIME = float(os.getenv('ETH_BLOCK_TIME', '12'))              # сек на блок
+TRON_BLOCK_TIME = float(os.getenv('TRON_BLOCK_TIME', '3'))
+TRON_SOLIDIFY_BLOCKS = int(os.getenv('TRON_SOLIDIFY_BLOCKS', '19'))    # блоков до confirmed в Tronscan
+POLL_MIN_DELAY = float(os.getenv('POLL_MIN_DELAY', '5'))
+POLL_MAX_DELAY = float(os.getenv('POLL_MAX_DELAY', '300'))
+POLL_BACKOFF_BASE = float(os.getenv('POLL_BACKOFF_BASE', '10'))        # первая пауза для неизвестного хеша
+
 
 REDIS_URL = os.getenv('REDIS_URL')
 REDIS_DB_FSM = os.getenv('REDIS_DB_FSM')
@@ -42,6 +114,19 @@ REDIS_BACKEND_DB = os.getenv('REDIS_BACKEND_DB')
 REDIS_KEY_PREFIX_ERC = os.getenv('REDIS_KEY_PREFIX_ERC')
 REDIS_KEY_PREFIX_TRC = os.getenv('REDIS_KEY_PREFIX_TRC')
 
+# Пулы соединений Redis (utils/redis_pool.py): по пулу на базу в процессе (sync) и на event loop (async)
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '50'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))         # сек ожидания свободного соединения
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '3'))
+REDIS_SLOW_MS = float(os.getenv('REDIS_SLOW_MS', '100'))                 # команды дольше — в лог
+REDIS_STATS_INTERVAL = float(os.getenv('REDIS_STATS_INTERVAL', '300'))   # сек между сводками в лог, 0 — выкл
+
+# Отложенная запись в Google Sheets (utils/sheets_queue.py)
+SHEETS_FLUSH_INTERVAL = float(os.getenv('SHEETS_FLUSH_INTERVAL', '5'))        # период flush (сек)
+SHEETS_FLUSH_BATCH_SIZE = int(os.getenv('SHEETS_FLUSH_BATCH_SIZE', '50'))     # порог внеочередного flush
+SHEETS_FLUSH_MAX_ITEMS = int(os.getenv('SHEETS_FLUSH_MAX_ITEMS', '500'))      # макс. элементов за один flush
+SHEETS_FLUSH_MAX_ATTEMPTS = int(os.getenv('SHEETS_FLUSH_MAX_ATTEMPTS', '5'))  # попыток до dead-letter
+
 
 
 # ID чата администратора для заявок
@@ -52,6 +137,16 @@ TELEGRAM_API_ID = os.getenv('TELEGRAM_API_ID')            # укажи свой
 TELEGRAM_API_HASH = os.getenv('TELEGRAM_API_HASH')         # укажи свой api_hash с my.telegram.org
 TELETHON_SESSION = os.getenv('TELETHON_SESSION')  # имя файла сессии (создастся после логина)
 
+RATES_CHANNEL = os.getenv('RATES_CHANNEL', '@obmenvalut13')  # канал с курсами (utils/channel_rates.py, rates_ingest.py)
+
+# Кэш курсов из канала (utils/rates_cache.py): память процесса -> снимок в Redis -> разбор канала
+RATES_FRESH_TTL = float(os.getenv('RATES_FRESH_TTL', '300'))            # сек, после — фоновое обновление
+RATES_MEMORY_TTL = float(os.getenv('RATES_MEMORY_TTL', '10'))           # сек до сверки копии в памяти с Redis
+RATES_STALE_TTL = int(os.getenv('RATES_STALE_TTL', '86400'))            # сек хранения снимка в Redis (отдаётся устаревшим)
+RATES_REFRESH_LOCK_TTL = int(os.getenv('RATES_REFRESH_LOCK_TTL', '30')) # сек; после неудачного разбора — пауза до повтора
+RATES_COLD_WAIT = float(os.getenv('RATES_COLD_WAIT', '10'))             # сек ожидания чужого обновления, если снимка нет
+RATES_INGEST_LOCK_RENEW = float(os.getenv('RATES_INGEST_LOCK_RENEW', '10'))  # сек; rates_ingest.py продлевает lock обновления
+
 GOOGLE_CREDENTIALS  = {
     "type": os.getenv("GOOGLE_TYPE"),
     "project_id": os.getenv("GOOGLE_PROJECT_ID"),
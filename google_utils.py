@@ -11,6 +11,11 @@ from config import logger, GOOGLE_CREDENTIALS
 import datetime
 
 from utils.decode_etc20 import decode_erc20_input
+from utils.sheets_client import get_worksheet
+from utils import row_index
+from gspread.utils import rowcol_to_a1
+from utils.wallet_registry import wallet_registry
+from utils.sheets_queue import aenqueue_append
 
 from networks.tron import check_tron_transaction
 
@@ -50,27 +55,11 @@ ERC20_CONFIRMATIONS = 6
 
 def get_wallet_address(network: str) -> str:
     """
-    Получает адрес кошелька для указанной сети из Google Sheets (Лист3)
+    Получает адрес кошелька для указанной сети (Лист3).
+    Берёт из реестра адресов (память / Redis), к таблице идёт только если снимка нет.
     """
     try:
-        # Подключаемся к Google Sheets
-        scope = ['https://spreadsheets.google.com/feeds',
-                 'https://www.googleapis.com/auth/drive']
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-        client = gspread.authorize(creds)
-
-        # Открываем таблицу и лист "Лист3"
-        sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet('Лист3')
-
-        # Получаем все строки таблицы
-        records = sheet.get_all_records()
-
-        for row in records:
-            # row['Сеть'] должно совпадать с названием сети
-            if row.get(' Сеть', '').strip().upper() == network.strip().upper():
-                return row.get('Адрес кошелька')
-
-        return None  # Если не нашли сеть
+        return wallet_registry.lookup(network)
     except Exception as e:
         print(f"Ошибка при получении адреса кошелька: {e}")
         traceback.print_exc()
@@ -94,17 +83,11 @@ async def verify_transaction(tx_hash: str, network: str, target_address: str, us
 
 def save_transaction_hash(google_params) -> bool:
     try:
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-        client = gspread.authorize(creds)
+        sheet = get_worksheet('Лист4')
 
-        sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet('Лист4')
-
-
-        sheet.append_row(google_params, value_input_option='USER_ENTERED')
+        response = sheet.append_row(google_params, value_input_option='USER_ENTERED')
+        # Запоминаем строку, чтобы обновлять статус без sheet.find (хеш — 2-я колонка)
+        row_index.record_appended('Лист4', [google_params[1]], response)
         print(f"✅ Запись добавлена: {google_params}")
         return True
 
@@ -114,15 +97,8 @@ def save_transaction_hash(google_params) -> bool:
 
 def save_crypto_request_to_sheet(data: dict) -> bool:
     try:
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-        client = gspread.authorize(creds)
-        
-        # Открываем таблицу и выбираем "Лист5"
-        sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet('Лист5')
+        # Открываем "Лист5"
+        sheet = get_worksheet('Лист5')
         
         row = [
             data.get('currency', ''),
@@ -144,44 +120,67 @@ def save_crypto_request_to_sheet(data: dict) -> bool:
 
 def update_transaction_status(transaction_hash: str, google_update_params) -> bool:
     try:
-        # Авторизация
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-        client = gspread.authorize(creds)
-
         # Открываем нужный лист
-        sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet('Лист4')
-
-        # Ищем ячейку с transaction_hash
-        cell = sheet.find(transaction_hash)
-
-        if cell:
-            # Допустим, колонка статуса — это 5-я колонка (как в твоей функции)
-            for k, z in google_update_params.items():
-                value_to_write, col_number = z[0], z[1]
-                status_cell = sheet.cell(cell.row, col_number)
-                
-                logger.info(f"[google_utils] Проверка колонки {col_number} (текущее='{status_cell.value}', новое='{value_to_write}')")
-
-                if status_cell.value != value_to_write:
-                    sheet.update_cell(cell.row, col_number, value_to_write)
-                    print(f"✅ Колонка {col_number} обновлена на '{value_to_write}' для транзакции {transaction_hash}")
-                    # return True
-                else:
-                    print(f"⚠️ Колонка {col_number} уже установлена как '{value_to_write}'")
-                    # return False
-        else:
+        sheet = get_worksheet('Лист4')
+
+        # Строка транзакции из индекса, сверенная с ячейкой хеша (чтение колонки — только при промахе)
+        row = row_index.resolve_rows('Лист4', [transaction_hash]).get(transaction_hash)
+        if not row:
             print(f"❌ Транзакция {transaction_hash} не найдена")
             return False
 
+        # Все колонки одной транзакции — одним batch_update
+        data = []
+        for k, z in google_update_params.items():
+            value_to_write, col_number = z[0], z[1]
+            data.append({"range": rowcol_to_a1(row, col_number), "values": [[value_to_write]]})
+
+        sheet.batch_update(data, value_input_option='USER_ENTERED')
+        print(f"✅ Колонки {[z[1] for z in google_update_params.values()]} обновлены для транзакции {transaction_hash}")
+        return True
+
     except Exception as e:
         print(f"❌ Ошибка при обновлении статуса: {e}")
         return False
 
 
+def build_cash_exchange_row(data: dict):
+    """
+    Определяет лист и формирует строку заявки на обмен наличных.
+    Возвращает (sheet_name, row) или None, если операция неизвестна.
+    """
+    # Определяем лист в зависимости от операции
+    operation = (data.get('operation', '') or '').strip()
+    # Поддерживаем все локали: RU/UA/EN
+    buy_variants = {'Купить USD', 'Купити USD', 'Buy USD'}
+    sell_variants = {'Продать USD', 'Продати USD', 'Sell USD'}
+
+    if any(v in operation for v in buy_variants):
+        # Клиент покупает USD за UAH → лист "Заявка на обмен UAH → USD"
+        sheet_name = 'Заявка на обмен UAH → USD'
+    elif any(v in operation for v in sell_variants):
+        # Клиент продает USD за UAH → лист "Заявка на обмен USD → UAH"
+        sheet_name = 'Заявка на обмен USD → UAH'
+    else:
+        print(f"❌ Неизвестная операция: {operation}")
+        return None
+
+    # Формируем строку для записи
+    row = [
+        datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),  # Дата и время
+        data.get('operation', ''),  # Операция (Купить/Продать USD)
+        data.get('amount', ''),  # Сумма USD
+        data.get('city', ''),  # Город
+        data.get('branch', ''),  # Отделение
+        data.get('time', ''),  # Время визита
+        data.get('name', ''),  # Имя клиента
+        data.get('phone', ''),  # Телефон
+        data.get('telegram', ''),  # Telegram username
+        'Новая'  # Статус заявки
+    ]
+    return sheet_name, row
+
+
 def save_cash_exchange_request_to_sheet(data: dict) -> bool:
     """
     Сохраняет заявку на обмен наличных в соответствующий лист Google таблицы
@@ -190,45 +189,13 @@ def save_cash_exchange_request_to_sheet(data: dict) -> bool:
         data: словарь с данными заявки, должен содержать 'operation' для определения листа
     """
     try:
-        scope = [
-            'https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive'
-        ]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-        client = gspread.authorize(creds)
-        
-        # Определяем лист в зависимости от операции
-        operation = (data.get('operation', '') or '').strip()
-        # Поддерживаем все локали: RU/UA/EN
-        buy_variants = {'Купить USD', 'Купити USD', 'Buy USD'}
-        sell_variants = {'Продать USD', 'Продати USD', 'Sell USD'}
-
-        if any(v in operation for v in buy_variants):
-            # Клиент покупает USD за UAH → лист "Заявка на обмен UAH → USD"
-            sheet_name = 'Заявка на обмен UAH → USD'
-        elif any(v in operation for v in sell_variants):
-            # Клиент продает USD за UAH → лист "Заявка на обмен USD → UAH"
-            sheet_name = 'Заявка на обмен USD → UAH'
-        else:
-            print(f"❌ Неизвестная операция: {operation}")
+        built = build_cash_exchange_row(data)
+        if not built:
             return False
-        
+        sheet_name, row = built
+
         # Открываем соответствующий лист
-        sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet(sheet_name)
-        
-        # Формируем строку для записи
-        row = [
-            datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),  # Дата и время
-            data.get('operation', ''),  # Операция (Купить/Продать USD)
-            data.get('amount', ''),  # Сумма USD
-            data.get('city', ''),  # Город
-            data.get('branch', ''),  # Отделение
-            data.get('time', ''),  # Время визита
-            data.get('name', ''),  # Имя клиента
-            data.get('phone', ''),  # Телефон
-            data.get('telegram', ''),  # Telegram username
-            'Новая'  # Статус заявки
-        ]
+        sheet = get_worksheet(sheet_name)
         
         sheet.append_row(row, value_input_option='USER_ENTERED')
         print(f"✅ Заявка на обмен наличных добавлена в лист '{sheet_name}': {row}")
@@ -236,4 +203,16 @@ def save_cash_exchange_request_to_sheet(data: dict) -> bool:
         
     except Exception as e:
         print(f"❌ Ошибка при сохранении заявки на обмен наличных: {e}")
-        return False
\ No newline at end of file
+        return False
+
+
+async def queue_cash_exchange_request(data: dict) -> bool:
+    """
+    Ставит заявку на обмен наличных в очередь записи в Google Sheets
+    (без ожидания ответа таблицы)
+    """
+    built = build_cash_exchange_row(data)
+    if not built:
+        return False
+    sheet_name, row = built
+    return await aenqueue_append(sheet_name, row)
@@ -13,7 +13,8 @@ from keyboards import (
 )
 from utils.fiat_rates import get_usd_uah_rates
 from utils.commission_calculator import commission_calculator
-from google_utils import save_cash_exchange_request_to_sheet
+from google_utils import queue_cash_exchange_request
+from utils.notify_queue import enqueue_admin
 from localization import get_message
 
 # 💼 Состояния FSM
@@ -246,8 +247,7 @@ async def get_phone(message: types.Message, state: FSMContext):
     )
     
     # Отправляем заявку администратору
-    from config import ADMIN_CHAT_ID
-    await message.bot.send_message(ADMIN_CHAT_ID, summary)
+    await enqueue_admin(summary)
     
     # Сохраняем заявку в Google таблицу
     row_data = {
@@ -261,7 +261,8 @@ async def get_phone(message: types.Message, state: FSMContext):
         'telegram': message.from_user.username or ''
     }
     
-    success = save_cash_exchange_request_to_sheet(row_data)
+    # Запись в таблицу идёт через очередь — ответ пользователю не ждёт Google Sheets
+    success = await queue_cash_exchange_request(row_data)
     if not success:
         await message.answer("⚠️ Заявка отправлена администратору, но возникла ошибка при сохранении в таблицу")
     
@@ -7,12 +7,15 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
 
 
-from google_utils import get_wallet_address, save_transaction_hash, verify_transaction, update_transaction_status
+from google_utils import save_transaction_hash, verify_transaction
 from utils.validators import is_valid_tx_hash
 from utils.extract_hash_in_url import extract_tx_hash
 from keyboards import get_network_keyboard_with_back, get_back_keyboard, get_crypto_operation_keyboard, get_action_keyboard
 from utils.generate_qr_code import generate_wallet_qr
 from utils.commission_calculator import commission_calculator
+from utils.wallet_registry import wallet_registry
+from utils.sheets_queue import aenqueue_update
+from utils.notify_queue import enqueue_message, enqueue_admin
 from localization import get_message
 
 from config import logger
@@ -91,7 +94,7 @@ async def get_network(message: types.Message, state: FSMContext):
     
     # QR код и адрес кошелька показываем только при продаже USDT
     if operation == get_message("crypto_sell_usdt", operation_data.get("language", "ru")):
-        wallet_address = get_wallet_address(message.text)
+        wallet_address = wallet_registry.get(message.text)
         await state.update_data(wallet_address=wallet_address)
         
         if wallet_address:
@@ -138,7 +141,7 @@ async def get_amount(message: types.Message, state: FSMContext):
     
     # Определяем режим операции
     op = (data.get('operation') or '').strip()
-    exchange_rate = commission_calculator.get_exchange_rate()
+    exchange_rate = await commission_calculator.get_exchange_rate_async()
     
     if op == get_message("crypto_buy_usdt", lang):
         # Пользователь хочет купить USDT - вводит желаемую сумму USDT
@@ -305,7 +308,7 @@ async def get_transaction_hash(message: types.Message, state: FSMContext):
     data = await state.get_data()
     network = data.get('network')
     logger.info("Получен нетворк: %s", network)
-    wallet_address = get_wallet_address(network)
+    wallet_address = wallet_registry.get(network)
     if not is_valid_tx_hash(tx_hash, network): #еще одна проверка хэша на валидность
         await message.answer(get_message("invalid_tx_format", lang))
         return
@@ -347,18 +350,15 @@ async def get_transaction_hash(message: types.Message, state: FSMContext):
     #     await state.set_state(CryptoFSM.transaction_hash)
 
 async def send_telegram_notification(chat_id: str, msg):
-    from aiogram import Bot
-    from config import logger, TOKEN
-
-    bot = Bot(token=TOKEN)
     """
-    Отправляет уведомление в Telegram пользователю о подтвержденной транзакции
+    Ставит в очередь отправки (utils/notify_queue.py) уведомление пользователю о транзакции
     """
-    
+    from config import logger
+
     try:        
-        await bot.send_message(
-            chat_id=chat_id, 
-            text=get_message(
+        await enqueue_message(
+            chat_id, 
+            get_message(
                 msg["msg_status"], 
                 msg["lang"],
                 amount=msg.get('amount_result', 'N/A'),
@@ -411,8 +411,7 @@ async def get_contact(message: types.Message, state: FSMContext):
         )
         
         # Отправляем администратору
-        from config import ADMIN_CHAT_ID
-        await message.bot.send_message(ADMIN_CHAT_ID, summary, parse_mode="Markdown")
+        await enqueue_admin(summary, parse_mode="Markdown")
         
         # Показываем пользователю подтверждение
         await message.answer(
@@ -442,12 +441,11 @@ async def get_contact(message: types.Message, state: FSMContext):
             contact=data['contact'],
             username=message.from_user.username if message.from_user.username else 'N/A'
         )
-        from config import ADMIN_CHAT_ID
-        await message.bot.send_message(ADMIN_CHAT_ID, summary)
+        await enqueue_admin(summary)
         await message.answer(
             get_message("crypto_request_success", lang, summary=summary)
         )
-        print(f"Отправляю сообщение администратору в чат: {ADMIN_CHAT_ID}")
+        print("Заявка поставлена в очередь отправки администратору")
         # Сохраняем заявку в Google Sheets ДО очистки state!
         # row_data = {
         #     'currency': 'USDT',  # по умолчанию
@@ -466,7 +464,7 @@ async def get_contact(message: types.Message, state: FSMContext):
         google_update_params = {
             "contact": [change_param, 9]
         }
-        success = update_transaction_status(data['transaction_hash'], google_update_params)
+        success = await aenqueue_update(data['transaction_hash'], google_update_params)
         # if not success:
         #     await message.answer(get_message("google_sheet_error", lang))
 
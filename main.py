@@ -7,26 +7,32 @@ from aiogram.filters import CommandStart, Command
 
 # Replace Redis storage with in-memory storage
 # from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.fsm.storage.redis import RedisStorage
-from redis.asyncio import Redis as AsyncRedis  # важно: async вариант
 
-from config import TOKEN, GOOGLE_API_KEY, CSV_URL, REDIS_URL, REDIS_DB_FSM
+from config import TOKEN, GOOGLE_API_KEY, CSV_URL, RATES_CHANNEL
 from handlers.cash import register_cash_handlers
 from handlers.crypto import register_crypto_handlers
 from handlers.start import register_start_handlers
 from utils.channel_rates import ChannelRatesParser
+from utils.wallet_registry import wallet_registry
+from utils.commission_calculator import commission_calculator
+from utils.http_session import close_session
+from utils.fsm_storage import new_fsm_storage
+from utils.redis_pool import close_async_redis
+from utils.notify_queue import run_sender
+from utils.sheets_queue import run_flusher, CELERY_AVAILABLE
+
 
 # Use in-memory storage instead of Redis
 # storage = MemoryStorage()
-redis_fsm = AsyncRedis.from_url(REDIS_URL, db=REDIS_DB_FSM)
-storage = RedisStorage(redis=redis_fsm)
+# та же конфигурация хранилища (и ключей), что у воркеров — utils/fsm_storage.py
+storage = new_fsm_storage()
 
 bot = Bot(token=TOKEN)
 dp = Dispatcher(storage=storage)
 google = GOOGLE_API_KEY
 
 # Инициализируем парсер курсов из канала
-channel_rates_parser = ChannelRatesParser(bot, "@obmenvalut13")
+channel_rates_parser = ChannelRatesParser(bot, RATES_CHANNEL)
 
 # Делаем парсер доступным глобально
 import utils.channel_rates
@@ -42,9 +48,20 @@ def register_all_handlers(dp: Dispatcher):
 
 # 🚀 Запуск бота
 async def main():
+    rates_listener = None
+    background = []
     try:
         await bot.delete_webhook(drop_pending_updates=True)
         register_all_handlers(dp)
+        # Адреса кошельков: первичная загрузка + фоновое обновление
+        await wallet_registry.start()
+        # Правила комиссий: первичная загрузка + фоновое обновление
+        await commission_calculator.start()
+        # Новые курсы (rates_ingest.py или другой процесс) — сразу в память
+        rates_listener = asyncio.create_task(channel_rates_parser.cache.listen())
+        if not CELERY_AVAILABLE:
+            # очереди уведомлений и записи в таблицу разбирает Celery beat; без Celery — сам бот
+            background = [asyncio.create_task(run_sender()), asyncio.create_task(run_flusher())]
         print("🤖 Бот запущен...")
         await dp.start_polling(bot)
     except Exception as e:
@@ -53,6 +70,19 @@ async def main():
             print("💡 Решение: Остановите все другие экземпляры бота и попробуйте снова.")
         else:
             print(f"❌ Ошибка запуска бота: {e}")
+    finally:
+        if rates_listener is not None:
+            rates_listener.cancel()
+        for task in background:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        await wallet_registry.stop()
+        await commission_calculator.stop()
+        await close_session()
+        await close_async_redis()
 
 if __name__ == '__main__':
     try:
@@ -0,0 +1,242 @@
+# networks/eth_watcher.py
+import json
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from config import (
+    ETHERSCAN_API_KEY, ERC20_CONFIRMATIONS, ETH_RPC_URL, ETH_BLOCK_TIME, ERC20_BATCH_CONCURRENCY,
+    ETH_WATCH_ENABLED, ETH_WATCH_LOOKBACK_BLOCKS, ETH_WATCH_MAX_RANGE, ETH_WATCH_PAGE_SIZE, logger
+)
+from networks.ethereum import (
+    USDT_CONTRACT, BLOCK_TS_KEY, TxCode, hex_to_int, _ok, _pending, _get, _rpc_batch, _client_session,
+    _block_ts_cache, get_latest_block, get_block_timestamp, check_transactions_batch
+)
+from utils.redis_pool import get_async_redis
+
+# Вместо трёх proxy-запросов на каждую pending транзакцию — логи Transfer
+# контракта USDT на наши кошельки (topic2 = получатель) за новые блоки.
+# Курсор — последний блок, разобранный окончательно (с ERC20_CONFIRMATIONS
+# подтверждениями); блоки после него перечитываются каждый тик, пока не станут
+# окончательными, поэтому отменённые реорганизацией логи не подтверждаются.
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+CURSOR_KEY = "erc20:watch:cursor:{address}"
+SEEN_KEY = "erc20:watch:seen:{tx_hash}:{address}"
+SEEN_TTL = int(ETH_WATCH_LOOKBACK_BLOCKS * ETH_BLOCK_TIME)
+TAIL_TTL = int(2 * int(ERC20_CONFIRMATIONS) * ETH_BLOCK_TIME) or 60
+
+
+def _address_topic(address: str) -> str:
+    return "0x" + address.lower().removeprefix("0x").rjust(64, "0")
+
+
+def parse_transfer_log(log: dict) -> Optional[dict]:
+    """Transfer(from, to, value) из лога USDT; None — не наш лог или отменён реорганизацией"""
+    topics = log.get("topics") or []
+    if log.get("removed") or len(topics) < 3 or topics[0].lower() != TRANSFER_TOPIC:
+        return None
+    if (log.get("address") or "").lower() != USDT_CONTRACT:
+        return None
+    data = log.get("data") or "0x"
+    return {
+        "tx_hash": (log.get("transactionHash") or "").lower(),
+        "from": "0x" + topics[1][-40:].lower(),
+        "to": "0x" + topics[2][-40:].lower(),
+        "value": int(data, 16) if data not in ("0x", "") else 0,
+        "block": hex_to_int(log.get("blockNumber")),
+        # Etherscan отдаёт timeStamp, часть узлов — blockTimestamp
+        "timestamp": hex_to_int(log.get("blockTimestamp") or log.get("timeStamp")),
+    }
+
+
+async def _logs_via_rpc(session, addresses: list, from_block: int, to_block: int) -> list:
+    """Один eth_getLogs на диапазон (topic2 — список всех адресов), диапазоны — одним batch"""
+    topic2 = [_address_topic(a) for a in addresses]
+    calls = [
+        ("eth_getLogs", [{
+            "address": USDT_CONTRACT,
+            "fromBlock": hex(start),
+            "toBlock": hex(min(start + ETH_WATCH_MAX_RANGE - 1, to_block)),
+            "topics": [TRANSFER_TOPIC, None, topic2],
+        }])
+        for start in range(from_block, to_block + 1, ETH_WATCH_MAX_RANGE)
+    ]
+    logs = []
+    for result in await _rpc_batch(session, calls):
+        if result is None:
+            raise RuntimeError("eth_getLogs вернул ошибку")
+        logs.extend(result)
+    return logs
+
+
+async def _logs_via_etherscan(session, address: str, from_block: int, to_block: int) -> list:
+    """logs/getLogs Etherscan: один topic2 на запрос, постранично"""
+    logs = []
+    for start in range(from_block, to_block + 1, ETH_WATCH_MAX_RANGE):
+        page = 1
+        while True:
+            data = await _get(session, {
+                "module": "logs",
+                "action": "getLogs",
+                "address": USDT_CONTRACT,
+                "fromBlock": start,
+                "toBlock": min(start + ETH_WATCH_MAX_RANGE - 1, to_block),
+                "topic0": TRANSFER_TOPIC,
+                "topic0_2_opr": "and",
+                "topic2": _address_topic(address),
+                "page": page,
+                "offset": ETH_WATCH_PAGE_SIZE,
+                "apikey": ETHERSCAN_API_KEY,
+            })
+            result = data.get("result") if data else None
+            if not isinstance(result, list):
+                # "No records found" приходит со status=0 и пустым списком
+                raise RuntimeError(f"Etherscan getLogs: {result}")
+            logs.extend(result)
+            if len(result) < ETH_WATCH_PAGE_SIZE:
+                break
+            page += 1
+    return logs
+
+
+async def fetch_transfers(session, addresses: list, from_block: int, to_block: int) -> list:
+    """Transfer USDT на addresses в блоках [from_block, to_block]"""
+    if ETH_RPC_URL:
+        logs = await _logs_via_rpc(session, addresses, from_block, to_block)
+    else:
+        logs = []
+        for address in addresses:
+            logs.extend(await _logs_via_etherscan(session, address, from_block, to_block))
+    wanted = {a.lower() for a in addresses}
+    transfers = [t for t in map(parse_transfer_log, logs) if t and t["to"] in wanted and t["block"] is not None]
+    return transfers
+
+
+async def poll_addresses(session, addresses: list, latest_block: int) -> int:
+    """
+    Один опрос логов для addresses до latest_block: сохраняет переводы и сдвигает курсоры.
+    Адреса с одинаковым курсором читаются одним запросом. Возвращает число переводов.
+    """
+    redis_client = get_async_redis()
+    final_block = latest_block - int(ERC20_CONFIRMATIONS)
+    cursors = await redis_client.mget([CURSOR_KEY.format(address=a) for a in addresses])
+
+    by_start: Dict[int, list] = {}
+    for address, cursor in zip(addresses, cursors):
+        start = int(cursor) + 1 if cursor else latest_block - ETH_WATCH_LOOKBACK_BLOCKS
+        # без опросов дольше окна — начинаем заново, а не догоняем всю историю
+        start = max(start, latest_block - ETH_WATCH_LOOKBACK_BLOCKS)
+        by_start.setdefault(start, []).append(address)
+
+    count = 0
+    for start, group in by_start.items():
+        if start > latest_block:
+            continue
+        transfers = await fetch_transfers(session, group, start, latest_block)
+        count += len(transfers)
+
+        grouped: Dict[tuple, list] = {}
+        for t in transfers:
+            grouped.setdefault((t["tx_hash"], t["to"]), []).append(t)
+
+        pipe = redis_client.pipeline()
+        for (tx_hash, address), items in grouped.items():
+            final = items[0]["block"] <= final_block
+            value = json.dumps({"final": final, "transfers": items})
+            pipe.set(SEEN_KEY.format(tx_hash=tx_hash, address=address), value, ex=SEEN_TTL if final else TAIL_TTL)
+        for address in group:
+            pipe.set(CURSOR_KEY.format(address=address), max(start - 1, final_block), ex=SEEN_TTL)
+        await pipe.execute()
+    return count
+
+
+async def _block_timestamps(session, block_numbers: set) -> dict:
+    """Timestamp блоков: заголовки, которых нет в кэше (память/Redis), — одним JSON-RPC batch"""
+    block_data = {}
+    missing = [n for n in sorted(block_numbers) if n not in _block_ts_cache]
+    if ETH_RPC_URL and missing:
+        try:
+            cached = await get_async_redis().mget([BLOCK_TS_KEY.format(number=n) for n in missing])
+            missing = [n for n, value in zip(missing, cached) if not value]
+            blocks = await _rpc_batch(session, [("eth_getBlockByNumber", [hex(n), False]) for n in missing])
+            block_data = {n: b for n, b in zip(missing, blocks) if b}
+        except Exception as e:
+            logger.warning(f"[eth_watcher] Не удалось получить заголовки блоков: {e}")
+    return {n: await get_block_timestamp(session, n, block_data.get(n)) for n in block_numbers}
+
+
+def transfers_result(entry: dict, target_address: str, latest_block: int, ts_int: Optional[int]) -> Dict:
+    """Результат в формате check_transaction_stages по переводам на target_address в одной транзакции"""
+    transfers = entry["transfers"]
+    block = transfers[0]["block"]
+    # USDT имеет 6 знаков после запятой; несколько переводов в одной транзакции (multisend) суммируются
+    amount = sum(t["value"] for t in transfers) / 10**6
+    timestamp = datetime.fromtimestamp(ts_int, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S") if ts_int else None
+    facts = {"block_number": hex(block), "recipient": target_address.lower(), "amount": amount, "timestamp": timestamp}
+    extra = {"amount": amount, **({"timestamp": timestamp} if timestamp else {})}
+
+    required = int(ERC20_CONFIRMATIONS)
+    confirmations = max(0, latest_block - block)
+    # facts с номером ещё не окончательного блока: если запись истечёт, подтверждения
+    # досчитает check_transaction_stages, а перед подтверждением перечитает транзакцию
+    if not entry.get("final") or confirmations < required or timestamp is None:
+        stage_left = ["confirmations"] if timestamp else ["transfer_params", "confirmations"]
+        return _pending(
+            TxCode.LOW_CONFIRMATIONS,
+            stage_left,
+            error=f"{confirmations}/{required}",
+            confirmations=confirmations,
+            facts=facts,
+            **extra
+        )
+    return _ok(stage=["completed"], confirmations=confirmations, **extra)
+
+
+async def _match_seen(session, items: list, latest_block: int) -> Dict[str, Dict]:
+    keys = [SEEN_KEY.format(tx_hash=item[0].lower(), address=item[1].lower()) for item in items]
+    raw = await get_async_redis().mget(keys)
+    matched = [(item, json.loads(value)) for item, value in zip(items, raw) if value]
+    if not matched:
+        return {}
+
+    timestamps = {}
+    need = {e["transfers"][0]["block"] for _, e in matched if e["transfers"][0].get("timestamp") is None}
+    if need:
+        timestamps = await _block_timestamps(session, need)
+
+    results = {}
+    for item, entry in matched:
+        first = entry["transfers"][0]
+        ts_int = first.get("timestamp") or timestamps.get(first["block"])
+        results[item[0]] = transfers_result(entry, item[1], latest_block, ts_int)
+    return results
+
+
+async def check_erc20_transactions_batch(items, concurrency: int = ERC20_BATCH_CONCURRENCY) -> Dict[str, Dict]:
+    """
+    Пакетная проверка pending ERC20 транзакций.
+    items — [(tx_hash, target_address, stage_set[, facts]), ...].
+    Переводы на наши кошельки находятся по логам Transfer (в том числе через
+    контракты и multisend); остальные (другой адрес или токен, ещё не в блоке) —
+    поштучно через check_transactions_batch.
+    Возвращает {tx_hash: результат в формате check_transaction_stages}.
+    """
+    items = list(items)
+    results: Dict[str, Dict] = {}
+    if not items:
+        return results
+
+    if ETH_WATCH_ENABLED:
+        addresses = sorted({item[1].lower() for item in items})
+        try:
+            async with _client_session() as session:
+                latest_block = await get_latest_block(session)
+                if latest_block is not None:
+                    await poll_addresses(session, addresses, latest_block)
+                    results.update(await _match_seen(session, items, latest_block))
+        except Exception as e:
+            logger.warning(f"[eth_watcher] Не удалось получить логи Transfer: {e}")
+
+    unmatched = [item for item in items if item[0] not in results]
+    if unmatched:
+        results.update(await check_transactions_batch(unmatched, concurrency))
+    return results
@@ -1,16 +1,40 @@
 # networks/ethereum.py
 import json
-import aiohttp
+import time
+import random
 import asyncio
 from datetime import datetime, timezone
 from contextlib import asynccontextmanager
+from typing import Optional
 
-from config import ETHERSCAN_API_KEY, ERC20_CONFIRMATIONS, logger
+from cachetools import LRUCache
+
+from config import (
+    ETHERSCAN_API_KEY, ERC20_CONFIRMATIONS, ETHERSCAN_RATE_LIMIT, ETHERSCAN_RATE_BURST,
+    LATEST_BLOCK_TTL, ERC20_BATCH_CONCURRENCY, ETH_RPC_URL, ETH_RPC_BATCH_SIZE,
+    BLOCK_TS_CACHE_SIZE, BLOCK_TS_REDIS_TTL, logger
+)
 from utils.decode_etc20 import decode_erc20_input
+from utils.http_session import get_session
+from utils.rate_limiter import TokenBucketLimiter, SingleFlight
+from utils.redis_pool import get_async_redis
 
 USDT_CONTRACT = "0xdac17f958d2ee523a2206206994597c13d831ec7".lower()
 ETHERSCAN_URL = "https://api.etherscan.io/api"
 
+# Общий лимит Etherscan (Redis token bucket) и склейка одинаковых запросов
+etherscan_limiter = TokenBucketLimiter("etherscan", ETHERSCAN_RATE_LIMIT, ETHERSCAN_RATE_BURST)
+_single_flight = SingleFlight()
+
+# Кэш номера последнего блока: в памяти процесса и в Redis для всех воркеров
+LATEST_BLOCK_KEY = "eth:latest_block"
+_latest_block = {"value": None, "ts": 0.0}
+
+# Timestamp блока по номеру. Кэшируются только блоки с достаточным числом
+# подтверждений — после этого блок уже не меняется.
+BLOCK_TS_KEY = "eth:block_ts:{number}"
+_block_ts_cache = LRUCache(maxsize=BLOCK_TS_CACHE_SIZE)
+
 def hex_to_int(value):
     """Преобразует hex-строку в целое число"""
     if value is None:
@@ -56,25 +80,24 @@ def _expired(stage_left, **extra):
 
 @asynccontextmanager
 async def _client_session():
-    
-    timeout = aiohttp.ClientTimeout(total=10)
-    session = aiohttp.ClientSession(timeout=timeout)
-    session_id = hex(id(session))
-    logger.info(f"[ethereum] +++++Created ClientSession {session_id}")
-    try:
-        yield session
-    finally:
-        await session.close()
-        logger.info(f"[ethereum] Closed------ ClientSession {session_id}")
+    # Общая сессия event loop: TCP/TLS соединения переиспользуются между проверками
+    yield get_session()
 
 async def _get(session, params, retries=3):
+    # Одинаковые запросы в полёте (eth_blockNumber, тот же блок/tx) делят один HTTP вызов
+    key = tuple(sorted((k, str(v)) for k, v in params.items() if k != "apikey"))
+    return await _single_flight.do(key, lambda: _get_uncoalesced(session, params, retries))
+
+async def _get_uncoalesced(session, params, retries=3):
     last_err = None
     for i in range(retries):
         try:
+            await etherscan_limiter.acquire()
             async with session.get(ETHERSCAN_URL, params=params) as resp:
                 if resp.status == 429:
-                    logger.warning(f"[ethereum] Rate limit exceeded, retrying in {0.7 * (i+1)}s")
-                    await asyncio.sleep(0.7 * (i+1))
+                    delay = 0.5 * 2 ** i + random.uniform(0, 0.3)
+                    logger.warning(f"[ethereum] Rate limit exceeded, retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
                     continue
                 if resp.status >= 500:
                     logger.warning(f"[ethereum] Server error {resp.status}, retrying in {0.5 * (i+1)}s")
@@ -96,6 +119,97 @@ async def _get(session, params, retries=3):
     logger.error(f"[ethereum] {error_msg}")
     return {"status": "0", "message": "NOTOK", "result": error_msg}
 
+async def get_latest_block(session) -> Optional[int]:
+    """
+    Номер последнего блока с коротким TTL: все проверки одного тика
+    (и всех воркеров, через Redis) используют один eth_blockNumber.
+    """
+    now = time.monotonic()
+    if _latest_block["value"] is not None and now - _latest_block["ts"] < LATEST_BLOCK_TTL:
+        return _latest_block["value"]
+
+    redis_client = None
+    try:
+        redis_client = get_async_redis()
+        cached = await redis_client.get(LATEST_BLOCK_KEY)
+        if cached:
+            _latest_block.update(value=int(cached), ts=now)
+            return _latest_block["value"]
+    except Exception as e:
+        logger.debug(f"[ethereum] Redis недоступен для кэша блока: {e}")
+        redis_client = None
+
+    latest_resp = await _get(session, {
+        "module": "proxy", 
+        "action": "eth_blockNumber", 
+        "apikey": ETHERSCAN_API_KEY
+    })
+    latest_block = hex_to_int(latest_resp.get("result"))
+    if latest_block is None:
+        logger.warning(f"[ethereum] Failed to get latest block: {latest_resp}")
+        return None
+
+    _latest_block.update(value=latest_block, ts=time.monotonic())
+    if redis_client is not None:
+        try:
+            await redis_client.set(LATEST_BLOCK_KEY, latest_block, px=int(LATEST_BLOCK_TTL * 1000))
+        except Exception as e:
+            logger.debug(f"[ethereum] Не удалось сохранить блок в Redis: {e}")
+    return latest_block
+
+def _is_final_block(block_num: int) -> bool:
+    latest = _latest_block["value"]
+    return latest is not None and latest - block_num >= int(ERC20_CONFIRMATIONS)
+
+async def get_block_timestamp(session, block_number, block_data=None) -> Optional[int]:
+    """
+    Timestamp блока (unix, сек): LRU в памяти -> Redis -> eth_getBlockByNumber
+    без списка транзакций (boolean=false). block_data — если блок уже загружен.
+    """
+    block_num = hex_to_int(block_number)
+    if block_num is None:
+        logger.warning(f"[ethereum] Invalid block number format: {block_number}")
+        return None
+
+    ts_int = _block_ts_cache.get(block_num)
+    if ts_int is not None:
+        return ts_int
+
+    if block_data is None and BLOCK_TS_REDIS_TTL > 0:
+        try:
+            cached = await get_async_redis().get(BLOCK_TS_KEY.format(number=block_num))
+            if cached:
+                ts_int = int(cached)
+                _block_ts_cache[block_num] = ts_int
+                return ts_int
+        except Exception as e:
+            logger.debug(f"[ethereum] Redis недоступен для кэша блоков: {e}")
+
+    if block_data is None:
+        block_response = await _get(session, {
+            "module": "proxy", 
+            "action": "eth_getBlockByNumber", 
+            "tag": hex(block_num), 
+            "boolean": "false", 
+            "apikey": ETHERSCAN_API_KEY
+        })
+        block_data = block_response.get("result") or {}
+        if not isinstance(block_data, dict):
+            return None
+
+    ts_int = hex_to_int(block_data.get("timestamp"))
+    if ts_int is None:
+        return None
+
+    if _is_final_block(block_num):
+        _block_ts_cache[block_num] = ts_int
+        if BLOCK_TS_REDIS_TTL > 0:
+            try:
+                await get_async_redis().set(BLOCK_TS_KEY.format(number=block_num), ts_int, ex=BLOCK_TS_REDIS_TTL)
+            except Exception as e:
+                logger.debug(f"[ethereum] Не удалось сохранить блок в Redis: {e}")
+    return ts_int
+
 async def fetch_transaction(session, tx_hash: str) -> dict:
     """Получает данные транзакции из Etherscan"""
     params = {
@@ -154,10 +268,11 @@ async def check_in_block(tx_data) -> dict:
     
     return {"success": True, "blockNumber": block_number}
 
-async def check_timestamp_amount(session, tx_data) -> dict:
-    """Проверяет время и сумму транзакции"""
+async def check_timestamp_amount(session, tx_data, block_data=None, decoded=None) -> dict:
+    """Проверяет время и сумму транзакции (block_data/decoded — если уже загружены)"""
     try:
-        decoded = decode_erc20_input(tx_data.get("input", "0x"))
+        if decoded is None:
+            decoded = decode_erc20_input(tx_data.get("input", "0x"))
     except Exception as e:
         logger.exception("[ethereum] decode error")
         return {
@@ -179,22 +294,13 @@ async def check_timestamp_amount(session, tx_data) -> dict:
     amount = decoded["amount"] / 10**6
     logger.info(f"[ethereum] Transaction amount: {amount} USDT")
 
-    # Получаем timestamp блока
+    # Получаем timestamp блока (кэш / только заголовок блока)
     block_number = tx_data["blockNumber"]
-    params_block = {
-        "module": "proxy", 
-        "action": "eth_getBlockByNumber", 
-        "tag": block_number, 
-        "boolean": "true", 
-        "apikey": ETHERSCAN_API_KEY
-    }
     
     try:
-        block_response = await _get(session, params_block)
-        block_data = block_response.get("result") or {}
-        ts_hex = block_data.get("timestamp")
+        ts_int = await get_block_timestamp(session, block_number, block_data)
         
-        if not ts_hex:
+        if ts_int is None:
             logger.warning(f"[ethereum] No timestamp for block {block_number}")
             return {
                 "success": False, 
@@ -203,16 +309,6 @@ async def check_timestamp_amount(session, tx_data) -> dict:
                 "error": "Нет timestamp блока"
             }
         
-        ts_int = hex_to_int(ts_hex)
-        if ts_int is None:
-            logger.warning(f"[ethereum] Invalid timestamp format: {ts_hex}")
-            return {
-                "success": False, 
-                "status": "pending", 
-                "code": TxCode.API_ERROR, 
-                "error": "Неверный формат timestamp"
-            }
-        
         timestamp = datetime.fromtimestamp(ts_int, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
         return {"success": True, "amount": amount, "timestamp": timestamp}
     
@@ -238,10 +334,11 @@ async def check_is_erc20(tx_data) -> dict:
         }
     return {"success": True}
 
-async def check_recipient(tx_data, target_address: str) -> dict:
+async def check_recipient(tx_data, target_address: str, decoded=None) -> dict:
     """Проверяет, что получатель совпадает с целевым адресом"""
     try:
-        decoded = decode_erc20_input(tx_data.get("input", "0x"))
+        if decoded is None:
+            decoded = decode_erc20_input(tx_data.get("input", "0x"))
         if not decoded:
             return {
                 "success": False, 
@@ -259,7 +356,7 @@ async def check_recipient(tx_data, target_address: str) -> dict:
                 "code": TxCode.INVALID_RECIPIENT, 
                 "error": f"Неправильный адрес. Отправлено на {recipient}"
             }
-        return {"success": True}
+        return {"success": True, "recipient": recipient}
     
     except Exception as e:
         logger.exception("[ethereum] Error checking recipient")
@@ -292,32 +389,14 @@ async def check_confirmations(session, block_number_hex: str) -> dict:
             "error": "Неверный формат номера блока"
         }
     
-    # Получаем текущий блок
-    latest_resp = await _get(session, {
-        "module": "proxy", 
-        "action": "eth_blockNumber", 
-        "apikey": ETHERSCAN_API_KEY
-    })
-    
-    latest_block_hex = latest_resp.get("result")
-    if not latest_block_hex:
-        logger.warning(f"[ethereum] Failed to get latest block: {latest_resp}")
-        return {
-            "success": False, 
-            "status": "pending", 
-            "code": TxCode.API_ERROR, 
-            "error": "Не удалось получить последний блок"
-        }
-    
-    # Преобразуем текущий блок в число
-    latest_block = hex_to_int(latest_block_hex)
+    # Получаем текущий блок (общий кэш на тик)
+    latest_block = await get_latest_block(session)
     if latest_block is None:
-        logger.warning(f"[ethereum] Invalid latest block format: {latest_block_hex}")
         return {
             "success": False, 
             "status": "pending", 
             "code": TxCode.API_ERROR, 
-            "error": "Неверный формат текущего блока"
+            "error": "Не удалось получить последний блок"
         }
     
     # Вычисляем подтверждения
@@ -337,18 +416,69 @@ async def check_confirmations(session, block_number_hex: str) -> dict:
         "error": f"{confirmations}/{required_confirmations}"
     }
 
-async def check_transaction_stages(tx_hash: str, target_address: str, stage_set: set) -> dict:
+def _only_confirmations_left(stage_left, facts) -> bool:
+    return bool(facts and facts.get("block_number")) and set(stage_left) <= {"confirmations"}
+
+async def check_transaction_stages(
+    tx_hash: str, target_address: str, stage_set: set, prefetched: dict = None, facts: dict = None
+) -> dict:
     """
     Проверяет все этапы транзакции и возвращает результат.
     Возвращает единый результат с нормализованными полями (см. TxCode).
+    prefetched — {"tx": ..., "block": ...}, если данные уже загружены пачкой.
+    facts — уже проверенные неизменные данные транзакции (block_number, recipient,
+    amount, timestamp) из прошлых проверок; новые возвращаются в result["facts"].
     """
     stage_left = set(stage_set)
+    facts = dict(facts or {})
     logger.info(f"[ethereum] Starting transaction check for {tx_hash} with stages: {stage_left}")
     
     try:
         async with _client_session() as session:
+            # Транзакция уже в блоке и проверена — остались только подтверждения,
+            # их считаем по общему последнему блоку без запроса самой транзакции.
+            # Номер блока сохранён, пока блок не окончательный, поэтому перед
+            # подтверждением транзакция перечитывается: после реорганизации она
+            # может оказаться в другом блоке или вне блока — тогда полная проверка
+            if _only_confirmations_left(stage_left, facts):
+                extra = {k: facts[k] for k in ("timestamp", "amount") if facts.get(k) not in (None, "")}
+                if "confirmations" in stage_left:
+                    r = await check_confirmations(session, facts["block_number"])
+                    logger.info(f"[ethereum] ---confirmations (cached tx)--- result: {r}")
+                    if not r["success"]:
+                        return _pending(
+                            r["code"], 
+                            list(stage_left), 
+                            error=r.get("error"), 
+                            confirmations=r.get("confirmations", 0), 
+                            facts=facts, 
+                            **extra
+                        )
+                    extra.update({"confirmations": r["confirmations"]})
+                tx_resp = await fetch_transaction(session, tx_hash)
+                if not tx_resp["success"]:
+                    return _pending(tx_resp.get("code", TxCode.API_ERROR), list(stage_left), error=tx_resp.get("error"))
+                tx = tx_resp["data"]
+                if hex_to_int(tx.get("blockNumber")) == hex_to_int(facts["block_number"]):
+                    result = _ok(stage=["completed"], **extra)
+                    logger.info(f"[ethereum] Transaction {tx_hash} confirmed: {result}")
+                    return result
+                logger.warning(
+                    f"[ethereum] Transaction {tx_hash} moved from block {facts['block_number']} "
+                    f"to {tx.get('blockNumber')} (reorg), rechecking"
+                )
+                facts.pop("block_number")
+                stage_left |= {"in_block", "confirmations"}
+                prefetched = {"tx": tx}
+
             # 1. Проверяем наличие транзакции
-            tx_resp = await fetch_transaction(session, tx_hash)
+            if prefetched is not None:
+                tx_resp = (
+                    {"success": True, "data": prefetched["tx"]} if prefetched.get("tx")
+                    else {"success": False, "code": TxCode.NOT_FOUND, "error": "Транзакция не найдена"}
+                )
+            else:
+                tx_resp = await fetch_transaction(session, tx_hash)
             if not tx_resp["success"]:
                 logger.warning(f"[ethereum] Transaction fetch failed: {tx_resp.get('error')}")
                 return _pending(tx_resp.get("code", TxCode.API_ERROR), list(stage_left), error=tx_resp.get("error"))
@@ -363,6 +493,16 @@ async def check_transaction_stages(tx_hash: str, target_address: str, stage_set:
                 if not r["success"]:
                     return _pending(r["code"], list(stage_left), error=r["error"])
                 stage_left.discard("in_block")
+            if tx.get("blockNumber"):
+                facts["block_number"] = tx["blockNumber"]
+
+            # input декодируем один раз для получателя и суммы
+            decoded = None
+            if stage_left & {"recipient", "transfer_params"}:
+                try:
+                    decoded = decode_erc20_input(tx.get("input", "0x"))
+                except Exception:
+                    decoded = None  # ошибку вернут сами проверки
 
             # 3. Проверяем, что это ERC-20 транзакция USDT
             if "is_erc20" in stage_left:
@@ -374,21 +514,23 @@ async def check_transaction_stages(tx_hash: str, target_address: str, stage_set:
 
             # 4. Проверяем получателя
             if "recipient" in stage_left:
-                r = await check_recipient(tx, target_address)
+                r = await check_recipient(tx, target_address, decoded)
                 logger.info(f"[ethereum] ---recipient--- result: {r}")
                 if not r["success"]:
                     return _failed(r["code"], list(stage_left), error=r["error"])
+                facts["recipient"] = r["recipient"]
                 stage_left.discard("recipient")
 
-            extra = {}
+            extra = {k: facts[k] for k in ("timestamp", "amount") if facts.get(k) not in (None, "")}
             # 5. Проверяем параметры перевода (сумма и время)
             if "transfer_params" in stage_left:
-                r = await check_timestamp_amount(session, tx)
+                r = await check_timestamp_amount(session, tx, (prefetched or {}).get("block"), decoded)
                 logger.info(f"[ethereum] ---transfer_params--- result: {r}")
                 if not r["success"]:
                     # Это не фатальная ошибка, можно подождать (например, из-за лагов узла)
-                    return _pending(r.get("code", TxCode.API_ERROR), list(stage_left), error=r.get("error"))
+                    return _pending(r.get("code", TxCode.API_ERROR), list(stage_left), error=r.get("error"), facts=facts)
                 extra.update({"timestamp": r["timestamp"], "amount": r["amount"]})
+                facts.update({"timestamp": r["timestamp"], "amount": r["amount"]})
                 stage_left.discard("transfer_params")
 
             # 6. Проверяем подтверждения
@@ -401,6 +543,7 @@ async def check_transaction_stages(tx_hash: str, target_address: str, stage_set:
                         list(stage_left), 
                         error=r.get("error"), 
                         confirmations=r.get("confirmations", 0), 
+                        facts=facts, 
                         **extra
                     )
                 extra.update({"confirmations": r["confirmations"]})
@@ -421,4 +564,93 @@ async def check_transaction_stages(tx_hash: str, target_address: str, stage_set:
             "code": TxCode.INTERNAL_ERROR, 
             "stage": list(stage_left), 
             "error": str(e)
-        }
\ No newline at end of file
+        }
+
+
+async def _rpc_batch(session, calls: list) -> list:
+    """
+    JSON-RPC batch к ETH_RPC_URL: calls — [(method, params), ...].
+    Возвращает результаты в том же порядке (None, если по вызову ошибка).
+    """
+    results = []
+    for start in range(0, len(calls), ETH_RPC_BATCH_SIZE):
+        chunk = calls[start:start + ETH_RPC_BATCH_SIZE]
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": method, "params": params}
+            for i, (method, params) in enumerate(chunk)
+        ]
+        async with session.post(ETH_RPC_URL, json=payload) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"JSON-RPC error {resp.status}")
+            data = await resp.json()
+        by_id = {item.get("id"): item.get("result") for item in data if isinstance(item, dict)}
+        results.extend(by_id.get(i) for i in range(len(chunk)))
+    return results
+
+async def _prefetch_via_rpc(session, tx_hashes: list) -> Optional[dict]:
+    """
+    Загружает транзакции, их блоки и последний блок несколькими batch-запросами.
+    Возвращает {tx_hash: {"tx": ..., "block": ...}} или None при ошибке узла.
+    """
+    try:
+        calls = [("eth_getTransactionByHash", [h]) for h in tx_hashes] + [("eth_blockNumber", [])]
+        results = await _rpc_batch(session, calls)
+        txs, latest_hex = results[:-1], results[-1]
+
+        latest_block = hex_to_int(latest_hex)
+        if latest_block is not None:
+            _latest_block.update(value=latest_block, ts=time.monotonic())
+
+        # Только заголовки блоков (false — без полного списка транзакций), уже известные — из кэша
+        block_tags = sorted({tx["blockNumber"] for tx in txs if tx and tx.get("blockNumber")})
+        block_by_tag = {}
+        for tag in block_tags:
+            ts_int = _block_ts_cache.get(hex_to_int(tag))
+            if ts_int is not None:
+                block_by_tag[tag] = {"number": tag, "timestamp": hex(ts_int)}
+        missing = [tag for tag in block_tags if tag not in block_by_tag]
+        if missing:
+            blocks = await _rpc_batch(session, [("eth_getBlockByNumber", [tag, False]) for tag in missing])
+            block_by_tag.update(zip(missing, blocks))
+
+        return {
+            h: {"tx": tx, "block": block_by_tag.get(tx.get("blockNumber")) if tx else None}
+            for h, tx in zip(tx_hashes, txs)
+        }
+    except Exception as e:
+        logger.warning(f"[ethereum] JSON-RPC batch failed, fallback to Etherscan: {e}")
+        return None
+
+async def check_transactions_batch(items, concurrency: int = ERC20_BATCH_CONCURRENCY) -> dict:
+    """
+    Пакетная проверка pending ERC20 транзакций.
+    items — [(tx_hash, target_address, stage_set[, facts]), ...].
+    Последний блок запрашивается один раз на пачку, транзакции и блоки
+    проверяются параллельно (не больше concurrency одновременно).
+    Возвращает {tx_hash: результат в формате check_transaction_stages}.
+    """
+    items = list(items)
+    if not items:
+        return {}
+
+    # Транзакции, у которых остались только подтверждения, заново не загружаем
+    need_tx = [item[0] for item in items if not _only_confirmations_left(item[2], item[3] if len(item) > 3 else None)]
+
+    prefetched = {}
+    async with _client_session() as session:
+        if ETH_RPC_URL and need_tx:
+            prefetched = await _prefetch_via_rpc(session, need_tx) or {}
+        if not prefetched:
+            await get_latest_block(session)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check_one(tx_hash, target_address, stage_set, facts=None):
+        async with semaphore:
+            result = await check_transaction_stages(
+                tx_hash, target_address, stage_set, prefetched.get(tx_hash), facts
+            )
+            return tx_hash, result
+
+    results = await asyncio.gather(*(check_one(*item) for item in items))
+    return dict(results)
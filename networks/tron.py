@@ -1,11 +1,11 @@
 # networks/tron.py
 import json
-import aiohttp
 import datetime
 from typing import Dict, Any, Optional
 
 from config import TRONSCAN_API, TRC20_CONFIRMATIONS, logger
 from utils.extract_hash_in_url import extract_tx_hash
+from utils.http_session import get_session
 
 
 USDT_CONTRACT = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
@@ -38,16 +38,8 @@ def _pending(code, **extra):
 from contextlib import asynccontextmanager
 @asynccontextmanager
 async def _client_session():
-    
-    timeout = aiohttp.ClientTimeout(total=10)
-    session = aiohttp.ClientSession(timeout=timeout)
-    session_id = hex(id(session))
-    logger.info(f"[tron] +++++Created ClientSession {session_id}")
-    try:
-        yield session
-    finally:
-        logger.info(f"[tron] Closed------ ClientSession {session_id}")
-        await session.close()
+    # Общая сессия event loop: TCP/TLS соединения переиспользуются между проверками
+    yield get_session()
 
 
 async def _get(session, url: str, params: dict, retries: int = 3) -> dict:
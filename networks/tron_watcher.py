@@ -0,0 +1,206 @@
+# networks/tron_watcher.py
+import asyncio
+import datetime
+import json
+import time
+from typing import Dict, Optional
+
+from config import (
+    TRONSCAN_API, TRC20_CONFIRMATIONS, TRON_WATCH_ENABLED, TRON_WATCH_LOOKBACK, TRON_WATCH_PAGE_SIZE,
+    TRON_WATCH_MAX_PAGES, logger
+)
+from networks.tron import USDT_CONTRACT, TxCode, _ok, _failed, _pending, _get, _client_session, check_tron_transaction
+from utils.extract_hash_in_url import extract_tx_hash
+from utils.redis_pool import get_async_redis
+
+# Вместо transaction-info на каждый pending хеш — один опрос истории входящих
+# TRC20 переводов на каждый наш кошелёк. Курсор — block_ts (мс), до которого
+# история уже разобрана; увиденные переводы хранятся по transaction_id
+# (отдельный ключ на перевод, живёт TRON_WATCH_LOOKBACK).
+CURSOR_KEY = "trc20:watch:cursor:{address}"
+SEEN_KEY = "trc20:watch:seen:{tx_id}"
+
+
+def _is_usdt(transfer: dict) -> bool:
+    token_info = transfer.get("tokenInfo") or {}
+    return (transfer.get("contract_address") or token_info.get("tokenId")) == USDT_CONTRACT
+
+
+def _normalize_hash(value) -> Optional[str]:
+    tx_hash = extract_tx_hash(str(value or "").strip())
+    return tx_hash.lower().removeprefix("0x") if tx_hash else None
+
+
+async def fetch_transfers(session, address: str, since_ms: int) -> list:
+    """Входящие TRC20 переводы на address с block_ts >= since_ms (новые первыми)"""
+    transfers = []
+    for page in range(TRON_WATCH_MAX_PAGES):
+        data = await _get(session, f"{TRONSCAN_API}/token_trc20/transfers", {
+            "toAddress": address,
+            "start": page * TRON_WATCH_PAGE_SIZE,
+            "limit": TRON_WATCH_PAGE_SIZE,
+            "start_timestamp": since_ms,
+        })
+        if not data or "error" in data:
+            raise RuntimeError(data.get("error", "Ошибка API") if data else "Пустой ответ API")
+
+        batch = data.get("token_transfers") or []
+        transfers.extend(batch)
+        if len(batch) < TRON_WATCH_PAGE_SIZE or int(batch[-1].get("block_ts", 0)) < since_ms:
+            break
+    else:
+        # история отдаётся новыми первыми, а курсор сдвигается к самым новым переводам:
+        # более старые страницы не будут прочитаны и на следующих опросах
+        logger.warning(
+            f"[tron_watcher] {address}: история длиннее {TRON_WATCH_MAX_PAGES} страниц, более старые переводы "
+            f"не разобраны — их хеши проверяются поштучно через transaction-info"
+        )
+    return [t for t in transfers if int(t.get("block_ts", 0)) >= since_ms]
+
+
+async def poll_address(session, address: str) -> int:
+    """
+    Один опрос истории кошелька: сохраняет новые переводы и сдвигает курсор.
+    Курсор не уходит дальше самого старого неподтверждённого перевода —
+    его статус перечитается на следующем опросе. Возвращает число переводов.
+    """
+    redis_client = get_async_redis()
+    cursor = await redis_client.get(CURSOR_KEY.format(address=address))
+    since_ms = int(cursor) if cursor else int((time.time() - TRON_WATCH_LOOKBACK) * 1000)
+
+    transfers = await fetch_transfers(session, address, since_ms)
+
+    new_cursor = since_ms
+    if transfers:
+        unconfirmed = [int(t.get("block_ts", 0)) for t in transfers if not t.get("confirmed")]
+        newest = max(int(t.get("block_ts", 0)) for t in transfers)
+        new_cursor = min(unconfirmed) if unconfirmed else newest
+
+    # в одной транзакции может быть несколько переводов на кошелёк (USDT и другие
+    # токены) — по хешу сохраняем перевод USDT, иначе настоящий депозит станет INVALID_TOKEN
+    seen: Dict[str, dict] = {}
+    for t in transfers:
+        tx_id = _normalize_hash(t.get("transaction_id"))
+        if tx_id and (tx_id not in seen or (_is_usdt(t) and not _is_usdt(seen[tx_id]))):
+            seen[tx_id] = t
+
+    pipe = redis_client.pipeline()
+    for tx_id, t in seen.items():
+        pipe.set(SEEN_KEY.format(tx_id=tx_id), json.dumps(t), ex=TRON_WATCH_LOOKBACK)
+    # без опросов дольше окна истории — начнём заново с TRON_WATCH_LOOKBACK
+    pipe.set(CURSOR_KEY.format(address=address), new_cursor, ex=TRON_WATCH_LOOKBACK)
+    await pipe.execute()
+    return len(transfers)
+
+
+async def get_latest_block(session) -> Optional[int]:
+    """Номер последнего блока Tron (один запрос на пачку); None — недоступен"""
+    data = await _get(session, f"{TRONSCAN_API}/block/latest", {})
+    try:
+        return int(data["number"])
+    except (KeyError, TypeError, ValueError):
+        logger.warning(f"[tron_watcher] Не удалось получить последний блок: {data.get('error') if data else data}")
+        return None
+
+
+def transfer_result(transfer: dict, target_address: str, latest_block: Optional[int]) -> Optional[Dict]:
+    """
+    Результат в формате check_tron_transaction по записи из истории переводов.
+    Подтверждения считаются по номеру блока перевода и последнему блоку с тем же
+    порогом TRC20_CONFIRMATIONS, что и в check_confirmations; None — посчитать
+    нельзя, хеш проверяется поштучно через transaction-info.
+    """
+    if not transfer.get("confirmed"):
+        return _pending(TxCode.NOT_CONFIRMED, error="Транзакция не подтверждена")
+
+    contract_ret = transfer.get("contractRet", "SUCCESS")
+    if contract_ret != "SUCCESS" or transfer.get("finalResult", "SUCCESS") != "SUCCESS":
+        return _failed(TxCode.CONTRACT_ERROR, error=f"Ошибка исполнения контракта: {contract_ret}")
+
+    token_info = transfer.get("tokenInfo") or {}
+    if not _is_usdt(transfer):
+        return _failed(TxCode.INVALID_TOKEN, error="Не USDT (TRC20)")
+
+    if transfer.get("to_address") != target_address:
+        return _failed(
+            TxCode.INVALID_RECIPIENT,
+            error=f"Токены отправлены на другой адрес: {transfer.get('to_address')}"
+        )
+
+    block = transfer.get("block")
+    if block is None or latest_block is None:
+        return None
+    confirmations = max(0, latest_block - int(block))
+    if confirmations < TRC20_CONFIRMATIONS:
+        return _pending(
+            TxCode.LOW_CONFIRMATIONS,
+            error=f"Недостаточно подтверждений: {confirmations}/{TRC20_CONFIRMATIONS}",
+            confirmations=confirmations
+        )
+
+    decimals = int(token_info.get("tokenDecimal", 6))
+    amount = int(transfer.get("quant", "0")) / (10 ** decimals)
+    dt = datetime.datetime.fromtimestamp(int(transfer.get("block_ts", 0)) / 1000)
+    return _ok(
+        amount=amount,
+        from_address=transfer.get("from_address", ""),
+        to_address=transfer.get("to_address", ""),
+        timestamp=dt.strftime("%Y-%m-%d %H:%M:%S"),
+        confirmations=confirmations,
+    )
+
+
+async def _match_seen(items: list, latest_block: Optional[int]) -> Dict[str, Dict]:
+    hashes = [_normalize_hash(tx_hash) or "" for tx_hash, _ in items]
+    raw = await get_async_redis().mget([SEEN_KEY.format(tx_id=h) for h in hashes])
+    results = {}
+    for (tx_hash, target_address), value in zip(items, raw):
+        result = transfer_result(json.loads(value), target_address, latest_block) if value else None
+        if result is not None:
+            results[tx_hash] = result
+    return results
+
+
+async def check_tron_transactions_batch(items, concurrency: int = 10) -> Dict[str, Dict]:
+    """
+    Пакетная проверка pending TRC20 транзакций.
+    items — [(tx_hash, target_address), ...].
+    Переводы на наши кошельки находятся одним опросом истории на кошелёк;
+    остальные (другой адрес, ещё не видно в истории, нет номера блока для
+    подсчёта подтверждений) — поштучно через transaction-info.
+    Возвращает {tx_hash: результат в формате check_tron_transaction}.
+    """
+    items = list(items)
+    results: Dict[str, Dict] = {}
+    if not items:
+        return results
+
+    if TRON_WATCH_ENABLED and TRONSCAN_API:
+        by_address: Dict[str, list] = {}
+        for tx_hash, target_address in items:
+            by_address.setdefault(target_address, []).append((tx_hash, target_address))
+
+        async with _client_session() as session:
+            polled = await asyncio.gather(
+                *(poll_address(session, address) for address in by_address), return_exceptions=True
+            )
+            latest_block = await get_latest_block(session)
+        for (address, address_items), outcome in zip(by_address.items(), polled):
+            if isinstance(outcome, Exception):
+                logger.warning(f"[tron_watcher] Не удалось получить историю {address}: {outcome}")
+                continue
+            try:
+                results.update(await _match_seen(address_items, latest_block))
+            except Exception as e:
+                logger.warning(f"[tron_watcher] Redis недоступен для истории {address}: {e}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check_one(tx_hash, target_address):
+        async with semaphore:
+            return tx_hash, await check_tron_transaction(tx_hash, target_address)
+
+    unmatched = [(tx_hash, target) for tx_hash, target in items if tx_hash not in results]
+    if unmatched:
+        results.update(await asyncio.gather(*(check_one(*item) for item in unmatched)))
+    return results
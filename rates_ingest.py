@@ -0,0 +1,125 @@
+"""
+Сервис приёма курсов из канала (RATES_CHANNEL) через события Telethon.
+
+Один постоянный Telethon клиент подписан на новые и отредактированные посты
+канала: каждый пост разбирается один раз (ChannelRatesParser._extract_rates_from_text),
+снимок курсов пишется в Redis следующей версией и публикуется в
+RATES_UPDATES_CHANNEL — бот меняет копию в памяти сразу, без MTProto на пути
+хендлеров. Пока сервис работает, он держит lock обновления курсов, и бот сам
+канал не разбирает. Если сервис остановится, lock истечёт через
+RATES_REFRESH_LOCK_TTL, и бот снова будет разбирать канал, когда снимок устареет.
+
+Запуск:  python rates_ingest.py   (сессия Telethon — scripts/telethon_login.py)
+"""
+import asyncio
+
+from telethon import events
+
+from config import RATES_CHANNEL, RATES_REFRESH_LOCK_TTL, RATES_INGEST_LOCK_RENEW, RATES_STALE_TTL, logger
+from utils.channel_rates import ChannelRatesParser
+from utils.rates_cache import RATES_KEY, RATES_LOCK_KEY, INGEST_HOLDER, RatesCache, decode_snapshot
+from utils.redis_pool import get_async_redis, close_async_redis
+
+RECONNECT_DELAY = 5
+
+
+async def _no_refresh():
+    # курсы в кэш кладёт только этот сервис — по событиям канала
+    return None
+
+
+async def hold_refresh_lock():
+    """
+    Держит lock обновления курсов, чтобы бот и воркеры не разбирали канал сами.
+    Заодно продлевает снимок: пока курсы не меняются, новых версий нет, и без
+    продления ключ истёк бы через RATES_STALE_TTL при живом сервисе.
+    """
+    while True:
+        try:
+            pipe = get_async_redis().pipeline()
+            pipe.set(RATES_LOCK_KEY, INGEST_HOLDER, ex=RATES_REFRESH_LOCK_TTL)
+            pipe.expire(RATES_KEY, RATES_STALE_TTL)
+            await pipe.execute()
+        except Exception as e:
+            logger.error(f"[rates_ingest] Не удалось продлить lock обновления курсов: {e}")
+        await asyncio.sleep(RATES_INGEST_LOCK_RENEW)
+
+
+async def release_refresh_lock():
+    redis_client = get_async_redis()
+    if await redis_client.get(RATES_LOCK_KEY) == INGEST_HOLDER:
+        await redis_client.delete(RATES_LOCK_KEY)
+
+
+class RatesIngest:
+    def __init__(self, channel: str = RATES_CHANNEL):
+        self.parser = ChannelRatesParser(bot=None, channel_username=channel)
+        self.client = self.parser.telethon_client
+        self.cache = RatesCache(_no_refresh)
+
+    async def publish(self, text: str, source: str) -> bool:
+        rates = self.parser._extract_rates_from_text(text or "")
+        if not rates:
+            return False
+        current = self.cache.snapshot
+        if current is not None and current["rates"] == rates:
+            await get_async_redis().expire(RATES_KEY, RATES_STALE_TTL)
+            logger.info(f"[rates_ingest] {source}: курсы не изменились")
+            return True
+        snapshot = await self.cache.store(rates)
+        logger.info(f"[rates_ingest] {source}: курсы версии {snapshot['version']}: {rates}")
+        return True
+
+    async def _on_post(self, event):
+        try:
+            await self.publish(event.raw_text, f"пост {event.id}")
+        except Exception as e:
+            logger.error(f"[rates_ingest] Ошибка обработки поста {event.id}: {e}")
+
+    async def _publish_latest(self, entity):
+        """Курсы из последнего поста с курсами — при старте и после переподключения"""
+        snapshot = decode_snapshot(await get_async_redis().get(RATES_KEY))
+        if snapshot is not None:
+            self.cache.remember(snapshot)
+        async for msg in self.client.iter_messages(entity, limit=10):
+            if await self.publish(getattr(msg, "message", "") or "", f"пост {msg.id}"):
+                return
+
+    async def run(self):
+        while True:
+            try:
+                await self.client.connect()
+                if not await self.client.is_user_authorized():
+                    logger.error("[rates_ingest] Telethon не авторизован! Запусти scripts/telethon_login.py один раз.")
+                    return
+                entity = await self.client.get_entity(self.parser.channel_username)
+                self.client.add_event_handler(self._on_post, events.NewMessage(chats=entity))
+                self.client.add_event_handler(self._on_post, events.MessageEdited(chats=entity))
+                await self._publish_latest(entity)
+                logger.info(f"[rates_ingest] Подписан на {self.parser.channel_username}")
+                await self.client.run_until_disconnected()
+            except Exception as e:
+                logger.error(f"[rates_ingest] Ошибка соединения Telethon: {e}")
+            finally:
+                self.client.remove_event_handler(self._on_post)
+            logger.warning(f"[rates_ingest] Соединение потеряно, переподключение через {RECONNECT_DELAY}с")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+async def main():
+    ingest = RatesIngest()
+    lock_keeper = asyncio.create_task(hold_refresh_lock())
+    try:
+        await ingest.run()
+    finally:
+        lock_keeper.cancel()
+        await release_refresh_lock()
+        await ingest.client.disconnect()
+        await close_async_redis()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print('👋 Rates ingest остановлен')
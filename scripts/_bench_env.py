@@ -0,0 +1,18 @@
+"""
+Общее окружение бенчмарков scripts/bench_*.py: переменные, без которых не
+импортируется config, и Redis по умолчанию. Заданные в окружении значения не
+меняются — так бенчмарк можно направить на свой Redis или другие пороги.
+"""
+import os
+
+DEFAULTS = {
+    "TRC20_CONFIRMATIONS": "1",
+    "ERC20_CONFIRMATIONS": "12",
+    "REDIS_URL": "redis://127.0.0.1:6379",
+}
+
+
+def bench_env(**extra: str):
+    """Проставляет значения по умолчанию; extra — дополнительные умолчания конкретного бенчмарка"""
+    for name, value in {**DEFAULTS, **extra}.items():
+        os.environ.setdefault(name, value)
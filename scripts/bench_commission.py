@@ -0,0 +1,118 @@
+"""
+Микробенчмарк расчёта комиссий (utils/commission_calculator.py) против прежнего калькулятора.
+
+Лист «Комиссии» заменён stand-in листом: правила по умолчанию (6 правил) и
+тарифная сетка из N ступеней на операцию. Сравниваются:
+  - old: перебор всех правил со startswith и проверкой диапазона на каждый расчёт (как было)
+  - new: calculate_commission — bisect по таблице отрезков операции
+  - many: calculate_many — весь набор сумм одним вызовом
+Перед замером результаты old и new сверяются на всех суммах (включая границы
+ступеней и суммы вне правил). Отдельно — стоимость перечитывания листа без
+изменений (пересборки нет) и с изменением.
+
+Запуск:  python scripts/bench_commission.py [ступеней_на_операцию] [сумм]
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+OPERATIONS = ('USDT_to_USD', 'USD_to_USDT')
+
+
+class FakeSheet:
+    def __init__(self, records):
+        self.records = records
+        self.reads = 0
+
+    def get_all_records(self):
+        self.reads += 1
+        return [dict(record) for record in self.records]
+
+
+def make_records(tiers: int):
+    """Ступени по 100: fixed, затем percentage, последняя — менеджер; плюс правила по умолчанию"""
+    records = []
+    for operation in OPERATIONS:
+        records.append({'Тип операции': operation, 'Мин. сумма': 5000, 'Макс. сумма': 999999,
+                        'Тип комиссии': 'manager', 'Значение комиссии': 0, 'Требуется менеджер': 'да'})
+        for i in range(tiers):
+            low = 100 + i * 100
+            kind = 'fixed' if i < tiers // 2 else 'percentage'
+            records.append({'Тип операции': f'{operation}_t{i}', 'Мин. сумма': low, 'Макс. сумма': low + 99,
+                            'Тип комиссии': kind, 'Значение комиссии': round(0.1 + i * 0.01, 2),
+                            'Требуется менеджер': ''})
+    return records
+
+
+def old_find_rule(commission_data, operation_type, amount):
+    """Прежний _find_commission_rule (без логики по умолчанию — она одинакова)"""
+    applicable_rules = []
+    for rule_name, rule_data in commission_data.items():
+        if rule_name.startswith(operation_type):
+            if rule_data['min_amount'] <= amount <= rule_data['max_amount']:
+                applicable_rules.append((rule_name, rule_data))
+    return applicable_rules[0][1] if applicable_rules else None
+
+
+def main():
+    tiers = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+
+    bench_env()
+
+    import utils.commission_calculator as module
+    from utils.commission_calculator import CommissionCalculator, _default_rule
+
+    sheet = FakeSheet(make_records(tiers))
+    module.get_worksheet = lambda title: sheet
+
+    calculator = CommissionCalculator()
+    calculator.reload_sync()
+    rules = calculator.commission_data
+    print(f"Правил: {len(rules)}, сумм: {count}\n")
+
+    def old_calculate(operation, amount):
+        rule = old_find_rule(rules, operation, amount) or _default_rule(operation, amount)
+        return CommissionCalculator._apply_rule(operation, amount, rule, None)
+
+    random.seed(1)
+    bounds = [float(v) for rule in rules.values() for v in (rule['min_amount'], rule['max_amount'])]
+    amounts = bounds + [b + 0.5 for b in bounds] + [random.uniform(0, 12000) for _ in range(count)]
+    amounts += [-1.0, 0.0, 50.0, 1e7]
+
+    mismatches = sum(
+        old_calculate(op, amount) != calculator.calculate_commission(op, amount)
+        for op in OPERATIONS for amount in amounts
+    )
+    print(f"Сверка old/new: {len(amounts) * len(OPERATIONS)} расчётов, расхождений: {mismatches}\n")
+
+    amounts = amounts[:count]
+    for label, run in (
+        ("old", lambda op: [old_calculate(op, amount) for amount in amounts]),
+        ("new", lambda op: [calculator.calculate_commission(op, amount) for amount in amounts]),
+        ("many", lambda op: calculator.calculate_many(op, amounts)),
+    ):
+        started = time.perf_counter()
+        for op in OPERATIONS:
+            run(op)
+        elapsed = time.perf_counter() - started
+        print(f"{label:5s} {elapsed * 1000:8.1f} мс  {elapsed / (len(amounts) * len(OPERATIONS)) * 1e6:6.2f} мкс на расчёт")
+
+    print()
+    for label, change in (("без изменений", False), ("лист изменён", True)):
+        if change:
+            sheet.records[1]['Значение комиссии'] = 99
+        started = time.perf_counter()
+        changed = calculator.reload_sync()
+        elapsed = time.perf_counter() - started
+        print(f"перечитывание ({label}): {elapsed * 1000:6.2f} мс, таблицы пересобраны: {changed}")
+
+
+if __name__ == "__main__":
+    main()
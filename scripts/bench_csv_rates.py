@@ -0,0 +1,128 @@
+"""
+Бенчмарк запасного источника курсов (CSV_URL) при недоступном канале.
+
+Stand-in отдаёт CSV с ETag (и 304 на If-None-Match) с задержкой, как выгрузка
+Google Sheets. Запросы курса идут пачками (наличный обмен + просмотр курсов),
+в середине CSV меняется. Сравниваются:
+  - old: _get_usd_from_csv/_get_all_from_csv как были — скачать и разобрать на каждый вызов
+  - new: utils.fiat_rates.csv_rates — таблица в памяти, условный GET раз в CSV_RATES_TTL
+
+Запуск:  python scripts/bench_csv_rates.py [пачек] [запросов_в_пачке] [задержка_мс]
+"""
+import asyncio
+import csv
+import hashlib
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+calls = Counter()
+LATENCY = 0.0
+CSV_TEXT = ""
+
+
+def _make_csv(usd_buy: float) -> str:
+    rows = ["Валюта,Покупка,Продажа", f"USD,{usd_buy:.2f},{usd_buy + 0.3:.2f}", "EUR,44.90,45.30",
+            "GBP,52.10,52.80", "PLN,10.30,10.50"]
+    # выгрузка листа целиком: служебные строки, комментарии
+    rows += [f"note{i},,комментарий {i}" for i in range(300)]
+    return "\n".join(rows)
+
+
+async def csv_handler(request):
+    await asyncio.sleep(LATENCY)
+    etag = '"' + hashlib.md5(CSV_TEXT.encode()).hexdigest() + '"'
+    if request.headers.get("If-None-Match") == etag:
+        calls["304"] += 1
+        return web.Response(status=304, headers={"ETag": etag})
+    calls["200"] += 1
+    calls["bytes"] += len(CSV_TEXT.encode())
+    return web.Response(text=CSV_TEXT, content_type="text/csv", headers={"ETag": etag})
+
+
+async def main():
+    global LATENCY, CSV_TEXT
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    per_round = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    LATENCY = (float(sys.argv[3]) if len(sys.argv) > 3 else 150) / 1000
+
+    app = web.Application()
+    app.router.add_get("/rates.csv", csv_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    bench_env()
+    os.environ["CSV_URL"] = f"http://127.0.0.1:{port}/rates.csv"
+    os.environ.setdefault("CSV_RATES_TTL", "1")
+
+    import utils.fiat_rates as fiat_rates
+    from utils.http_session import get_session, close_session
+
+    parses = Counter()
+    parse_csv_rates = fiat_rates.parse_csv_rates
+
+    def counted_parse(text):
+        parses["new"] += 1
+        return parse_csv_rates(text)
+
+    fiat_rates.parse_csv_rates = counted_parse
+
+    async def old_usd():
+        # как было: скачать и разобрать на каждый вызов
+        async with get_session().get(os.environ["CSV_URL"]) as resp:
+            text_data = await resp.text()
+        parses["old"] += 1
+        for row in list(csv.reader(text_data.splitlines()))[1:]:
+            if len(row) >= 3 and row[0].strip().upper() == "USD":
+                return float(row[1]), float(row[2])
+
+    async def run(label, get_usd):
+        global CSV_TEXT
+        calls.clear()
+        CSV_TEXT = _make_csv(41.10)
+        started = time.perf_counter()
+        latencies = []
+        stale = 0
+        for i in range(rounds):
+            if i == rounds // 2:
+                CSV_TEXT = _make_csv(41.50)     # в таблице поменяли курс
+
+            async def one():
+                t = time.perf_counter()
+                result = await get_usd()
+                latencies.append(time.perf_counter() - t)
+                return result
+
+            results = await asyncio.gather(*(one() for _ in range(per_round)))
+            if i >= rounds // 2:
+                stale += sum(1 for buy, _ in results if buy != 41.50)
+            await asyncio.sleep(0.25)           # пауза между пачками
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        print(f"{label:4s} {elapsed:6.2f} с  GET 200={calls['200']:4d}  304={calls['304']:3d}  "
+              f"скачано={calls['bytes'] / 1024:8.1f} КБ  разборов={parses[label]:4d}  "
+              f"p50={latencies[len(latencies) // 2] * 1000:6.1f} мс  старый курс после смены={stale}")
+
+    print(f"Пачек: {rounds} по {per_round} запросов, задержка CSV: {LATENCY * 1000:.0f} мс, "
+          f"CSV_RATES_TTL={fiat_rates.csv_rates.ttl:.0f} с\n")
+    await run("old", old_usd)
+    await run("new", fiat_rates._get_usd_from_csv)
+
+    await close_session()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+"""
+Бенчмарк проверки pending ERC20 транзакций за один тик.
+
+Поднимает локальный мок Etherscan proxy API (GET /api) и JSON-RPC узла
+(POST /rpc) с искусственной задержкой и сравнивает:
+  - sequential: check_transaction_stages по одной транзакции (как было в тике)
+  - batch: check_transactions_batch через Etherscan (параллельно, один eth_blockNumber)
+  - rpc: check_transactions_batch через JSON-RPC batch (ETH_RPC_URL)
+  - warm: повторный тик, timestamp блоков уже в кэше
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_erc20_batch.py [кол-во транзакций] [кол-во блоков] [задержка_мс]
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+USDT_CONTRACT = "0xdac17f958d2ee523a2206206994597c13d831ec7"
+TARGET = "0x" + "ab" * 20
+LATEST = 20_000_000
+
+calls = Counter()
+TXS = {}
+LATENCY = 0.0
+
+
+def _tx_hash(i: int) -> str:
+    return "0x" + f"{i:064x}"
+
+
+def _make_tx(i: int, blocks: int) -> dict:
+    transfer_input = "0xa9059cbb" + TARGET[2:].rjust(64, "0") + f"{(i + 1) * 10**6:064x}"
+    return {
+        "hash": _tx_hash(i),
+        "to": USDT_CONTRACT,
+        "blockNumber": hex(LATEST - 100 - i % blocks),
+        "input": transfer_input,
+    }
+
+
+def _block(tag: str) -> dict:
+    return {"number": tag, "timestamp": hex(1_760_000_000 + int(tag, 16) % 10_000)}
+
+
+def _call(method: str, params: list):
+    if method == "eth_getTransactionByHash":
+        return TXS.get(params[0])
+    if method == "eth_getBlockByNumber":
+        return _block(params[0])
+    if method == "eth_blockNumber":
+        return hex(LATEST)
+    return None
+
+
+async def etherscan_handler(request):
+    q = request.query
+    calls[f"etherscan:{q.get('action')}"] += 1
+    await asyncio.sleep(LATENCY)
+    if q.get("action") == "eth_getTransactionByHash":
+        result = _call(q["action"], [q.get("txhash")])
+    elif q.get("action") == "eth_getBlockByNumber":
+        result = _call(q["action"], [q.get("tag")])
+    else:
+        result = _call(q.get("action"), [])
+    return web.json_response({"jsonrpc": "2.0", "id": 1, "result": result})
+
+
+async def rpc_handler(request):
+    payload = await request.json()
+    calls["rpc:batch"] += 1
+    await asyncio.sleep(LATENCY)
+    return web.json_response([
+        {"jsonrpc": "2.0", "id": item["id"], "result": _call(item["method"], item["params"])}
+        for item in payload
+    ])
+
+
+async def _measure(label, coro_factory, n, warm=False):
+    import networks.ethereum as eth
+    from utils.redis_pool import get_async_redis
+
+    # каждый режим начинает с холодного кэша последнего блока (и блоков, если не warm)
+    redis_client = get_async_redis()
+    eth._latest_block.update(value=None, ts=0.0)
+    await redis_client.delete(eth.LATEST_BLOCK_KEY)
+    if not warm:
+        eth._block_ts_cache.clear()
+        async for key in redis_client.scan_iter(match=eth.BLOCK_TS_KEY.format(number="*")):
+            await redis_client.delete(key)
+
+    calls.clear()
+    started = time.perf_counter()
+    results = await coro_factory()
+    elapsed = time.perf_counter() - started
+    confirmed = sum(1 for r in results.values() if r.get("status") == "confirmed")
+    detail = ", ".join(f"{k}={v}" for k, v in sorted(calls.items()))
+    print(f"{label:12s} {elapsed:7.2f} с  HTTP={sum(calls.values()):5d}  confirmed={confirmed}/{n}  [{detail}]")
+
+
+async def main():
+    global LATENCY
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    blocks = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    LATENCY = (float(sys.argv[3]) if len(sys.argv) > 3 else 20.0) / 1000
+
+    for i in range(n):
+        TXS[_tx_hash(i)] = _make_tx(i, blocks)
+
+    app = web.Application()
+    app.router.add_get("/api", etherscan_handler)
+    app.router.add_post("/rpc", rpc_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    bench_env()
+    os.environ.setdefault("ETHERSCAN_API_KEY", "bench")
+    # лимит Etherscan в бенчмарке не должен маскировать разницу в количестве запросов
+    os.environ.setdefault("ETHERSCAN_RATE_LIMIT", "100000")
+    os.environ.setdefault("ETHERSCAN_RATE_BURST", "100000")
+
+    import networks.ethereum as eth
+    from utils.http_session import close_session
+
+    eth.ETHERSCAN_URL = f"http://127.0.0.1:{port}/api"
+    all_stages = {"in_block", "is_erc20", "recipient", "transfer_params", "confirmations"}
+    items = [(h, TARGET, all_stages) for h in TXS]
+    print(f"Транзакций: {n}, блоков: {blocks}, задержка API: {LATENCY * 1000:.0f} мс\n")
+
+    async def sequential():
+        results = {}
+        for tx_hash, target, stages in items:
+            results[tx_hash] = await eth.check_transaction_stages(tx_hash, target, stages)
+        return results
+
+    async def batch():
+        return await eth.check_transactions_batch(items)
+
+    async def rpc():
+        eth.ETH_RPC_URL = f"http://127.0.0.1:{port}/rpc"
+        try:
+            return await eth.check_transactions_batch(items)
+        finally:
+            eth.ETH_RPC_URL = None
+
+    await _measure("sequential", sequential, n)
+    await _measure("batch", batch, n)
+    await _measure("batch warm", batch, n, warm=True)
+    await _measure("rpc", rpc, n)
+    await _measure("rpc warm", rpc, n, warm=True)
+
+    await close_session()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
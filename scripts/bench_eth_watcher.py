@@ -0,0 +1,239 @@
+"""
+Локальный stand-in Ethereum API и бенчмарк проверки pending ERC20 транзакций.
+
+Stand-in отдаёт Etherscan (GET /api: proxy и logs/getLogs) и JSON-RPC узел
+(POST /rpc) по сгенерированной истории переводов USDT на наши кошельки:
+обычные transfer, переводы через multisend-контракт, платежи на другой адрес,
+ещё не попавшие в блок и свежие (мало подтверждений). Сравниваются:
+  - per-hash: check_transactions_batch (как было)
+  - watcher: networks.eth_watcher — логи Transfer (+ поштучно для несовпавших)
+  - next tick: повторный тик watcher через 15 блоков — читаются только новые блоки
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_eth_watcher.py [pending] [кошельков] [задержка_мс] [rpc|etherscan]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+USDT_CONTRACT = "0xdac17f958d2ee523a2206206994597c13d831ec7"
+MULTISEND = "0x" + "5e" * 20
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+calls = Counter()
+TXS = {}
+LOGS = []
+STATE = {"latest": 20_000_000}
+LATENCY = 0.0
+
+
+def _address(i: int) -> str:
+    return "0x" + f"{i:040x}"
+
+
+def _tx_hash(i: int) -> str:
+    return "0x" + f"{i:064x}"
+
+
+def _topic(address: str) -> str:
+    return "0x" + address[2:].rjust(64, "0")
+
+
+def generate(pending: int, wallets: int, background: int = 500, seed: int = 7) -> list:
+    """Транзакции и логи; возвращает pending [(tx_hash, наш_кошелёк, стадии)]"""
+    rng = random.Random(seed)
+    latest = STATE["latest"]
+    our = [_address(i) for i in range(wallets)]
+    stages = {"in_block", "is_erc20", "recipient", "transfer_params", "confirmations"}
+    items = []
+    for i in range(pending + background):
+        target = our[i % wallets]
+        to_address = target
+        is_pending = i < pending
+        kind = rng.random()
+        if is_pending and kind < 0.05:
+            to_address = _address(10_000 + i)        # платёж на другой адрес
+        block = latest - rng.randint(0, 800)
+        if is_pending and 0.05 <= kind < 0.1:
+            block = latest - rng.randint(0, 5)       # свежая, мало подтверждений
+        mined = not (is_pending and 0.1 <= kind < 0.13)
+        via_multisend = 0.13 <= kind < 0.2
+        amount = rng.randint(10, 5000) * 10**6
+
+        tx_hash = _tx_hash(i)
+        transfer_input = "0xa9059cbb" + to_address[2:].rjust(64, "0") + f"{amount:064x}"
+        TXS[tx_hash] = {
+            "hash": tx_hash,
+            "to": MULTISEND if via_multisend else USDT_CONTRACT,
+            "blockNumber": hex(block) if mined else None,
+            "input": "0x1a1da075" + "00" * 96 if via_multisend else transfer_input,
+        }
+        if mined:
+            LOGS.append({
+                "address": USDT_CONTRACT,
+                "topics": [TRANSFER_TOPIC, _topic(_address(20_000 + i)), _topic(to_address)],
+                "data": "0x" + f"{amount:064x}",
+                "blockNumber": hex(block),
+                "transactionHash": tx_hash,
+                "logIndex": "0x0",
+                "removed": False,
+            })
+        if is_pending:
+            items.append((tx_hash, target, stages))
+    return items
+
+
+def _block(tag) -> dict:
+    number = int(tag, 16) if isinstance(tag, str) else int(tag)
+    return {"number": hex(number), "timestamp": hex(1_760_000_000 + number % 100_000)}
+
+
+def _get_logs(flt: dict) -> list:
+    start, end = int(flt["fromBlock"], 16), int(flt["toBlock"], 16)
+    wanted = flt["topics"][2]
+    wanted = set(wanted) if isinstance(wanted, list) else {wanted}
+    return [
+        log for log in LOGS
+        if start <= int(log["blockNumber"], 16) <= min(end, STATE["latest"]) and log["topics"][2] in wanted
+    ]
+
+
+def _call(method: str, params: list):
+    calls[f"method:{method}"] += 1
+    if method == "eth_getTransactionByHash":
+        tx = TXS.get(params[0])
+        if tx and tx["blockNumber"] and int(tx["blockNumber"], 16) > STATE["latest"]:
+            return {**tx, "blockNumber": None}
+        return tx
+    if method == "eth_getBlockByNumber":
+        return _block(params[0])
+    if method == "eth_blockNumber":
+        return hex(STATE["latest"])
+    if method == "eth_getLogs":
+        return _get_logs(params[0])
+    return None
+
+
+async def etherscan_handler(request):
+    q = request.query
+    calls[f"etherscan:{q.get('action')}"] += 1
+    await asyncio.sleep(LATENCY)
+    action = q.get("action")
+    if action == "getLogs":
+        logs = _get_logs({
+            "fromBlock": hex(int(q["fromBlock"])), "toBlock": hex(int(q["toBlock"])), "topics": [None, None, q["topic2"]]
+        })
+        page, offset = int(q.get("page", 1)), int(q.get("offset", 1000))
+        logs = [{**log, "timeStamp": _block(log["blockNumber"])["timestamp"]} for log in logs]
+        rows = logs[(page - 1) * offset:page * offset]
+        return web.json_response({"status": "1" if rows else "0", "message": "OK", "result": rows})
+    if action == "eth_getTransactionByHash":
+        result = _call(action, [q.get("txhash")])
+    elif action == "eth_getBlockByNumber":
+        result = _call(action, [q.get("tag")])
+    else:
+        result = _call(action, [])
+    return web.json_response({"jsonrpc": "2.0", "id": 1, "result": result})
+
+
+async def rpc_handler(request):
+    payload = await request.json()
+    calls["rpc:batch"] += 1
+    await asyncio.sleep(LATENCY)
+    return web.json_response([
+        {"jsonrpc": "2.0", "id": item["id"], "result": _call(item["method"], item["params"])}
+        for item in payload
+    ])
+
+
+async def bench(pending: int, wallets: int, mode: str):
+    items = generate(pending, wallets)
+
+    app = web.Application()
+    app.router.add_get("/api", etherscan_handler)
+    app.router.add_post("/rpc", rpc_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    bench_env()
+    os.environ.setdefault("ETHERSCAN_API_KEY", "bench")
+    # лимит Etherscan в бенчмарке не должен маскировать разницу в количестве запросов
+    os.environ.setdefault("ETHERSCAN_RATE_LIMIT", "100000")
+    os.environ.setdefault("ETHERSCAN_RATE_BURST", "100000")
+
+    import networks.ethereum as eth
+    import networks.eth_watcher as watcher
+    from utils.http_session import close_session
+    from utils.redis_pool import get_async_redis
+
+    eth.ETHERSCAN_URL = f"http://127.0.0.1:{port}/api"
+    rpc_url = f"http://127.0.0.1:{port}/rpc" if mode == "rpc" else None
+    eth.ETH_RPC_URL = watcher.ETH_RPC_URL = rpc_url
+
+    redis_client = get_async_redis()
+    for pattern in (watcher.CURSOR_KEY.format(address="*"), watcher.SEEN_KEY.format(tx_hash="*", address="*"),
+                    eth.BLOCK_TS_KEY.format(number="*")):
+        async for key in redis_client.scan_iter(match=pattern):
+            await redis_client.delete(key)
+
+    print(f"Pending: {pending}, кошельков: {wallets}, логов: {len(LOGS)}, режим: {mode}, "
+          f"задержка API: {LATENCY * 1000:.0f} мс\n")
+
+    outcomes = {}
+    for label, enabled in (("per-hash", False), ("watcher", True), ("next tick", True)):
+        if label == "next tick":
+            STATE["latest"] += 15
+        # каждый режим начинает с холодного кэша последнего блока и блоков
+        eth._latest_block.update(value=None, ts=0.0)
+        eth._block_ts_cache.clear()
+        await redis_client.delete(eth.LATEST_BLOCK_KEY)
+        watcher.ETH_WATCH_ENABLED = enabled
+
+        calls.clear()
+        started = time.perf_counter()
+        results = await watcher.check_erc20_transactions_batch(items, concurrency=50)
+        elapsed = time.perf_counter() - started
+        codes = Counter(r.get("code") for r in results.values())
+        outcomes[label] = results
+        http = sum(v for k, v in calls.items() if not k.startswith("method:"))
+        detail = ", ".join(f"{k}={v}" for k, v in sorted(calls.items()))
+        print(f"{label:10s} {elapsed:6.2f} с  HTTP={http:5d}  {dict(codes)}\n{'':10s} [{detail}]")
+
+    per_hash, watched = outcomes["per-hash"], outcomes["watcher"]
+    same = sum((per_hash[h]["status"], per_hash[h]["code"]) == (watched[h]["status"], watched[h]["code"]) for h in per_hash)
+    multisend = [h for h, _, _ in items if TXS[h]["to"] == MULTISEND and TXS[h]["blockNumber"]]
+    print(f"\nСовпадение итогов per-hash / watcher: {same}/{len(items)}; "
+          f"через multisend: {len(multisend)}, подтверждено per-hash "
+          f"{sum(per_hash[h]['status'] == 'confirmed' for h in multisend)}, watcher "
+          f"{sum(watched[h]['status'] == 'confirmed' for h in multisend)}")
+
+    await close_session()
+    await runner.cleanup()
+
+
+def main():
+    global LATENCY
+    pending = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    wallets = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    LATENCY = (float(sys.argv[3]) if len(sys.argv) > 3 else 20.0) / 1000
+    mode = sys.argv[4] if len(sys.argv) > 4 else "rpc"
+    asyncio.run(bench(pending, wallets, mode))
+
+
+if __name__ == "__main__":
+    main()
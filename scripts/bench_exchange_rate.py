@@ -0,0 +1,119 @@
+"""
+Бенчмарк курса USDT/USD для хендлера суммы (handlers/crypto.get_amount).
+
+Лист «Курсы» заменён stand-in листом: каждый вызов (find, cell, get_all_values)
+блокирует поток на задержку HTTP запроса к Sheets и считается. Пользователи
+вводят суммы одновременно, пока в loop тикает «сердцебиение» — по нему видно,
+насколько loop заблокирован. Сравниваются:
+  - old: commission_calculator.get_exchange_rate() как был — find + cell на каждый ввод, прямо в loop
+  - new: get_exchange_rate_async() — значение из памяти, фоновое обновление раз в EXCHANGE_RATE_TTL
+
+Запуск:  python scripts/bench_exchange_rate.py [вводов] [задержка_мс]
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+LATENCY = 0.15
+
+
+class FakeRatesSheet:
+    rows = [["Пара", "Курс"], ["USD/UAH", "41.2"], ["USDT/USD", "0.998"]]
+
+    def __init__(self):
+        self.calls = 0
+
+    def _request(self):
+        self.calls += 1
+        time.sleep(LATENCY)
+
+    def find(self, label):
+        self._request()
+        for r, row in enumerate(self.rows, 1):
+            for c, value in enumerate(row, 1):
+                if value == label:
+                    return SimpleNamespace(row=r, col=c)
+        return None
+
+    def cell(self, row, col):
+        self._request()
+        return SimpleNamespace(value=self.rows[row - 1][col - 1])
+
+    def get_all_values(self):
+        self._request()
+        return [list(row) for row in self.rows]
+
+
+def old_get_exchange_rate(get_worksheet):
+    sheet = get_worksheet('Курсы')
+    rate_cell = sheet.find('USDT/USD')
+    if rate_cell:
+        rate_value = sheet.cell(rate_cell.row, rate_cell.col + 1).value
+        return float(rate_value) if rate_value else None
+    return None
+
+
+async def main():
+    global LATENCY
+    inputs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    LATENCY = (float(sys.argv[2]) if len(sys.argv) > 2 else 150) / 1000
+
+    bench_env()
+
+    import utils.commission_calculator as module
+    from utils.commission_calculator import CommissionCalculator
+
+    sheet = FakeRatesSheet()
+    module.get_worksheet = lambda title: sheet
+    calculator = CommissionCalculator()
+    calculator.reload = lambda: asyncio.sleep(0)        # правила комиссий здесь не нужны
+
+    async def run(label, get_rate):
+        sheet.calls = 0
+        stalls = []
+        stop = asyncio.Event()
+
+        async def heartbeat():
+            while not stop.is_set():
+                t = time.perf_counter()
+                await asyncio.sleep(0.01)
+                stalls.append(time.perf_counter() - t - 0.01)
+
+        beat = asyncio.create_task(heartbeat())
+        latencies = []
+
+        async def user_input():
+            t = time.perf_counter()
+            rate = await get_rate()
+            latencies.append(time.perf_counter() - t)
+            return rate
+
+        started = time.perf_counter()
+        rates = await asyncio.gather(*(user_input() for _ in range(inputs)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+        latencies.sort()
+        print(f"{label:4s} {elapsed:6.2f} с  запросов к Sheets={sheet.calls:3d}  "
+              f"p50={latencies[len(latencies) // 2] * 1000:7.2f} мс  max={latencies[-1] * 1000:7.2f} мс  "
+              f"блокировка loop={max(stalls, default=0) * 1000:7.1f} мс  курс={rates[0]}")
+
+    async def old():
+        return old_get_exchange_rate(module.get_worksheet)
+
+    print(f"Вводов суммы: {inputs}, запрос к Sheets: {LATENCY * 1000:.0f} мс\n")
+    await run("old", old)
+    await calculator.start()                            # первичная загрузка курса, как в main.py
+    await run("new", calculator.get_exchange_rate_async)
+    await calculator.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Бенчмарк отправки уведомлений из воркера через локальный stand-in Bot API.
+
+Уведомления отправляются из фонового event loop, как в tasks.run_async_coroutine.
+Сравниваются:
+  - per-call: новый Bot(token=TOKEN) на каждое уведомление (как было)
+  - shared: общий Bot из utils.notifier (пул соединений на loop)
+
+Stand-in считает TCP соединения и запросы sendMessage; созданные/открытые
+ClientSession показывает трекер utils/aiohttp_debug.
+
+Запуск:  python scripts/bench_notifier.py [уведомлений] [задержка_мс]
+"""
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from threading import Thread
+
+from aiohttp import web
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+calls = Counter()
+PEERS = set()
+LATENCY = 0.0
+
+
+async def send_message_handler(request):
+    calls["sendMessage"] += 1
+    PEERS.add(request.transport.get_extra_info("peername"))
+    await asyncio.sleep(LATENCY)
+    data = await request.post()
+    return web.json_response({"ok": True, "result": {
+        "message_id": calls["sendMessage"], "date": int(time.time()),
+        "chat": {"id": int(data.get("chat_id", 0)), "type": "private"}, "text": data.get("text", ""),
+    }})
+
+
+async def _start():
+    app = web.Application()
+    app.router.add_post("/bot{token}/sendMessage", send_message_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+def main():
+    global LATENCY
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    LATENCY = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+
+    server_loop = asyncio.new_event_loop()
+    Thread(target=server_loop.run_forever, daemon=True).start()
+    runner, port = asyncio.run_coroutine_threadsafe(_start(), server_loop).result()
+
+    bench_env()
+    os.environ["TOKEN"] = "123456:BENCH"
+    os.environ["TELEGRAM_API_SERVER"] = f"http://127.0.0.1:{port}"
+
+    import utils.aiohttp_debug as tracker
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from utils.notifier import close_bot, get_bot
+
+    logging.getLogger().setLevel(logging.CRITICAL)     # трекер пишет стек на каждую сессию
+
+    # фоновый loop воркера (tasks.get_or_create_event_loop)
+    worker_loop = asyncio.new_event_loop()
+    Thread(target=worker_loop.run_forever, daemon=True).start()
+
+    def run(coro):
+        return asyncio.run_coroutine_threadsafe(coro, worker_loop).result(timeout=60)
+
+    api = TelegramAPIServer.from_base(os.environ["TELEGRAM_API_SERVER"])
+
+    async def per_call(chat_id):
+        # как было: Bot на каждый вызов, сессия не закрывается
+        bot = Bot(token=os.environ["TOKEN"], session=AiohttpSession(api=api))
+        await bot.send_message(chat_id=chat_id, text="tx")
+
+    async def shared(chat_id):
+        # send_telegram_notification ставит сообщение в очередь (utils/notify_queue.py),
+        # а её sender отправляет через этот же общий Bot
+        await get_bot().send_message(chat_id=chat_id, text="tx")
+
+    modes = (
+        ("per-call", lambda i: per_call(1000 + i)),
+        ("shared", lambda i: shared(1000 + i)),
+    )
+    print(f"Уведомлений: {n}, задержка Bot API: {LATENCY * 1000:.0f} мс\n")
+    for label, factory in modes:
+        calls.clear()
+        PEERS.clear()
+        created_before = len(tracker._active_sessions)
+        started = time.perf_counter()
+        for i in range(n):
+            run(factory(i))
+        elapsed = time.perf_counter() - started
+        print(f"{label:9s} {elapsed:6.2f} с  sendMessage={calls['sendMessage']:4d}  "
+              f"TCP соединений={len(PEERS):4d}  открытых ClientSession: +{len(tracker._active_sessions) - created_before}")
+
+    run(close_bot())
+    print(f"\nПосле close_bot открытых ClientSession (утечки per-call): {len(tracker._active_sessions)}")
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), server_loop).result()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Бенчмарк доставки уведомлений при всплеске через stand-in Bot API с лимитами.
+
+Stand-in отвечает 429 (retry_after) при превышении лимитов Telegram:
+больше 30 сообщений за секунду на бота, больше 1 в секунду в личный чат,
+больше 20 в минуту в группу. Всплеск: уведомления пользователям (по несколько
+на чат) и сводки в админ-группу, как при тяжёлом тике beat. Сравниваются:
+  - direct: send_message сразу (как было; 429 — сообщение потеряно)
+  - outbox: utils.notify_queue (лимиты, retry_after, сводки админам склеиваются)
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_notify_queue.py [уведомлений] [чатов] [сводок]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from pathlib import Path
+
+from aiohttp import web
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+ADMIN_CHAT = "-1001000000000"
+GLOBAL_LIMIT = 30
+GROUP_PER_MINUTE = 20
+
+calls = Counter()
+DELIVERED = defaultdict(list)
+_global_sent = deque()
+_chat_sent = defaultdict(deque)
+
+
+def _too_fast(chat_id: str, now: float) -> float:
+    """retry_after, если сообщение превысит лимит, иначе 0"""
+    while _global_sent and now - _global_sent[0] >= 1:
+        _global_sent.popleft()
+    if len(_global_sent) >= GLOBAL_LIMIT:
+        return 1
+    sent = _chat_sent[chat_id]
+    window, limit = (60, GROUP_PER_MINUTE) if chat_id.startswith("-") else (1, 1)
+    while sent and now - sent[0] >= window:
+        sent.popleft()
+    if len(sent) >= limit:
+        return max(1, int(window - (now - sent[0])) + 1)
+    return 0
+
+
+async def send_message_handler(request):
+    data = await request.post()
+    chat_id = data.get("chat_id", "")
+    now = time.monotonic()
+    retry_after = _too_fast(chat_id, now)
+    if retry_after:
+        calls["429"] += 1
+        return web.json_response(
+            {"ok": False, "error_code": 429, "description": f"Too Many Requests: retry after {retry_after}",
+             "parameters": {"retry_after": retry_after}}, status=429
+        )
+    calls["sent"] += 1
+    _global_sent.append(now)
+    _chat_sent[chat_id].append(now)
+    DELIVERED[chat_id].append(data.get("text", ""))
+    return web.json_response({"ok": True, "result": {
+        "message_id": calls["sent"], "date": int(time.time()),
+        "chat": {"id": int(chat_id), "type": "private"}, "text": data.get("text", ""),
+    }})
+
+
+def _reset():
+    calls.clear()
+    DELIVERED.clear()
+    _global_sent.clear()
+    _chat_sent.clear()
+
+
+async def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    chats = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    summaries = int(sys.argv[3]) if len(sys.argv) > 3 else 40
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/sendMessage", send_message_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    bench_env()
+    os.environ["TOKEN"] = "123456:BENCH"
+    os.environ["TELEGRAM_API_SERVER"] = f"http://127.0.0.1:{port}"
+    os.environ["ADMIN_CHAT_ID"] = ADMIN_CHAT
+    os.environ.setdefault("NOTIFY_FLUSH_MAX_SECONDS", "600")
+
+    import utils.notify_queue as outbox
+    from utils.notifier import get_bot, close_bot
+    from utils.redis_pool import get_async_redis
+
+    rng = random.Random(3)
+    messages = [(str(100_000 + rng.randrange(chats)), f"tx #{i}") for i in range(n)]
+    admin = [f"🟢 Заявка #{i}\nСумма: {rng.randint(100, 5000)} USDT\nСеть: TRC20" for i in range(summaries)]
+    # сводки перемешаны с уведомлениями, как их ставят handle_result и хендлеры
+    stream = [("user", m) for m in messages] + [("admin", a) for a in admin]
+    rng.shuffle(stream)
+    total = len(stream)
+    print(f"Уведомлений: {n} в {chats} чатов, сводок админам: {summaries}\n")
+
+    redis_client = get_async_redis()
+
+    # direct: отправка сразу из обработки результатов
+    _reset()
+    bot = get_bot()
+    started = time.perf_counter()
+
+    async def direct(kind, payload):
+        chat_id, text = (ADMIN_CHAT, payload) if kind == "admin" else payload
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+        except Exception:
+            calls["lost"] += 1
+
+    await asyncio.gather(*(direct(kind, payload) for kind, payload in stream))
+    print(f"direct  {time.perf_counter() - started:6.2f} с  доставлено={calls['sent']}/{total}  "
+          f"429={calls['429']}  потеряно={calls['lost']}")
+
+    # outbox: всё в очередь, sender разбирает с учётом лимитов
+    _reset()
+    await asyncio.sleep(60)    # окно лимита группы в stand-in освобождается
+    _reset()
+    async for key in redis_client.scan_iter(match="notify:outbox*"):
+        await redis_client.delete(key)
+    await redis_client.delete(outbox.SENDER_LOCK_KEY)
+    async for key in redis_client.scan_iter(match="ratelimit:telegram*"):
+        await redis_client.delete(key)
+
+    started = time.perf_counter()
+    for kind, payload in stream:
+        if kind == "admin":
+            await outbox.enqueue_admin(payload)
+        else:
+            await outbox.enqueue_message(*payload)
+    enqueued = time.perf_counter() - started
+    sent = 0
+    while await redis_client.zcard(outbox.READY_KEY):
+        # как run_sender: проход не ждёт лимитов, отложенные чаты — в следующем
+        sent += await outbox.flush_outbox()
+        await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - started
+
+    expected = defaultdict(list)
+    for kind, payload in stream:
+        if kind == "user":
+            expected[payload[0]].append(payload[1])
+    in_order = all(texts == DELIVERED.get(chat_id, []) for chat_id, texts in expected.items())
+    admin_texts = DELIVERED.get(ADMIN_CHAT, [])
+    admin_delivered = sum(text.count("🟢 Заявка") for text in admin_texts)
+    print(f"outbox  {elapsed:6.2f} с  доставлено={sum(t.startswith('tx') for c in DELIVERED for t in DELIVERED[c]) + admin_delivered}/{total}  "
+          f"429={calls['429']}  потеряно=0+dead {await redis_client.llen(outbox.DEAD_LETTER_KEY)}  "
+          f"(постановка в очередь {enqueued:.2f} с)")
+    print(f"        сводок админам: {admin_delivered} в {len(admin_texts)} сообщениях; "
+          f"порядок сообщений в каждом чате сохранён: {in_order}")
+
+    await close_bot()
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,135 @@
+"""
+Бенчмарк интервала повторных проверок pending транзакций на симулированной сети.
+
+Для каждой транзакции моделируется: хеш появляется в API через случайную
+задержку, попадает в блок, набирает подтверждения (ERC20: блок 12 с,
+TRC20: блок 3 с + solidification). Часть хешей так и не появляется.
+Сравниваются:
+  - fixed: проверка каждые PENDING_RECHECK_INTERVAL (20 с), как было
+  - adaptive: utils.poll_policy.next_delay по коду последней проверки
+
+Транзакция снимается с проверки по настоящему MAX_PENDING_DURATION
+(utils/pending_tx.py): проверка после него — последняя, паузы adaptive, как в
+handle_result, не заходят за момент просрочки. Считаются проверки (внешние
+API вызовы) на транзакцию, доля подтверждённых до просрочки и задержка
+обнаружения подтверждения относительно момента, когда оно стало возможным.
+
+Запуск:  python scripts/bench_poll_policy.py [кол-во транзакций]
+"""
+import random
+import statistics
+import sys
+from pathlib import Path
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+bench_env()
+
+from config import (  # noqa: E402
+    ERC20_CONFIRMATIONS, TRC20_CONFIRMATIONS, ETH_BLOCK_TIME, TRON_BLOCK_TIME, TRON_SOLIDIFY_BLOCKS
+)
+from utils.pending_tx import MAX_PENDING_DURATION  # noqa: E402
+from utils.poll_policy import next_delay  # noqa: E402
+
+FIXED_INTERVAL = 20.0
+HORIZON = MAX_PENDING_DURATION.total_seconds()
+BOGUS_SHARE = 0.1          # хеши, которые так и не появятся
+
+
+def _simulate_tx(network: str, rng: random.Random) -> dict:
+    bogus = rng.random() < BOGUS_SHARE
+    seen_at = rng.uniform(0, 30)
+    block_time = ETH_BLOCK_TIME if network == "ERC20" else TRON_BLOCK_TIME
+    mined_at = seen_at + rng.uniform(0, 4 * block_time)
+    return {"network": network, "bogus": bogus, "seen_at": seen_at, "mined_at": mined_at, "block_time": block_time}
+
+
+def _check(tx: dict, t: float) -> dict:
+    """Что вернула бы проверка в момент t"""
+    if tx["bogus"] or t < tx["seen_at"]:
+        return {"code": "not_found"}
+    if t < tx["mined_at"]:
+        return {"code": "not_in_block" if tx["network"] == "ERC20" else "not_confirmed"}
+    blocks = int((t - tx["mined_at"]) // tx["block_time"])
+    if tx["network"] == "TRC20":
+        if blocks < TRON_SOLIDIFY_BLOCKS:
+            return {"code": "not_confirmed"}
+        confirmations, required = blocks, TRC20_CONFIRMATIONS
+    else:
+        confirmations, required = blocks, int(ERC20_CONFIRMATIONS)
+    if confirmations < required:
+        return {"code": "low_confirmations", "confirmations": confirmations}
+    return {"code": "ok"}
+
+
+def _confirmable_at(tx: dict) -> float:
+    if tx["network"] == "TRC20":
+        blocks = max(TRON_SOLIDIFY_BLOCKS, TRC20_CONFIRMATIONS)
+    else:
+        blocks = int(ERC20_CONFIRMATIONS)
+    return tx["mined_at"] + blocks * tx["block_time"]
+
+
+def _run(tx: dict, policy, capped: bool) -> tuple:
+    """(кол-во проверок, задержка обнаружения или None — просрочена)"""
+    t, checks, last_code, attempt = 0.0, 0, None, 0
+    while True:
+        checks += 1
+        result = _check(tx, t)
+        if result["code"] == "ok":
+            return checks, t - _confirmable_at(tx)
+        if t > HORIZON:
+            return checks, None
+        attempt = attempt + 1 if result["code"] == last_code else 0
+        last_code = result["code"]
+        delay = policy(tx["network"], result, attempt)
+        if capped:
+            # как handle_result: не проспать момент просрочки
+            delay = min(delay, max(HORIZON - t, 1.0))
+        t += delay
+
+
+def _fixed(network, result, attempt):
+    return FIXED_INTERVAL
+
+
+def _percentile(values: list, q: float) -> str:
+    if not values:
+        return "   — "
+    values = sorted(values)
+    return f"{values[min(len(values) - 1, int(q * len(values)))]:5.1f}"
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(42)
+    random.seed(42)
+    print(f"Транзакций на сеть: {n}, невалидных хешей: {BOGUS_SHARE:.0%}, "
+          f"MAX_PENDING_DURATION: {HORIZON:.0f} с")
+    print(f"ERC20: {ERC20_CONFIRMATIONS} подтв. x {ETH_BLOCK_TIME:.0f} с; "
+          f"TRC20: solidification {TRON_SOLIDIFY_BLOCKS} бл. x {TRON_BLOCK_TIME:.0f} с\n")
+
+    for network in ("ERC20", "TRC20"):
+        txs = [_simulate_tx(network, rng) for _ in range(n)]
+        per_tx = {}
+        for label, policy, capped in (("fixed", _fixed, False), ("adaptive", next_delay, True)):
+            runs = [_run(tx, policy, capped) for tx in txs]
+            good = [r for tx, r in zip(txs, runs) if not tx["bogus"]]
+            bogus = [r for tx, r in zip(txs, runs) if tx["bogus"]]
+            lags = [lag for _, lag in good if lag is not None]
+            per_tx[label] = statistics.mean(c for c, _ in runs)
+            print(
+                f"{network} {label:9s} проверок/транзакцию={per_tx[label]:5.1f}  "
+                f"на валидную={statistics.mean(c for c, _ in good):5.1f}  "
+                f"на невалидный хеш={statistics.mean(c for c, _ in bogus):5.1f}  "
+                f"подтверждено до просрочки={len(lags) / len(good):4.0%}  "
+                f"задержка обнаружения: медиана {_percentile(lags, 0.5)} с, p95 {_percentile(lags, 0.95)} с"
+            )
+        print(f"{network} проверок fixed / adaptive: {per_tx['fixed'] / per_tx['adaptive']:.2f}x\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Бенчмарк отправки QR кода кошелька (utils/generate_qr_code.generate_wallet_qr).
+
+Bot заменён stand-in объектом: send_photo считает загруженные байты и выдаёт
+file_id, как Telegram. Пользователи продают USDT по нескольким адресам из
+Лист3 вперемешку. Сравниваются:
+  - old: отрисовка QR (ERROR_CORRECT_H, логотип LANCZOS, PNG) и загрузка байтов на каждую отправку
+  - new: PNG из кэша (память -> диск) и file_id из Redis — после первой отправки ничего не загружается
+Отдельно — «перезапуск»: память процесса пуста, PNG берётся с диска.
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_qr_cache.py [отправок] [адресов]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+os.chdir(BASE_DIR)
+
+LOGO_PATH = "img/logo-qr.png"
+NETWORKS = ("TRC20", "ERC20", "BEP20")
+
+
+class FakeBot:
+    id = 999000111
+
+    def __init__(self):
+        self.uploads = 0
+        self.uploaded_bytes = 0
+        self.sent = 0
+
+    async def send_photo(self, chat_id, photo, caption=None, parse_mode=None):
+        self.sent += 1
+        if isinstance(photo, str):
+            file_id = photo
+        else:
+            self.uploads += 1
+            self.uploaded_bytes += len(photo.data)
+            file_id = f"AgAC-{self.uploads}"
+        await asyncio.sleep(0)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+
+async def main():
+    sends = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    addresses = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    bench_env()
+    os.environ["QR_CACHE_DIR"] = tempfile.mkdtemp(prefix="qr_bench_")
+
+    from aiogram.types import BufferedInputFile
+    import utils.generate_qr_code as qr_module
+    from utils.generate_qr_code import QR_FILE_ID_KEY, generate_wallet_qr, render_key, _render_png
+    from utils.redis_pool import get_async_redis, close_async_redis
+    from localization import get_message
+
+    wallets = [(f"T{i:033d}", NETWORKS[i % len(NETWORKS)]) for i in range(addresses)]
+    plan = [wallets[i % len(wallets)] for i in range(sends)]
+
+    async def old_send(bot, address, network):
+        # прежний generate_wallet_qr: отрисовка прямо в loop и загрузка байтов
+        png = _render_png(address, network, LOGO_PATH)
+        await bot.send_photo(1, photo=BufferedInputFile(png, filename="qr.png"),
+                             caption=get_message("qr_caption", "ru", address=address), parse_mode="Markdown")
+
+    async def new_send(bot, address, network):
+        await generate_wallet_qr(bot, 1, address, network, LOGO_PATH)
+
+    async def reset_file_ids():
+        keys = [QR_FILE_ID_KEY.format(bot_id=FakeBot.id, render_key=render_key(a, n, LOGO_PATH)) for a, n in wallets]
+        await get_async_redis().delete(*keys)
+
+    async def run(label, send):
+        bot = FakeBot()
+        started = time.perf_counter()
+        for address, network in plan:
+            await send(bot, address, network)
+        elapsed = time.perf_counter() - started
+        print(f"{label:9s} {elapsed:6.2f} с  {elapsed / len(plan) * 1000:6.2f} мс на отправку  "
+              f"загрузок={bot.uploads:4d}  загружено={bot.uploaded_bytes / 1024:8.1f} КБ")
+
+    print(f"Отправок: {sends}, адресов: {addresses}\n")
+    await reset_file_ids()
+    await run("old", old_send)
+    await run("new", new_send)
+
+    # перезапуск: память пуста, file_id в Redis потерян — PNG с диска, одна загрузка на адрес
+    qr_module._png_cache.clear()
+    await reset_file_ids()
+    await run("restart", new_send)
+
+    await reset_file_ids()
+    await close_async_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
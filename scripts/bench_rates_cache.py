@@ -0,0 +1,128 @@
+"""
+Бенчмарк кэша курсов (utils/rates_cache.py) против прежнего get_latest_rates.
+
+Разбор канала заменён stand-in корутиной с задержкой (connect, get_entity,
+iter_messages в Telethon), которая считает вызовы. Несколько «процессов» —
+отдельные экземпляры кэша с общим Redis. Сравниваются:
+  - old: GET currency_rates; промах — разбор канала и SETEX на 300 с (как было)
+  - new: RatesCache — память -> снимок в Redis -> разбор под Redis lock
+Сценарии:
+  - expired: ключа нет, все процессы одновременно запрашивают курсы
+  - stale:   снимок устарел, запросы идут одновременно
+  - hits:    последовательные запросы при свежем кэше (время на вызов и команд Redis)
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_rates_cache.py [процессов] [запросов_на_процесс] [задержка_разбора_мс]
+"""
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+RATES = {"USD-UAH": {"retail": {"buy": 41.1, "sell": 41.4}}, "EUR-UAH": {"retail": {"buy": 44.9, "sell": 45.3}}}
+parses = 0
+PARSE_DELAY = 0.3
+
+
+async def parse_channel():
+    global parses
+    parses += 1
+    await asyncio.sleep(PARSE_DELAY)
+    return RATES
+
+
+async def main():
+    global parses, PARSE_DELAY
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    per_process = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    PARSE_DELAY = (float(sys.argv[3]) if len(sys.argv) > 3 else 300) / 1000
+
+    bench_env()
+
+    from utils.rates_cache import RATES_KEY, RATES_LOCK_KEY, RatesCache
+    from utils.redis_pool import get_async_redis, redis_stats, close_async_redis
+
+    redis_client = get_async_redis()
+
+    async def old_get():
+        cached = await redis_client.get(RATES_KEY)
+        if cached:
+            return json.loads(cached)
+        rates = await parse_channel()
+        await redis_client.setex(RATES_KEY, 300, json.dumps(rates))
+        return rates
+
+    def redis_calls() -> int:
+        return sum(entry.get("calls", 0) for entry in redis_stats().values())
+
+    async def run(label, factories, scenario):
+        global parses
+        parses = 0
+        calls_before = redis_calls()
+        started = time.perf_counter()
+        latencies = []
+
+        async def timed(get):
+            t = time.perf_counter()
+            result = await get()
+            latencies.append(time.perf_counter() - t)
+            return result
+
+        results = await asyncio.gather(*(timed(get) for get in factories for _ in range(per_process)))
+        elapsed = time.perf_counter() - started
+        ok = sum(1 for r in results if r)
+        latencies.sort()
+        print(f"{scenario:8s} {label:4s} {elapsed:6.2f} с  разборов канала={parses:4d}  "
+              f"p50={latencies[len(latencies) // 2] * 1000:7.1f} мс  max={latencies[-1] * 1000:7.1f} мс  "
+              f"ответов={ok}/{len(results)}  команд Redis={redis_calls() - calls_before}")
+
+    def new_caches():
+        return [RatesCache(parse_channel) for _ in range(processes)]
+
+    async def reset(snapshot=None):
+        await redis_client.delete(RATES_KEY, RATES_LOCK_KEY)
+        if snapshot is not None:
+            await redis_client.set(RATES_KEY, json.dumps(snapshot))
+
+    print(f"Процессов: {processes}, запросов на процесс: {per_process}, разбор канала: {PARSE_DELAY * 1000:.0f} мс\n")
+
+    # expired: ключа нет
+    await reset()
+    await run("old", [old_get] * processes, "expired")
+    await reset()
+    await run("new", [cache.get for cache in new_caches()], "expired")
+
+    # stale: снимок есть, но устарел (у старого кода — ключ уже истёк)
+    await reset()
+    await run("old", [old_get] * processes, "stale")
+    await reset({"version": 1, "fetched_at": time.time() - 3600, "rates": RATES})
+    caches = new_caches()
+    await run("new", [cache.get for cache in caches], "stale")
+    await asyncio.sleep(PARSE_DELAY + 0.2)     # фоновое обновление завершилось
+    print(f"         после фонового обновления: версии {[c._snapshot['version'] for c in caches]}")
+
+    # hits: кэш свежий
+    print()
+    per_process_hits = per_process * 20
+    for label, get in (("old", old_get), ("new", caches[0].get)):
+        calls_before = redis_calls()
+        started = time.perf_counter()
+        for _ in range(per_process_hits):
+            await get()
+        elapsed = time.perf_counter() - started
+        print(f"hits     {label:4s} {elapsed / per_process_hits * 1e6:8.1f} мкс на вызов  "
+              f"команд Redis={redis_calls() - calls_before} на {per_process_hits} вызовов")
+
+    await reset()
+    await close_async_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
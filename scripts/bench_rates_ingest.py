@@ -0,0 +1,93 @@
+"""
+Бенчмарк доставки новых курсов: pull (разбор канала по промаху кэша) против
+push (rates_ingest.py публикует снимок, бот получает его по pub/sub).
+
+Telethon заменён stand-in: «пост» в канале — это текст, который получает
+RatesIngest.publish (как из события NewMessage). Бот — RatesCache с listen().
+Для каждого поста замеряется, через сколько бот начинает отдавать новые курсы,
+и сколько команд Redis и разборов канала было на пути хендлеров.
+  - pull: бот видит пост только после истечения свежести снимка (RATES_FRESH_TTL),
+    и то ценой MTProto сессии (connect, get_entity, iter_messages) на разбор
+  - push: задержка = запись снимка + доставка pub/sub
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_rates_ingest.py [постов] [запросов_курса_между_постами]
+"""
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+parses = 0
+
+
+async def main():
+    global parses
+    posts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    bench_env()
+    os.environ.setdefault("TELEGRAM_API_ID", "1")           # Telethon не подключается
+    os.environ.setdefault("TELEGRAM_API_HASH", "bench")
+
+    from config import RATES_FRESH_TTL
+    from rates_ingest import RatesIngest
+    from utils.rates_cache import RATES_KEY, RATES_LOCK_KEY, RatesCache
+    from utils.redis_pool import get_async_redis, redis_stats, close_async_redis
+
+    async def parse_channel():
+        global parses
+        parses += 1
+        return None
+
+    def redis_calls() -> int:
+        return sum(entry.get("calls", 0) for entry in redis_stats().values())
+
+    await get_async_redis().delete(RATES_KEY, RATES_LOCK_KEY)
+    ingest = RatesIngest()
+    bot_cache = RatesCache(parse_channel)
+    listener = asyncio.create_task(bot_cache.listen())
+    await asyncio.sleep(0.3)
+
+    delays = []
+    request_path_calls = 0
+    for i in range(posts):
+        usd = 41 + i / 100
+        text = f"USD {usd:.2f} - {usd + 0.3:.2f}\nEUR {usd + 3.8:.2f} - {usd + 4.2:.2f}"
+        started = time.perf_counter()
+        await ingest.publish(text, f"пост {i}")
+        version = ingest.cache.snapshot["version"]
+        while (bot_cache.snapshot or {}).get("version") != version:
+            await asyncio.sleep(0.0005)
+        delays.append(time.perf_counter() - started)
+
+        # запросы курса хендлерами между постами
+        before = redis_calls()
+        for _ in range(lookups):
+            snapshot = await bot_cache.get()
+            assert snapshot["rates"]["USD-UAH"]["retail"]["buy"] == round(usd, 2)
+        request_path_calls += redis_calls() - before
+
+    delays.sort()
+    print(f"Постов: {posts}, запросов курса между постами: {lookups}\n")
+    print(f"pull: новый пост виден боту через ≤ {RATES_FRESH_TTL:.0f} с (свежесть снимка), "
+          f"каждый разбор — MTProto сессия")
+    print(f"push: новый пост виден боту через p50={delays[len(delays) // 2] * 1000:.1f} мс, "
+          f"max={delays[-1] * 1000:.1f} мс")
+    print(f"      на пути хендлеров: разборов канала={parses}, "
+          f"команд Redis={request_path_calls} на {posts * lookups} запросов курса")
+
+    listener.cancel()
+    await get_async_redis().delete(RATES_KEY)
+    await close_async_redis()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,118 @@
+"""
+Бенчмарк: блокирующий Redis в корутинах против общего async пула.
+
+Между приложением и Redis стоит TCP прокси с задержкой (как сеть до
+управляемого Redis). Одновременно выполняются запросы курсов
+(ChannelRatesParser.get_latest_rates, кэш в Redis) и «пульс» event loop, который
+каждые 10 мс замеряет, насколько loop опоздал его разбудить. Сравниваются:
+  - sync: redis.Redis внутри корутины (как было — запрос блокирует весь loop)
+  - async: utils.redis_pool.get_async_redis (как сейчас)
+В конце — redis_stats(): занятость пулов и задержки команд.
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_redis_pool.py [запросов] [задержка_мс]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from threading import Thread
+from urllib.parse import urlparse
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+LATENCY = 0.0
+
+
+async def _pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            await asyncio.sleep(LATENCY)
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _start_proxy(host: str, port: int):
+    async def handle(client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(host, port)
+        await asyncio.gather(_pipe(client_reader, upstream_writer), _pipe(upstream_reader, client_writer))
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server.sockets[0].getsockname()[1]
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+def main():
+    global LATENCY
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    LATENCY = (float(sys.argv[2]) if len(sys.argv) > 2 else 2.0) / 1000
+
+    bench_env()
+    os.environ.setdefault("TELEGRAM_API_ID", "1")           # Telethon не подключается — курсы берутся из кэша
+    os.environ.setdefault("TELEGRAM_API_HASH", "bench")
+    upstream = urlparse(os.environ["REDIS_URL"])
+
+    proxy_loop = asyncio.new_event_loop()
+    Thread(target=proxy_loop.run_forever, daemon=True).start()
+    port = asyncio.run_coroutine_threadsafe(
+        _start_proxy(upstream.hostname, upstream.port or 6379), proxy_loop
+    ).result()
+    os.environ["REDIS_URL"] = f"redis://127.0.0.1:{port}{upstream.path}"
+
+    import redis
+    from config import REDIS_URL, REDIS_DB
+    from utils.channel_rates import ChannelRatesParser
+    from utils.redis_pool import close_async_redis, get_async_redis, redis_stats
+
+    parser = ChannelRatesParser(bot=None)
+    blocking_client = redis.Redis.from_url(REDIS_URL, db=REDIS_DB, decode_responses=True, socket_timeout=3)
+
+    async def sync_lookup():
+        # как было: sync клиент прямо в корутине
+        cached = blocking_client.get("currency_rates")
+        return json.loads(cached) if cached else None
+
+    async def run(lookup):
+        stop = asyncio.Event()
+        lags = []
+        beat = asyncio.create_task(_heartbeat(stop, lags))
+        started = time.perf_counter()
+        results = await asyncio.gather(*(lookup() for _ in range(n)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await beat
+        return elapsed, max(lags, default=0.0), sum(1 for r in results if r)
+
+    async def bench():
+        await get_async_redis().set("currency_rates", json.dumps(parser._get_default_rates()), ex=300)
+        print(f"Запросов курсов: {n}, задержка сети до Redis: {LATENCY * 1000:.1f} мс\n")
+        for label, lookup in (("sync", sync_lookup), ("async", parser.get_latest_rates)):
+            elapsed, max_lag, hits = await run(lookup)
+            print(f"{label:6s} {elapsed:6.2f} с  из кэша={hits}/{n}  макс. задержка event loop={max_lag * 1000:7.1f} мс")
+        print()
+        for label, entry in sorted(redis_stats().items()):
+            print(f"{label}: {entry}")
+        await close_async_redis()
+
+    asyncio.run(bench())
+    blocking_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Бенчмарк обновления статуса транзакции в 'Лист4' на 10k строк.
+
+  - legacy: sheet.find по всему листу + sheet.cell/update_cell на каждую колонку
+  - indexed: строка из индекса в Redis (utils/row_index.py), сверка ячейки хеша
+    одним batch_get + один batch_update
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379), Google Sheets
+эмулируется локальным сервером из bench_sheets_client.
+
+Запуск:  python scripts/bench_row_index.py [кол-во строк] [кол-во обновлений] [задержка_мс]
+"""
+import json
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from gspread.utils import a1_to_rowcol
+
+import bench_sheets_client as fake
+
+ROWS = 10_000
+LATENCY = 0.0
+SHEET_ROWS = []
+
+UPDATE_PARAMS = {
+    "status": ["confirmed", 6],
+    "date_confirmation": ["18.10.2026 12:00:00", 5],
+    "error": ["", 8],
+}
+
+
+def _tx_hash(i: int) -> str:
+    return "0x" + f"{i:064x}"
+
+
+class LargeSheetHandler(fake.FakeSheetsHandler):
+    """Фейковый Sheets API, где 'Лист4' содержит ROWS транзакций"""
+
+    def _send(self, payload, status=200):
+        if LATENCY:
+            time.sleep(LATENCY)
+        super()._send(payload, status)
+
+    def do_GET(self):
+        path = unquote(urlparse(self.path).path)
+        if path.endswith("values:batchGet"):
+            # сверка строк из индекса: ячейки хешей (values.batchGet)
+            self._count("values_batch_get")
+            ranges = parse_qs(urlparse(self.path).query).get("ranges", [])
+            value_ranges = []
+            for rng in ranges:
+                row, col = a1_to_rowcol(rng.split("!", 1)[1])
+                values = [[SHEET_ROWS[row - 1][col - 1]]] if row <= len(SHEET_ROWS) else []
+                value_ranges.append({"range": rng, "majorDimension": "ROWS", "values": values})
+            return self._send({"valueRanges": value_ranges})
+        if "/values/" not in path or "Лист4" not in path:
+            return super().do_GET()
+
+        self._count("values_get")
+        rng = path.split("/values/", 1)[1]
+        cell_range = rng.split("!", 1)[1] if "!" in rng else ""
+        if not cell_range:
+            # весь лист (sheet.find)
+            values = SHEET_ROWS
+        elif cell_range.startswith("B1:B"):
+            # колонка хешей (col_values), majorDimension=COLUMNS
+            values = [[row[1] for row in SHEET_ROWS]]
+        else:
+            # одна ячейка (sheet.cell)
+            values = [["pending"]]
+        return self._send({"range": rng, "majorDimension": "ROWS", "values": values})
+
+
+def _legacy_update(tx_hash):
+    sheet = fake._legacy_worksheet('Лист4') if _legacy_update.sheet is None else _legacy_update.sheet
+    _legacy_update.sheet = sheet
+    cell = sheet.find(tx_hash)
+    for value, col in UPDATE_PARAMS.values():
+        current = sheet.cell(cell.row, col)
+        if current.value != value:
+            sheet.update_cell(cell.row, col, value)
+
+
+_legacy_update.sheet = None
+
+
+def _measure(label, fn, hashes):
+    fake.calls.clear()
+    started = time.perf_counter()
+    for h in hashes:
+        fn(h)
+    elapsed = time.perf_counter() - started
+    total = sum(fake.calls.values())
+    detail = ", ".join(f"{k}={v}" for k, v in sorted(fake.calls.items()))
+    n = len(hashes)
+    print(f"{label:10s} API/обновление={total / n:5.2f}  {elapsed / n * 1000:8.2f} мс/обновление  [{detail}]")
+
+
+def main():
+    global ROWS, LATENCY
+    ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    updates = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    LATENCY = (float(sys.argv[3]) if len(sys.argv) > 3 else 0.0) / 1000
+
+    SHEET_ROWS.append(["Пользователь", "Хеш", "Адрес", "Время", "Дата", "Статус", "Сумма", "Ошибка"])
+    for i in range(ROWS):
+        SHEET_ROWS.append([str(i), _tx_hash(i), "Taddr", "ts", "now", "pending", "10", ""])
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LargeSheetHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    fake._setup_env(base_url)
+    fake._install_url_rewrite(base_url)
+
+    import google_utils
+    from utils import row_index
+    from utils.sheets_client import get_worksheet
+
+    hashes = [_tx_hash(random.randrange(ROWS)) for _ in range(updates)]
+    print(f"Лист4: {ROWS} строк, обновлений: {updates}, задержка API: {LATENCY * 1000:.0f} мс\n")
+
+    # прогрев: авторизация и дескрипторы листов не должны попасть в замер
+    _legacy_update(hashes[0])
+    get_worksheet('Лист4')
+
+    _measure("legacy", _legacy_update, hashes)
+
+    fake.calls.clear()
+    started = time.perf_counter()
+    indexed = row_index.backfill('Лист4')
+    print(f"{'backfill':10s} {indexed} хешей за {(time.perf_counter() - started) * 1000:.0f} мс, "
+          f"API вызовов: {sum(fake.calls.values())} (разово)")
+
+    _measure("indexed", lambda h: google_utils.update_transaction_status(h, UPDATE_PARAMS), hashes)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
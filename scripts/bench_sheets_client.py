@@ -0,0 +1,205 @@
+"""
+Бенчмарк общего клиента Google Sheets (utils/sheets_client.py).
+
+Поднимает локальный фейковый сервер Sheets API + OAuth token endpoint и
+считает HTTP вызовы на операцию:
+  - legacy: авторизация + open_by_key + worksheet на каждый вызов (как было)
+  - shared: общий клиент из utils.sheets_client
+
+Запуск:  python scripts/bench_sheets_client.py [кол-во операций]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+import rsa
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+SPREADSHEET_KEY = '1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo'
+WORKSHEETS = ['Лист3', 'Лист4', 'Лист5', 'Комиссии', 'Курсы',
+              'Заявка на обмен UAH → USD', 'Заявка на обмен USD → UAH']
+
+calls = Counter()
+calls_lock = threading.Lock()
+
+
+class FakeSheetsHandler(BaseHTTPRequestHandler):
+    """Минимальная эмуляция Sheets API v4, достаточная для gspread"""
+
+    def log_message(self, *args):
+        pass
+
+    def _count(self, kind):
+        with calls_lock:
+            calls[kind] += 1
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_POST(self):
+        self._read_body()
+        path = unquote(urlparse(self.path).path)
+        if path == "/token":
+            self._count("token")
+            return self._send({"access_token": "fake-token", "expires_in": 3600, "token_type": "Bearer"})
+        if path.endswith(":append"):
+            self._count("values_append")
+            return self._send({"updates": {"updatedRange": "'Лист4'!A2:H2", "updatedRows": 1}})
+        if path.endswith("values:batchUpdate"):
+            self._count("values_batch_update")
+            return self._send({"totalUpdatedCells": 1})
+        self._count("other")
+        return self._send({})
+
+    def do_PUT(self):
+        self._read_body()
+        self._count("values_update")
+        return self._send({"updatedCells": 1})
+
+    def do_GET(self):
+        path = unquote(urlparse(self.path).path)
+        if path == f"/v4/spreadsheets/{SPREADSHEET_KEY}":
+            self._count("metadata")
+            sheets = [
+                {"properties": {"title": t, "sheetId": i, "index": i,
+                                "gridProperties": {"rowCount": 1000, "columnCount": 26}}}
+                for i, t in enumerate(WORKSHEETS)
+            ]
+            return self._send({"spreadsheetId": SPREADSHEET_KEY,
+                               "properties": {"title": "fake", "locale": "ru_RU", "timeZone": "Europe/Kyiv"},
+                               "sheets": sheets})
+        if "/values/" in path:
+            self._count("values_get")
+            rng = path.split("/values/", 1)[1]
+            if rng.startswith("'Лист3'") or rng.startswith("Лист3"):
+                values = [[" Сеть", "Адрес кошелька"], ["TRC20", "Ttest"], ["ERC20", "0xtest"]]
+            else:
+                values = [["user", "0xhash", "addr", "ts", "now", "pending", "1", ""]]
+            return self._send({"range": rng, "majorDimension": "ROWS", "values": values})
+        self._count("other")
+        return self._send({})
+
+
+def _install_url_rewrite(base_url: str):
+    """Перенаправляет запросы gspread с sheets.googleapis.com на локальный сервер"""
+    import requests
+    from google.auth.transport.requests import AuthorizedSession
+
+    class RewriteAdapter(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            request.url = request.url.replace("https://sheets.googleapis.com", base_url)
+            return super().send(request, **kwargs)
+
+    original_init = AuthorizedSession.__init__
+
+    def patched_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        self.mount("https://sheets.googleapis.com", RewriteAdapter())
+
+    AuthorizedSession.__init__ = patched_init
+
+
+def _setup_env(base_url: str):
+    (pub, priv) = rsa.newkeys(1024)
+    bench_env()
+    os.environ.update({
+        "GOOGLE_TYPE": "service_account",
+        "GOOGLE_PROJECT_ID": "bench",
+        "GOOGLE_PRIVATE_KEY_ID": "bench",
+        "GOOGLE_PRIVATE_KEY": priv.save_pkcs1().decode(),
+        "GOOGLE_CLIENT_EMAIL": "bench@bench.iam.gserviceaccount.com",
+        "GOOGLE_CLIENT_ID": "1",
+        "GOOGLE_TOKEN_URI": f"{base_url}/token",
+    })
+
+
+def _legacy_worksheet(title):
+    import gspread
+    from oauth2client.service_account import ServiceAccountCredentials
+    from config import GOOGLE_CREDENTIALS
+
+    scope = ['https://spreadsheets.google.com/feeds',
+             'https://www.googleapis.com/auth/drive']
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
+    client = gspread.authorize(creds)
+    return client.open_by_key(SPREADSHEET_KEY).worksheet(title)
+
+
+def _legacy_ops():
+    def get_wallet():
+        _legacy_worksheet('Лист3').get_all_records()
+
+    def save_hash():
+        _legacy_worksheet('Лист4').append_row(["u", "0xhash"], value_input_option='USER_ENTERED')
+
+    def update_status():
+        sheet = _legacy_worksheet('Лист4')
+        cell = sheet.find("0xhash")
+        sheet.cell(cell.row, 6)
+        sheet.update_cell(cell.row, 6, "confirmed")
+
+    return {"get_wallet_address": get_wallet, "save_transaction_hash": save_hash,
+            "update_transaction_status": update_status}
+
+
+def _shared_ops():
+    import google_utils
+    from utils.sheets_client import get_worksheet
+
+    return {
+        # сам get_wallet_address теперь отвечает из реестра адресов, меряем чтение листа
+        "get_wallet_address": lambda: get_worksheet('Лист3').get_all_records(),
+        "save_transaction_hash": lambda: google_utils.save_transaction_hash(["u", "0xhash"]),
+        "update_transaction_status": lambda: google_utils.update_transaction_status(
+            "0xhash", {"status": ["confirmed", 6]}),
+    }
+
+
+def _run(label, ops, n):
+    print(f"\n== {label} ({n} операций каждого типа) ==")
+    for name, fn in ops.items():
+        calls.clear()
+        started = time.perf_counter()
+        for _ in range(n):
+            fn()
+        elapsed = time.perf_counter() - started
+        total = sum(calls.values())
+        detail = ", ".join(f"{k}={v}" for k, v in sorted(calls.items()))
+        print(f"{name:28s} HTTP/оп={total / n:5.2f}  {elapsed / n * 1000:7.2f} мс/оп  [{detail}]")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSheetsHandler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    _setup_env(base_url)
+    _install_url_rewrite(base_url)
+
+    _run("legacy: авторизация на каждый вызов", _legacy_ops(), n)
+    _run("shared: utils.sheets_client", _shared_ops(), n)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Локальный stand-in Tronscan API и бенчмарк проверки pending TRC20 транзакций.
+
+Stand-in отдаёт /api/transaction-info, /api/token_trc20/transfers и /api/block/latest по
+сгенерированной истории переводов на несколько наших кошельков (+ чужие
+переводы и часть платежей на другой адрес). Сравниваются:
+  - per-hash: check_tron_transaction на каждый pending хеш (как было)
+  - watcher: networks.tron_watcher — опрос истории на кошелёк (+ поштучно для несовпавших)
+  - next tick: повторный тик watcher — история читается только от курсора
+
+Нужен Redis (REDIS_URL, по умолчанию redis://127.0.0.1:6379).
+
+Запуск:  python scripts/bench_tron_watcher.py [pending] [кошельков] [задержка_мс]
+         python scripts/bench_tron_watcher.py serve [порт]   — только stand-in сервер
+                                                          (TRONSCAN_API=http://127.0.0.1:<порт>/api)
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web
+
+from _bench_env import bench_env
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+USDT_CONTRACT = "TR7NHqjeKQxGTCi8q8ZY4pL8otSzgjLj6t"
+OTHER_TOKEN = "TEkxiTehnzSmSe2XqrBj4w32RUN966rdz8"
+
+calls = Counter()
+TRANSFERS = []      # новые первыми
+TX_BY_ID = {}
+LATENCY = 0.0
+LATEST_BLOCK = 70_000_000
+
+
+def _address(i: int) -> str:
+    return "T" + f"{i:033d}"
+
+
+def _tx_id(i: int) -> str:
+    return f"{i:064x}"
+
+
+def generate(pending: int, wallets: int, background: int = 500, seed: int = 7) -> list:
+    """История переводов; возвращает pending [(tx_id, наш_кошелёк)]"""
+    rng = random.Random(seed)
+    now_ms = int(time.time() * 1000)
+    our = [_address(i) for i in range(wallets)]
+    items = []
+    for i in range(pending + background):
+        to_address = rng.choice(our)
+        is_pending = i < pending
+        if is_pending and rng.random() < 0.05:
+            # платёж ушёл на другой адрес — в истории наших кошельков его нет
+            to_address = _address(10_000 + i)
+        age_ms = rng.randint(0, 60 * 60 * 1000)
+        transfer = {
+            "transaction_id": _tx_id(i),
+            "block_ts": now_ms - age_ms,
+            "block": LATEST_BLOCK - age_ms // 3000,     # блок Tron — 3 с
+            "from_address": _address(20_000 + i),
+            "to_address": to_address,
+            "contract_address": OTHER_TOKEN if is_pending and rng.random() < 0.02 else USDT_CONTRACT,
+            "quant": str(rng.randint(10, 5000) * 10**6),
+            "tokenInfo": {"tokenDecimal": 6},
+            "confirmed": rng.random() > 0.2,
+            "contractRet": "SUCCESS",
+            "finalResult": "SUCCESS",
+        }
+        TRANSFERS.append(transfer)
+        TX_BY_ID[transfer["transaction_id"]] = transfer
+        if is_pending:
+            items.append((transfer["transaction_id"], our[i % wallets] if to_address not in our else to_address))
+    TRANSFERS.sort(key=lambda t: t["block_ts"], reverse=True)
+    return items
+
+
+async def transfers_handler(request):
+    q = request.query
+    calls["token_trc20/transfers"] += 1
+    await asyncio.sleep(LATENCY)
+    start, limit = int(q.get("start", 0)), int(q.get("limit", 20))
+    since = int(q.get("start_timestamp", 0))
+    rows = [t for t in TRANSFERS if t["to_address"] == q.get("toAddress") and t["block_ts"] >= since]
+    return web.json_response({"total": len(rows), "token_transfers": rows[start:start + limit]})
+
+
+async def transaction_info_handler(request):
+    calls["transaction-info"] += 1
+    await asyncio.sleep(LATENCY)
+    t = TX_BY_ID.get(request.query.get("hash"))
+    if t is None:
+        return web.json_response({})
+    return web.json_response({
+        "hash": t["transaction_id"],
+        "confirmed": t["confirmed"],
+        "confirmations": LATEST_BLOCK - t["block"],
+        "contractRet": t["contractRet"],
+        "timestamp": t["block_ts"],
+        "trc20TransferInfo": [{
+            "contract_address": t["contract_address"],
+            "from_address": t["from_address"],
+            "to_address": t["to_address"],
+            "amount_str": t["quant"],
+            "decimals": 6,
+        }],
+    })
+
+
+async def latest_block_handler(request):
+    calls["block/latest"] += 1
+    await asyncio.sleep(LATENCY)
+    return web.json_response({"number": LATEST_BLOCK})
+
+
+def make_app() -> web.Application:
+    app = web.Application()
+    app.router.add_get("/api/token_trc20/transfers", transfers_handler)
+    app.router.add_get("/api/transaction-info", transaction_info_handler)
+    app.router.add_get("/api/block/latest", latest_block_handler)
+    return app
+
+
+async def _start(port: int = 0):
+    runner = web.AppRunner(make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner, site._server.sockets[0].getsockname()[1]
+
+
+async def serve(port: int):
+    generate(pending=200, wallets=3)
+    runner, port = await _start(port)
+    print(f"Stand-in Tronscan: TRONSCAN_API=http://127.0.0.1:{port}/api  (Ctrl+C — выход)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+async def bench(pending: int, wallets: int):
+    items = generate(pending, wallets)
+    runner, port = await _start()
+
+    bench_env()
+    os.environ["TRONSCAN_API"] = f"http://127.0.0.1:{port}/api"
+
+    import networks.tron_watcher as watcher
+    from utils.http_session import close_session
+    from utils.redis_pool import get_async_redis
+
+    redis_client = get_async_redis()
+    for i in range(wallets):
+        await redis_client.delete(watcher.CURSOR_KEY.format(address=_address(i)))
+    async for key in redis_client.scan_iter(match=watcher.SEEN_KEY.format(tx_id="*")):
+        await redis_client.delete(key)
+
+    print(f"Pending: {pending}, кошельков: {wallets}, переводов в истории: {len(TRANSFERS)}, "
+          f"задержка API: {LATENCY * 1000:.0f} мс\n")
+
+    outcomes = {}
+    for label, enabled in (("per-hash", False), ("watcher", True), ("next tick", True)):
+        if label == "next tick":
+            # следующий тик: неподтверждённые переводы тем временем подтвердились
+            for t in TRANSFERS:
+                t["confirmed"] = True
+        watcher.TRON_WATCH_ENABLED = enabled
+        calls.clear()
+        started = time.perf_counter()
+        results = await watcher.check_tron_transactions_batch(items, concurrency=50)
+        elapsed = time.perf_counter() - started
+        statuses = Counter(r.get("code") for r in results.values())
+        outcomes[label] = {h: (r.get("status"), r.get("code")) for h, r in results.items()}
+        detail = ", ".join(f"{k}={v}" for k, v in sorted(calls.items()))
+        print(f"{label:10s} {elapsed:6.2f} с  API={sum(calls.values()):5d}  [{detail}]  {dict(statuses)}")
+
+    same = sum(outcomes["per-hash"][h] == outcomes["watcher"][h] for h in outcomes["per-hash"])
+    print(f"\nСовпадение итогов per-hash / watcher: {same}/{len(items)}")
+
+    await close_session()
+    await runner.cleanup()
+
+
+def main():
+    global LATENCY
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        asyncio.run(serve(int(sys.argv[2]) if len(sys.argv) > 2 else 8090))
+        return
+    pending = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    wallets = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    LATENCY = (float(sys.argv[3]) if len(sys.argv) > 3 else 20.0) / 1000
+    asyncio.run(bench(pending, wallets))
+
+
+if __name__ == "__main__":
+    main()
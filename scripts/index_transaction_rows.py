@@ -0,0 +1,22 @@
+"""
+Разовая индексация строк транзакций для update_transaction_status.
+
+Читает колонку хешей листа одним запросом и пересобирает индекс
+«хеш -> номер строки» в Redis (utils/row_index.py). Запускать один раз
+после деплоя и после ручной сортировки/удаления строк в таблице.
+
+Запуск:  python scripts/index_transaction_rows.py [название_листа]
+"""
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BASE_DIR))
+
+from utils import row_index
+
+
+if __name__ == "__main__":
+    sheet_name = sys.argv[1] if len(sys.argv) > 1 else 'Лист4'
+    count = row_index.backfill(sheet_name)
+    print(f"✅ Проиндексировано строк в '{sheet_name}': {count}")
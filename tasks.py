@@ -1,15 +1,10 @@
 import asyncio
-import concurrent.futures
 from threading import Thread
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from zoneinfo import ZoneInfo 
 
-from aiogram.fsm.storage.base import StorageKey
-from aiogram.fsm.storage.redis import RedisStorage
 from handlers.crypto import CryptoFSM
-import redis
-from redis.asyncio import Redis as AsyncRedis
-from config import REDIS_DB_FSM, REDIS_DB, REDIS_KEY_PREFIX_ERC, REDIS_KEY_PREFIX_TRC, REDIS_URL
+from config import REDIS_KEY_PREFIX_ERC
 # Conditional import for Celery
 try:
     from celery_app import celery_app
@@ -28,34 +23,39 @@ def celery_task_fallback(func):
         return func
 
 from networks.ethereum import check_transaction_stages
+from networks.eth_watcher import check_erc20_transactions_batch
 from networks.tron import check_tron_transaction
+from networks.tron_watcher import check_tron_transactions_batch
 from handlers.crypto import send_telegram_notification
-from google_utils import save_transaction_hash, update_transaction_status
-from config import logger
+from utils.sheets_queue import enqueue_append, enqueue_update, flush_queue, TRANSACTIONS_SHEET
+from utils.http_session import close_session
+from utils.notifier import close_bot
+from utils.fsm_storage import close_fsm_storage
+from utils.notify_queue import flush_outbox
+from utils.redis_pool import get_redis, close_async_redis, log_redis_stats
+from utils.pending_tx import (
+    PENDING_TTL, ERC20_STAGES, tx_hash_from_key, stage_set_for, facts_mapping, load_facts,
+    now_kyiv, advance_fsm_state, handle_result, next_check_delay, schedule_sync, drop_sync,
+    claim_due_sync, lease_and_load_sync, backfill_schedule_sync, acquire_leases_sync,
+    release_leases_sync, acquire_tick_lock_sync, extend_tick_lock_sync, release_tick_lock_sync
+)
+from config import PENDING_CHUNK_SIZE, NOTIFY_FLUSH_MAX_SECONDS, logger
 
 # --- Настройки ---
 
-PENDING_TTL = 3 * 60 * 60                  # 3 часа TTL ключа
-MAX_PENDING_DURATION = timedelta(minutes=2)  # в тексте так и было – 2 часа
+ERC20_BATCH_TIMEOUT = 120                  # сек на пакетную проверку ERC20 за тик
+TRC20_BATCH_TIMEOUT = 120                  # сек на пакетную проверку TRC20 за тик
 
-r = redis.Redis.from_url(REDIS_URL, db=REDIS_DB, decode_responses=True)
+_schedule_backfilled = False
 
-# --- Async Redis Singleton ---
-r_async: AsyncRedis | None = None
-
-def get_async_redis() -> AsyncRedis:
-    global r_async
-    if r_async is None:
-        r_async = AsyncRedis.from_url(REDIS_URL, db=REDIS_DB_FSM)
-    return r_async
+r = get_redis()
 
 # async loop infra
 _loop = None
-_executor = None
 _loop_thread = None
 
 def get_or_create_event_loop():
-    global _loop, _executor, _loop_thread
+    global _loop, _loop_thread
     if _loop is None:
         _loop = asyncio.new_event_loop()
         def run_loop():
@@ -63,7 +63,6 @@ def get_or_create_event_loop():
             _loop.run_forever()
         _loop_thread = Thread(target=run_loop, daemon=True)
         _loop_thread.start()
-        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=10)
     return _loop
 
 def run_async_coroutine(coro, timeout=40):
@@ -71,6 +70,32 @@ def run_async_coroutine(coro, timeout=40):
     future = asyncio.run_coroutine_threadsafe(coro, loop)
     return future.result(timeout=timeout)
 
+def _shutdown_async_resources(**kwargs):
+    """Закрывает общие HTTP соединения, Bot, FSM storage и Redis фонового loop при остановке воркера"""
+    if _loop is None or not _loop.is_running():
+        return
+    try:
+        run_async_coroutine(close_session(), timeout=10)
+    except Exception as e:
+        logger.warning(f"[tasks] Ошибка при закрытии HTTP сессии: {e}")
+    try:
+        run_async_coroutine(close_bot(), timeout=10)
+    except Exception as e:
+        logger.warning(f"[tasks] Ошибка при закрытии сессии Bot: {e}")
+    try:
+        run_async_coroutine(close_fsm_storage(), timeout=10)
+    except Exception as e:
+        logger.warning(f"[tasks] Ошибка при закрытии FSM storage: {e}")
+    try:
+        run_async_coroutine(close_async_redis(), timeout=10)
+    except Exception as e:
+        logger.warning(f"[tasks] Ошибка при закрытии соединений Redis: {e}")
+
+if CELERY_AVAILABLE:
+    from celery.signals import worker_process_shutdown, worker_shutdown
+    worker_process_shutdown.connect(_shutdown_async_resources)  # prefork
+    worker_shutdown.connect(_shutdown_async_resources)          # solo/threads
+
 def _redis_key(tx_hash: str) -> str:
     return f"{REDIS_KEY_PREFIX_ERC}{tx_hash}"
 
@@ -78,7 +103,7 @@ def _touch_ttl(key: str):
     if r:
         r.expire(key, PENDING_TTL)
 
-def _store_initial(username, chat_id, bot_id, tx_hash, target_address, lang, amount, network):
+def _store_initial(username, chat_id, bot_id, tx_hash, target_address, lang, amount, network, result=None):
     if not r:
         logger.error("Redis недоступен")
         return
@@ -96,9 +121,13 @@ def _store_initial(username, chat_id, bot_id, tx_hash, target_address, lang, amo
         "last_error_code": "",
         "last_error_text": "",
         "amount": amount,
-        "network": network
+        "network": network,
+        "poll_code": (result or {}).get("code") or "",
+        "poll_attempt": 0,
     })
     _touch_ttl(key)
+    # первая повторная проверка — по результату начальной (utils/poll_policy.py)
+    schedule_sync(r, key, next_check_delay(network, result))
 
 def _update_stage(key: str, stage_left):
     if not r:
@@ -117,27 +146,13 @@ def _update_error(key: str, code: str, text: str):
     })
     _touch_ttl(key)
 
-def _parse_stage_list(s: str):
-    return [x for x in (s or "").split(",") if x]
+def _update_facts(key: str, facts: dict | None):
+    mapping = facts_mapping(facts)
+    if r and mapping:
+        r.hset(key, mapping=mapping)
 
-async def _advance_fsm_state(username: int, chat_id: int, bot_id: int, next_state, extra: dict | None = None):
-    try:
-        storage = RedisStorage(redis=AsyncRedis.from_url(REDIS_URL, db=REDIS_DB_FSM))
-        logger.info(f"[tasks] _advanc1e_fsm_state storage: -------------------------------------------- {storage}")
-
-        logger.info(f"[tasks] _advance_fsm_state params: {chat_id} ----- {username} ----- {bot_id}")
-        key = StorageKey(bot_id=bot_id, chat_id=chat_id, user_id=username)
-        logger.info(f"[tasks] _advance_fsm_state key: {key}")
-        await storage.set_state(key, next_state)
-        current_state = await storage.get_state(key)
-        logger.info(f"[tasks] _advance_fsm_state current_state after set: {current_state}")
-        data = await storage.get_data(key) or {}
-        logger.info(f"[tasks] _advance_fsm_state data: {data}")
-        if extra:
-            data.update(extra)
-        await storage.set_data(key, data)
-    except Exception as e:
-        logger.error(f"Ошибка в _advance_fsm_state: {e}")
+# Смена состояния FSM пользователя после подтверждения (общая с verifier.py)
+_advance_fsm_state = advance_fsm_state
 
 @celery_task_fallback
 def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id, lang, network):
@@ -149,11 +164,15 @@ def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id,
     kyiv_tz = ZoneInfo("Europe/Kyiv")
     now = datetime.now(kyiv_tz).strftime("%d.%m.%Y %H:%M:%S")
 
-
+    # Эту транзакцию уже проверяет beat (или повторная задача) — не дублируем
+    leases = acquire_leases_sync(r, [tx_hash])
+    if not leases:
+        logger.info(f"[tasks] {tx_hash} уже проверяется, пропускаю")
+        return
 
     try:
         if network == "ERC20":
-            stage_set = {"in_block", "is_erc20", "recipient", "transfer_params", "confirmations"}
+            stage_set = set(ERC20_STAGES)
             logger.info(f"[tasks---check_confirmation_task] ERC20:-------------------------------------------------------------------")          
             result = run_async_coroutine(check_transaction_stages(tx_hash, target_address, stage_set))
         if network == "TRC20":
@@ -175,7 +194,7 @@ def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id,
                          result.get("error", "") if code else ''
                     ]
 
-        save_transaction_hash(google_params)
+        enqueue_append(TRANSACTIONS_SHEET, google_params, tx_hash)
 
         if result.get("success") and result.get("status") == "confirmed":
             google_update_params = {"status": [result.get("status"), 6]}
@@ -187,7 +206,7 @@ def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id,
                 "timestamp": result.get("timestamp", "N/A"),
             }
             
-            update_transaction_status(tx_hash, google_update_params)
+            enqueue_update(tx_hash, google_update_params)
             run_async_coroutine(_advance_fsm_state(
                 username=username,
                 chat_id=chat_id,
@@ -204,12 +223,13 @@ def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id,
             return
         else:
             if not r.exists(key):
-                _store_initial(username, chat_id, bot_id, tx_hash, target_address, lang, amount, network)
+                _store_initial(username, chat_id, bot_id, tx_hash, target_address, lang, amount, network, result)
 
         # not success → обновим стадии/ошибку и оставим ключ
         if network == "ERC20":
             stage_left = result.get("stage", [])
             _update_stage(key, stage_left)
+            _update_facts(key, result.get("facts"))
             _update_error(key, result.get("code", ""), result.get("error", ""))
 
         # для «фатальных» кейсов сразу уведомим
@@ -229,9 +249,9 @@ def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id,
                 
             google_update_params = {"status": [result.get("status"), 6], "error": [result.get("error",""), 8]}
             run_async_coroutine(send_telegram_notification(chat_id, msg))
-            update_transaction_status(tx_hash, google_update_params)
+            enqueue_update(tx_hash, google_update_params)
             
-            r.delete(key)
+            drop_sync(r, key)
         else:
             # pending — просто оставляем на periodic beat
             _touch_ttl(key)
@@ -240,151 +260,148 @@ def check_confirmation_task(tx_hash, target_address, username, chat_id, bot_id,
         logger.error(f"Ошибка проверки {tx_hash}: {e}")
         if r:
             _update_error(key, "internal_error", str(e))
+    finally:
+        release_leases_sync(r, leases)
 
 @celery_task_fallback
 def periodic_check_pending_transactions():
+    """
+    Периодический обход pending транзакций: забирает наступившие проверки
+    и делит их на пачки по PENDING_CHUNK_SIZE — первая проверяется здесь,
+    остальные уходят задачами check_pending_chunk на другие воркеры.
+    """
     if not r:
         logger.error("Redis недоступен для periodic_check_pending_transactions")
         return
-        
-    kyiv_tz = ZoneInfo("Europe/Kyiv")
-    now = datetime.now(kyiv_tz).strftime("%d.%m.%Y %H:%M:%S")
-    
-    """
-    Периодический обход всех pending транзакций.
-    """
+
+    # предыдущий тик ещё идёт — не запускаем второй поверх
+    lock_token = acquire_tick_lock_sync(r)
+    if not lock_token:
+        logger.info("[BEAT] Предыдущий тик ещё выполняется, пропускаю")
+        return
+
     try:
-        # keys = r.keys(f"{REDIS_KEY_PREFIX_ERC}*")
-        patterns = [f"{REDIS_KEY_PREFIX_ERC}*", f"{REDIS_KEY_PREFIX_TRC}*"]
+        global _schedule_backfilled
+        if not _schedule_backfilled:
+            # ключи, созданные до появления расписания
+            backfill_schedule_sync(r)
+            _schedule_backfilled = True
+
+        # только транзакции, чья проверка уже наступила (а не SCAN всей базы)
+        keys = claim_due_sync(r)
+        chunks = [keys[i:i + PENDING_CHUNK_SIZE] for i in range(0, len(keys), PENDING_CHUNK_SIZE)]
+        if CELERY_AVAILABLE:
+            for chunk in chunks[1:]:
+                check_pending_chunk.delay(chunk)
+            chunks = chunks[:1]
+        for chunk in chunks:
+            _check_pending_keys(chunk, lock_token)
+    except Exception as e:
+        logger.error(f"[BEAT] Ошибка в periodic_check_pending_transactions: {e}")
+    finally:
+        release_tick_lock_sync(r, lock_token)
+        log_redis_stats()
 
-        for pattern in patterns:
-            for key in r.scan_iter(match=pattern):
-                tx_data = r.hgetall(key)
-                if not tx_data:
-                    continue
+@celery_task_fallback
+def check_pending_chunk(keys):
+    """Проверка пачки pending транзакций, забранных тиком beat"""
+    if not r:
+        logger.error("Redis недоступен для check_pending_chunk")
+        return
+    try:
+        _check_pending_keys(keys)
+    except Exception as e:
+        logger.error(f"[BEAT] Ошибка в check_pending_chunk: {e}")
 
-                tx_hash = key.split(":")[1]
-                username = tx_data.get("username")
-                lang = tx_data.get("lang")
-                chat_id = tx_data.get("chat_id")
-                bot_id = tx_data.get("bot_id")
-                target_address = tx_data.get("target_address")
-                first_seen_str = tx_data.get("first_seen")
-                amount = tx_data.get("amount", "N/A")
-                network = tx_data.get("network", "N/A")
-
-                if not username or not target_address:
-                    logger.warning(f"[BEAT] Пропускаю {key} — нет username/target_address")
-                    r.delete(key)
-                    continue
+def _check_pending_keys(keys, tick_token=None):
+    """tick_token — lock тика beat: продлевается перед каждым этапом, чтобы тики не наложились"""
+    now = now_kyiv()
 
-                
+    # аренда на каждую транзакцию, затем чтение: занятые (check_confirmation_task) проверим позже
+    leases, pending = lease_and_load_sync(r, keys)
 
-                try:
-                    if network == "ERC20":
-                        stage_list = _parse_stage_list(tx_data.get("stage"))
-                        stage_set = set(stage_list) if stage_list else {"in_block","is_erc20","recipient","transfer_params","confirmations"}
-                        logger.info(f"[tasks---periodic_check_pending_transactions] ERC20:-------------------------------------------------------------------")   
-                        result = run_async_coroutine(check_transaction_stages(tx_hash, target_address, stage_set))
-                    if network == "TRC20":
-                        logger.info(f"[tasks---periodic_check_pending_transactions] TRC20:+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++") 
-                        result = run_async_coroutine(check_tron_transaction(tx_hash, target_address))
-                    # result = run_async_coroutine(check_transaction_stages(tx_hash, target_address, stage_set))
-                    logger.info(f"[BEAT] {tx_hash} result: {result}")
-
-                    if result.get("success") and result.get("status") == "confirmed":
-                        if network == "ERC20":
-                            google_update_params = {"status": [result.get("status"), 6], "date_confirmation": [now, 5]}
-                        if network == "TRC20":
-                            google_update_params = {
-                                "status": [result.get("status"), 6], 
-                                "date_confirmation": [now, 5], 
-                                "timestamp": [result.get("timestamp", "N/A"), 4],
-                                "amount": [result.get("amount", "N/A"), 7],
-                                "error": ['', 8]
-                            }
-                        msg = {
-                            "msg_status": "tx_confirmed",
-                            "lang": lang,
-                            "amount_result": amount,
-                            "target_address": target_address,
-                            "timestamp": result.get("timestamp", "N/A"),
-                        }
-                        run_async_coroutine(send_telegram_notification(chat_id, msg))
-                        update_transaction_status(tx_hash, google_update_params)
-                        run_async_coroutine(_advance_fsm_state(
-                            username=username,
-                            chat_id=chat_id,
-                            bot_id=bot_id,
-                            next_state=CryptoFSM.contact,
-                            extra={
-                                "amount_result": amount,
-                                "tx_hash": tx_hash,
-                                "target_address": target_address,
-                                "timestamp": result.get("timestamp", "N/A"),
-                            },
-                        ))
-                        r.delete(key)
-                        continue
-
-                    # обновим стадии/ошибку
-                    if network == "ERC20":
-                        _update_stage(key, result.get("stage", []))
-                        _update_error(key, result.get("code",""), result.get("error",""))
-
-                    code = result.get("code")
-
-                    # фатальные кейсы — сразу уведомление и чистим
-                    if code in ("invalid_token", "invalid_recipient"):
-                        google_update_params = {"status": result.get("status")}
-                        msg = {                
-                            "lang": lang,
-                            "amount_result": amount,
-                            "target_address": target_address,
-                            "timestamp": result.get("timestamp", "N/A"),
-                        }
-                        if code == "invalid_token":
-                            if network == "ERC20":
-                                msg.update({"msg_status": "invalid_token_erc"})
-                            if network == "TRC20":
-                                msg.update({"msg_status": "invalid_token_trc"})
-                            
-                        else:
-                            msg.update({"msg_status": "invalid_recipient"})
-                            
-                        google_update_params = {"status": [result.get("status"), 6], "error": [result.get("error",""), 8]}
-                        run_async_coroutine(send_telegram_notification(chat_id, msg))
-                        update_transaction_status(tx_hash, google_update_params)
-
-                        r.delete(key)
-                        continue
-
-                    # просрочка ожидания
-                    if first_seen_str:
-                        first_seen = datetime.fromisoformat(first_seen_str)
-                        if datetime.now(timezone.utc) - first_seen > MAX_PENDING_DURATION:
-                            msg = {     
-                                "msg_status": "expired",           
-                                "lang": lang,
-                                "amount_result": amount,
-                                "target_address": target_address,
-                                "timestamp": result.get("timestamp", "N/A"),
-                            }
-                            error_msg = f"Транзакция удалена: не получено подтверждение в течение 2 часов\n{result.get('error','')}"
-                            google_update_params = {"status": ["expired", 6], "date_confirmation": [now, 5], "error": [error_msg, 8]}
-                            run_async_coroutine(send_telegram_notification(chat_id, msg))
-                            update_transaction_status(tx_hash, google_update_params)
-
-                            r.delete(key)
-                            continue
-
-                    # если просто pending — оставляем ключ с продлённым TTL
+    try:
+        # ERC20 — одной пачкой: последний блок запрашивается один раз, проверки идут параллельно
+        erc20_items = []
+        for key, tx_data in pending:
+            if tx_data.get("network") == "ERC20" and tx_data.get("username") and tx_data.get("target_address"):
+                erc20_items.append((tx_hash_from_key(key), tx_data.get("target_address"), stage_set_for(tx_data), load_facts(tx_data)))
+
+        erc20_results = {}
+        if erc20_items:
+            extend_tick_lock_sync(r, tick_token)
+            logger.info(f"[BEAT] ERC20: пакетная проверка {len(erc20_items)} транзакций")
+            try:
+                erc20_results = run_async_coroutine(check_erc20_transactions_batch(erc20_items), timeout=ERC20_BATCH_TIMEOUT)
+            except Exception as e:
+                logger.error(f"[BEAT] Ошибка пакетной проверки ERC20: {e}")
+
+        # TRC20 — история переводов по кошельку вместо запроса на каждый хеш
+        trc20_items = [
+            (tx_hash_from_key(key), tx_data.get("target_address"))
+            for key, tx_data in pending
+            if tx_data.get("network") == "TRC20" and tx_data.get("username") and tx_data.get("target_address")
+        ]
+        trc20_results = {}
+        if trc20_items:
+            extend_tick_lock_sync(r, tick_token)
+            logger.info(f"[BEAT] TRC20: пакетная проверка {len(trc20_items)} транзакций")
+            try:
+                trc20_results = run_async_coroutine(check_tron_transactions_batch(trc20_items), timeout=TRC20_BATCH_TIMEOUT)
+            except Exception as e:
+                logger.error(f"[BEAT] Ошибка пакетной проверки TRC20: {e}")
+
+        for key, tx_data in pending:
+            extend_tick_lock_sync(r, tick_token)
+            tx_hash = tx_hash_from_key(key)
+            username = tx_data.get("username")
+            target_address = tx_data.get("target_address")
+            network = tx_data.get("network", "N/A")
+
+            if not username or not target_address:
+                logger.warning(f"[BEAT] Пропускаю {key} — нет username/target_address")
+                drop_sync(r, key)
+                continue
+
+            try:
+                result = (erc20_results if network == "ERC20" else trc20_results).get(tx_hash)
+                if result is None:
+                    # пачка не отработала — проверим на следующем тике
                     _touch_ttl(key)
+                    schedule_sync(r, key, next_check_delay())
+                    continue
+                logger.info(f"[BEAT] {tx_hash} result: {result}")
 
-                except Exception as e:
-                    logger.error(f"[BEAT] Ошибка при проверке {tx_hash}: {e}")
-                    _update_error(key, "internal_error", str(e))
-                    _touch_ttl(key)
+                run_async_coroutine(handle_result(key, tx_data, result, now))
+
+            except Exception as e:
+                logger.error(f"[BEAT] Ошибка при проверке {tx_hash}: {e}")
+                _update_error(key, "internal_error", str(e))
+                _touch_ttl(key)
+                schedule_sync(r, key, next_check_delay())
+    finally:
+        release_leases_sync(r, leases)
+
+@celery_task_fallback
+def flush_sheets_queue():
+    """
+    Выгружает очередь отложенной записи в Google Sheets пачкой.
+    """
+    try:
+        written = flush_queue()
+        if written:
+            logger.info(f"[sheets_queue] Записано элементов: {written}")
+    except Exception as e:
+        logger.error(f"[sheets_queue] Ошибка в flush_sheets_queue: {e}")
 
+@celery_task_fallback
+def flush_notifications():
+    """
+    Отправляет очередь уведомлений Telegram с учётом лимитов Bot API.
+    """
+    try:
+        sent = run_async_coroutine(flush_outbox(), timeout=NOTIFY_FLUSH_MAX_SECONDS + 30)
+        if sent:
+            logger.info(f"[notify_queue] Отправлено сообщений: {sent}")
     except Exception as e:
-        logger.error(f"[BEAT] Ошибка в periodic_check_pending_transactions: {e}")
\ No newline at end of file
+        logger.error(f"[notify_queue] Ошибка в flush_notifications: {e}")
@@ -25,9 +25,19 @@ aiohttp.ClientSession.__init__ = _new_init
 aiohttp.ClientSession.close = _new_close
 
 def print_active_sessions(where: str = ""):
-    """Печатает список всех открытых ClientSession"""
+    """Печатает список всех открытых ClientSession и занятость их пулов"""
+    from utils.http_session import pool_stats
+    from utils.notifier import bot_sessions
+
     if not _active_sessions:
         logging.info(f"[SESSIONS] No active sessions {where}")
     else:
+        notifier = bot_sessions()
         for s in _active_sessions:
-            logging.warning(f"[SESSIONS] Active session {hex(id(s))} {where}")
+            stats = pool_stats(s)
+            owner = "notifier" if s in notifier else "http"
+            logging.warning(
+                f"[SESSIONS] Active {owner} session {hex(id(s))} {where} "
+                f"pool: in_use={stats['in_use']} idle={stats['idle']} "
+                f"limit={stats['limit']} per_host={stats['limit_per_host']}"
+            )
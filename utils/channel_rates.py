@@ -1,6 +1,4 @@
 import re
-import redis
-import json
 import logging
 from typing import Dict, Optional, Tuple
 from aiogram import Bot
@@ -8,7 +6,7 @@ from pathlib import Path
 from telethon import TelegramClient
 import importlib
 
-from config import REDIS_URL, REDIS_DB
+from utils.rates_cache import RatesCache
 
 logger = logging.getLogger(__name__)
 
@@ -40,27 +38,15 @@ class ChannelRatesParser:
             TELEGRAM_API_HASH
         )
 
-        # Redis
-        self.redis_client = redis.Redis.from_url(
-            REDIS_URL, 
-            db=REDIS_DB,
-            decode_responses=True,
-            socket_timeout=3
-        )
-        self.cache_ttl = 300  # 5 минут
+        # память процесса -> снимок в Redis -> канал (разбирает один процесс за раз)
+        self.cache = RatesCache(self._parse_channel_rates)
 
     async def get_latest_rates(self) -> Dict[str, Dict]:
-        """Получить актуальные курсы с кэшем в Redis."""
+        """Получить актуальные курсы (из памяти; устаревшие обновляются в фоне)."""
         try:
-            cached_rates = self.redis_client.get('currency_rates')
-            if cached_rates:
-                return json.loads(cached_rates)
-
-            rates = await self._parse_channel_rates()
-            if rates:
-                self.redis_client.setex('currency_rates', self.cache_ttl, json.dumps(rates))
-                return rates
-
+            snapshot = await self.cache.get()
+            if snapshot:
+                return snapshot["rates"]
             return self._get_default_rates()
         except Exception as e:
             logger.exception(f"Ошибка при получении курсов: {e}")
@@ -134,12 +120,12 @@ class ChannelRatesParser:
             'PLN-UAH': {'retail': {'buy': 9.80, 'sell': 9.95}}
         }
 
-    def get_specific_rate(self, currency_pair: str) -> Optional[Tuple[float, float]]:
-        """Получить розничный курс по конкретной валютной паре."""
+    async def get_specific_rate(self, currency_pair: str) -> Optional[Tuple[float, float]]:
+        """Получить розничный курс по конкретной валютной паре (из того же снимка, что get_latest_rates)."""
         try:
-            rates = self.redis_client.get('currency_rates')
-            if rates:
-                rd = json.loads(rates).get(currency_pair, {}).get("retail")
+            snapshot = await self.cache.get()
+            if snapshot:
+                rd = snapshot["rates"].get(currency_pair, {}).get("retail")
                 if rd:
                     return rd['buy'], rd['sell']
             return None
@@ -149,7 +135,7 @@ class ChannelRatesParser:
 
     async def force_refresh_rates(self) -> Dict[str, Dict]:
         """Принудительное обновление курсов."""
-        self.redis_client.delete('currency_rates')
+        await self.cache.refresh()
         return await self.get_latest_rates()
 
 
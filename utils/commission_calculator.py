@@ -1,56 +1,221 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from typing import Dict, Optional, Tuple
-from config import GOOGLE_CREDENTIALS
+import asyncio
+import bisect
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import COMMISSION_REFRESH_INTERVAL, EXCHANGE_RATE_TTL
+from utils.sheets_client import get_worksheet
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Курс в листе «Курсы»: ячейка справа от ячейки с этой меткой
+RATE_LABEL = 'USDT/USD'
+# Курс, если лист недоступен и прежнего значения нет
+DEFAULT_EXCHANGE_RATE = 1.0
+
+# Операции, для которых таблица собирается сразу при загрузке (остальные — при первом запросе)
+KNOWN_OPERATIONS = ('USDT_to_USD', 'USD_to_USDT')
+
+
+class _IntervalTable:
+    """
+    Правила одной операции, разложенные на непересекающиеся отрезки.
+
+    points — отсортированные границы всех правил; at_point[i] — правило для суммы,
+    равной points[i], between[i] — для сумм строго между points[i] и points[i + 1].
+    В каждом отрезке уже выбрано первое по порядку листа подходящее правило,
+    поэтому поиск — один bisect и даёт тот же результат, что перебор правил.
+    """
+
+    __slots__ = ('points', 'at_point', 'between')
+
+    def __init__(self, rules: List[Dict]):
+        # правило с min > max (или NaN в границах) не подходит ни к одной сумме
+        rules = [rule for rule in rules if rule['min_amount'] <= rule['max_amount']]
+        self.points = sorted({bound for rule in rules for bound in (rule['min_amount'], rule['max_amount'])})
+        self.at_point = [
+            next((rule for rule in rules if rule['min_amount'] <= point <= rule['max_amount']), None)
+            for point in self.points
+        ]
+        # границы любого правила есть в points, поэтому правило либо покрывает интервал целиком, либо не задевает
+        self.between = [
+            next((rule for rule in rules if rule['min_amount'] <= low and high <= rule['max_amount']), None)
+            for low, high in zip(self.points, self.points[1:])
+        ]
+
+    def find(self, amount: float) -> Optional[Dict]:
+        i = bisect.bisect_left(self.points, amount)
+        if i < len(self.points) and self.points[i] == amount:
+            return self.at_point[i]
+        if i == 0 or i == len(self.points):
+            return None
+        return self.between[i - 1]
+
+
+class _CompiledRules:
+    """Неизменяемый снимок правил: заменяется целиком одним присваиванием"""
+
+    def __init__(self, rules: Dict[str, Dict], digest: Optional[str]):
+        self.rules = rules
+        self.digest = digest
+        self.loaded_at = time.time()
+        self._tables: Dict[str, _IntervalTable] = {}
+        for operation_type in KNOWN_OPERATIONS:
+            self.table(operation_type)
+
+    def table(self, operation_type: str) -> _IntervalTable:
+        table = self._tables.get(operation_type)
+        if table is None:
+            # правила операции — те, чьё название начинается с её типа (USDT_to_USD_small и т.д.), в порядке листа
+            table = _IntervalTable([rule for name, rule in self.rules.items() if name.startswith(operation_type)])
+            self._tables[operation_type] = table
+        return table
+
+
+def _default_rule(operation_type: str, amount: float) -> Optional[Dict]:
+    """Логика по умолчанию, если ни одно правило не подошло"""
+    if operation_type == 'USDT_to_USD':
+        if amount >= 5000:
+            return {'commission_type': 'manager', 'commission_value': 0, 'manager_required': True}
+        elif amount >= 1000:
+            return {'commission_type': 'percentage', 'commission_value': -0.2, 'manager_required': False}
+        elif amount >= 100:
+            return {'commission_type': 'fixed', 'commission_value': 10, 'manager_required': False}
+        else:
+            return {'commission_type': 'fixed', 'commission_value': 10, 'manager_required': False}
+    elif operation_type == 'USD_to_USDT':
+        if amount >= 5000:
+            return {'commission_type': 'manager', 'commission_value': 0, 'manager_required': True}
+        elif amount >= 1000:
+            return {'commission_type': 'percentage', 'commission_value': 1.0, 'manager_required': False}
+        elif amount >= 100:
+            return {'commission_type': 'fixed', 'commission_value': 30, 'manager_required': False}
+        else:
+            return {'commission_type': 'fixed', 'commission_value': 30, 'manager_required': False}
+    return None
+
+
 class CommissionCalculator:
-    def __init__(self):
-        self.commission_data = None
-        # Не загружаем данные при создании экземпляра
-    
-    def _load_commission_data(self):
-        """Загружает данные о комиссиях из Google таблицы"""
-        if self.commission_data is not None:
-            return  # Уже загружено
-        
-        try:
-            scope = ['https://spreadsheets.google.com/feeds',
-                     'https://www.googleapis.com/auth/drive']
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-            client = gspread.authorize(creds)
-            
-            # Открываем таблицу и лист с комиссиями
-            sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet('Комиссии')
-            
-            # Получаем все записи
-            records = sheet.get_all_records()
-            
-            # Преобразуем в словарь для быстрого доступа
-            self.commission_data = {}
-            for record in records:
-                operation_type = record.get('Тип операции', '').strip()
-                if operation_type:
-                    self.commission_data[operation_type] = {
-                        'min_amount': float(record.get('Мин. сумма', 0)),
-                        'max_amount': float(record.get('Макс. сумма', 999999)),
-                        'commission_type': record.get('Тип комиссии', '').strip(),
-                        'commission_value': float(record.get('Значение комиссии', 0)),
-                        'manager_required': record.get('Требуется менеджер', '').strip().lower() == 'да'
-                    }
-            
-            logger.info(f"Загружено {len(self.commission_data)} правил комиссий")
-            
-        except Exception as e:
-            logger.error(f"Ошибка при загрузке данных комиссий: {e}")
-            # Устанавливаем значения по умолчанию
-            self._set_default_commission_data()
-    
-    def _set_default_commission_data(self):
-        """Устанавливает значения комиссий по умолчанию"""
-        self.commission_data = {
+    """
+    Правила комиссий из листа «Комиссии», собранные в таблицы отрезков по операциям.
+
+    Фоновая задача (start) перечитывает лист раз в refresh_interval секунд в отдельном
+    потоке и пересобирает таблицы, только если содержимое листа изменилось; новый
+    снимок подменяет старый одним присваиванием, так что расчёт никогда не видит
+    наполовину собранные правила. Без фоновой задачи (воркеры, скрипты) правила
+    загружаются при первом расчёте и перечитываются не чаще раза в refresh_interval.
+
+    Курс USDT/USD живёт так же: значение в памяти, которое фоновая задача обновляет
+    раз в rate_ttl секунд, — хендлеры получают его без обращения к Sheets.
+    """
+
+    def __init__(self, refresh_interval: int = COMMISSION_REFRESH_INTERVAL, rate_ttl: int = EXCHANGE_RATE_TTL):
+        self.refresh_interval = refresh_interval
+        self.rate_ttl = rate_ttl
+        self._compiled: Optional[_CompiledRules] = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._rate: Optional[float] = None
+        self._rate_at: Optional[float] = None
+        self._rate_lock = threading.Lock()
+        self._rate_task: Optional[asyncio.Task] = None
+        self._rate_refresh: Optional[asyncio.Task] = None
+
+    @property
+    def commission_data(self) -> Optional[Dict[str, Dict]]:
+        compiled = self._compiled
+        return compiled.rules if compiled is not None else None
+
+    def _read_sheet(self) -> Tuple[Dict[str, Dict], str]:
+        # Открываем лист с комиссиями
+        records = get_worksheet('Комиссии').get_all_records()
+        digest = hashlib.sha1(json.dumps(records, sort_keys=True, default=str).encode()).hexdigest()
+
+        # Преобразуем в словарь для быстрого доступа
+        commission_data = {}
+        for record in records:
+            operation_type = record.get('Тип операции', '').strip()
+            if operation_type:
+                commission_data[operation_type] = {
+                    'min_amount': float(record.get('Мин. сумма', 0)),
+                    'max_amount': float(record.get('Макс. сумма', 999999)),
+                    'commission_type': record.get('Тип комиссии', '').strip(),
+                    'commission_value': float(record.get('Значение комиссии', 0)),
+                    'manager_required': record.get('Требуется менеджер', '').strip().lower() == 'да'
+                }
+        return commission_data, digest
+
+    def reload_sync(self) -> bool:
+        """Перечитывает лист; True — правила изменились и таблицы пересобраны"""
+        with self._reload_lock:
+            self._checked_at = time.monotonic()
+            try:
+                commission_data, digest = self._read_sheet()
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке данных комиссий: {e}")
+                if self._compiled is None:
+                    # digest=None: при следующей проверке лист будет перечитан и правила заменены
+                    self._compiled = _CompiledRules(self._default_commission_data(), None)
+                return False
+
+            if self._compiled is not None and self._compiled.digest == digest:
+                return False
+            self._compiled = _CompiledRules(commission_data, digest)
+            logger.info(f"Загружено {len(commission_data)} правил комиссий")
+            return True
+
+    async def reload(self) -> bool:
+        return await asyncio.to_thread(self.reload_sync)
+
+    def _rules(self) -> _CompiledRules:
+        compiled = self._compiled
+        if compiled is None or (self._task is None and time.monotonic() - self._checked_at >= self.refresh_interval):
+            self.reload_sync()
+            compiled = self._compiled
+        return compiled
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Ошибка в фоновом обновлении комиссий: {e}")
+
+    async def _rate_loop(self):
+        while True:
+            await asyncio.sleep(self.rate_ttl)
+            try:
+                await self.refresh_rate()
+            except Exception as e:
+                logger.error(f"Ошибка в фоновом обновлении курса обмена: {e}")
+
+    async def start(self):
+        """Первичная загрузка правил и курса, запуск фонового обновления"""
+        await asyncio.gather(self.reload(), self.refresh_rate())
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+        if self._rate_task is None or self._rate_task.done():
+            self._rate_task = asyncio.create_task(self._rate_loop())
+
+    async def stop(self):
+        for task in (self._task, self._rate_task, self._rate_refresh):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._rate_task = self._rate_refresh = None
+
+    @staticmethod
+    def _default_commission_data() -> Dict[str, Dict]:
+        """Значения комиссий по умолчанию"""
+        return {
             'USDT_to_USD': {
                 'min_amount': 5000,
                 'max_amount': 999999,
@@ -94,37 +259,45 @@ class CommissionCalculator:
                 'manager_required': False
             }
         }
-    
+
     def calculate_commission(self, operation_type: str, amount: float, current_rate: float = None) -> Dict:
         """
         Рассчитывает комиссию для операции обмена
-        
+
         Args:
             operation_type: Тип операции ('USDT_to_USD' или 'USD_to_USDT')
             amount: Сумма операции
             current_rate: Текущий курс обмена (для процентных комиссий)
-        
+
         Returns:
             Dict с информацией о комиссии
         """
-        if not self.commission_data:
-            self._load_commission_data()
-        
-        # Определяем подходящее правило комиссии
-        rule = self._find_commission_rule(operation_type, amount)
-        
+        table = self._rules().table(operation_type)
+        return self._apply_rule(operation_type, amount, self._find_rule(table, operation_type, amount), current_rate)
+
+    def calculate_many(self, operation_type: str, amounts: Iterable[float], current_rate: float = None) -> List[Dict]:
+        """
+        Комиссии для набора сумм одной операции (тарифная сетка для админов, сверка):
+        одна таблица правил на весь набор — все суммы считаются по одному снимку.
+        """
+        table = self._rules().table(operation_type)
+        return [
+            self._apply_rule(operation_type, amount, self._find_rule(table, operation_type, amount), current_rate)
+            for amount in amounts
+        ]
+
+    @staticmethod
+    def _apply_rule(operation_type: str, amount: float, rule: Optional[Dict], current_rate: Optional[float]) -> Dict:
         if not rule:
             return {
                 'success': False,
                 'error': 'Не найдено подходящее правило комиссии'
             }
-        
+
         commission_amount = 0
         final_amount = amount
-        
+
         if rule['commission_type'] == 'percentage':
-            # Если курс не указан, используем 1.0 как значение по умолчанию
-            rate_to_use = current_rate if current_rate is not None else 1.0
             commission_amount = (amount * rule['commission_value']) / 100
             final_amount = amount + commission_amount
         elif rule['commission_type'] == 'fixed':
@@ -138,7 +311,7 @@ class CommissionCalculator:
         elif rule['commission_type'] == 'manager':
             commission_amount = 0
             final_amount = amount
-        
+
         return {
             'success': True,
             'operation_type': operation_type,
@@ -150,64 +323,65 @@ class CommissionCalculator:
             'manager_required': rule['manager_required'],
             'rate_used': current_rate
         }
-    
+
+    @staticmethod
+    def _find_rule(table: _IntervalTable, operation_type: str, amount: float) -> Optional[Dict]:
+        # Первое по порядку листа подходящее правило, иначе логика по умолчанию
+        return table.find(amount) or _default_rule(operation_type, amount)
+
     def _find_commission_rule(self, operation_type: str, amount: float) -> Optional[Dict]:
         """Находит подходящее правило комиссии для суммы"""
-        applicable_rules = []
-        
-        for rule_name, rule_data in self.commission_data.items():
-            if rule_name.startswith(operation_type):
-                if rule_data['min_amount'] <= amount <= rule_data['max_amount']:
-                    applicable_rules.append((rule_name, rule_data))
-        
-        if not applicable_rules:
-            # Если не найдено правило, используем логику по умолчанию
-            if operation_type == 'USDT_to_USD':
-                if amount >= 5000:
-                    return {'commission_type': 'manager', 'commission_value': 0, 'manager_required': True}
-                elif amount >= 1000:
-                    return {'commission_type': 'percentage', 'commission_value': -0.2, 'manager_required': False}
-                elif amount >= 100:
-                    return {'commission_type': 'fixed', 'commission_value': 10, 'manager_required': False}
-                else:
-                    return {'commission_type': 'fixed', 'commission_value': 10, 'manager_required': False}
-            elif operation_type == 'USD_to_USDT':
-                if amount >= 5000:
-                    return {'commission_type': 'manager', 'commission_value': 0, 'manager_required': True}
-                elif amount >= 1000:
-                    return {'commission_type': 'percentage', 'commission_value': 1.0, 'manager_required': False}
-                elif amount >= 100:
-                    return {'commission_type': 'fixed', 'commission_value': 30, 'manager_required': False}
-                else:
-                    return {'commission_type': 'fixed', 'commission_value': 30, 'manager_required': False}
-            return None
-        
-        # Возвращаем первое подходящее правило
-        return applicable_rules[0][1]
-    
+        return self._find_rule(self._rules().table(operation_type), operation_type, amount)
+
+    @staticmethod
+    def _read_exchange_rate() -> Optional[float]:
+        # Лист с курсами читается целиком одним запросом (вместо find + cell)
+        rows = get_worksheet('Курсы').get_all_values()
+        for row in rows:
+            for col, value in enumerate(row):
+                if value == RATE_LABEL:
+                    rate_value = row[col + 1] if col + 1 < len(row) else ''
+                    return float(rate_value) if rate_value else None
+        return None
+
+    def refresh_rate_sync(self) -> Optional[float]:
+        """Перечитывает курс из листа; при ошибке остаётся прежнее значение"""
+        with self._rate_lock:
+            try:
+                self._rate = self._read_exchange_rate()
+            except Exception as e:
+                logger.error(f"Ошибка при получении курса обмена: {e}")
+                if self._rate_at is None:
+                    # Возвращаем значение по умолчанию для USDT/USD
+                    self._rate = DEFAULT_EXCHANGE_RATE
+            self._rate_at = time.monotonic()
+            return self._rate
+
+    async def refresh_rate(self) -> Optional[float]:
+        return await asyncio.to_thread(self.refresh_rate_sync)
+
+    def _rate_is_fresh(self) -> bool:
+        return self._rate_at is not None and time.monotonic() - self._rate_at < self.rate_ttl
+
     def get_exchange_rate(self) -> Optional[float]:
-        """Получает текущий курс обмена из Google таблицы"""
-        try:
-            scope = ['https://spreadsheets.google.com/feeds',
-                     'https://www.googleapis.com/auth/drive']
-            creds = ServiceAccountCredentials.from_json_keyfile_dict(GOOGLE_CREDENTIALS, scope)
-            client = gspread.authorize(creds)
-            
-            # Открываем лист с курсами
-            sheet = client.open_by_key('1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo').worksheet('Курсы')
-            
-            # Получаем курс USDT/USD
-            rate_cell = sheet.find('USDT/USD')
-            if rate_cell:
-                rate_value = sheet.cell(rate_cell.row, rate_cell.col + 1).value
-                return float(rate_value) if rate_value else None
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"Ошибка при получении курса обмена: {e}")
-            # Возвращаем значение по умолчанию для USDT/USD
-            return 1.0
+        """
+        Текущий курс USDT/USD. При запущенной фоновой задаче — всегда значение из памяти;
+        иначе (воркеры, скрипты) лист перечитывается, если значение старше rate_ttl.
+        Из корутин вызывать get_exchange_rate_async.
+        """
+        if self._rate_task is None and not self._rate_is_fresh():
+            return self.refresh_rate_sync()
+        return self._rate
+
+    async def get_exchange_rate_async(self) -> Optional[float]:
+        """Курс USDT/USD для хендлеров: из памяти; лист читается в потоке, только если курса ещё нет"""
+        if self._rate_at is None:
+            return await self.refresh_rate()
+        if self._rate_task is None and not self._rate_is_fresh():
+            # фоновой задачи нет — обновляем в фоне, отдавая прежнее значение
+            if self._rate_refresh is None or self._rate_refresh.done():
+                self._rate_refresh = asyncio.create_task(self.refresh_rate())
+        return self._rate
 
 # Создаем глобальный экземпляр калькулятора
-commission_calculator = CommissionCalculator() 
\ No newline at end of file
+commission_calculator = CommissionCalculator()
@@ -1,8 +1,11 @@
-import aiohttp
 import csv
+import hashlib
 import importlib
+import time
 from typing import Optional, Tuple, Dict
-from config import CSV_URL
+from config import CSV_URL, CSV_RATES_TTL
+from utils.http_session import get_session
+from utils.rate_limiter import SingleFlight
 
 # Динамически получаем парсер из utils.channel_rates (инициализируется в main.py)
 try:
@@ -38,30 +41,97 @@ async def get_usd_uah_rates(wholesale: bool = False) -> Tuple[Optional[float], O
     return await _get_usd_from_csv()
 
 from config import ETHERSCAN_API_KEY, ERC20_CONFIRMATIONS, logger
-async def _get_usd_from_csv() -> Tuple[float, float]:
+
+
+def _parse_rate(row) -> Optional[Tuple[float, float]]:
     try:
-        async with aiohttp.ClientSession() as session:
-            session_id = hex(id(session))
-            logger.info(f"[fiat_rates] ===================================Created ClientSession {session_id}")
-            async with session.get(CSV_URL) as resp:
+        return float(row[1].replace(",", ".")), float(row[2].replace(",", "."))
+    except ValueError:
+        return None
+
+
+def parse_csv_rates(text_data: str) -> Tuple[Dict[str, Tuple[float, float]], Optional[Tuple[float, float]]]:
+    """
+    Разбор CSV (заголовок, затем строки «валюта,покупка,продажа»), как раньше в двух fallback:
+    - {валюта: (buy, sell)} — при повторах валюты побеждает последняя корректная строка;
+    - (buy, sell) первой строки USD; None — её нет или она битая (тогда курс по умолчанию).
+    """
+    table: Dict[str, Tuple[float, float]] = {}
+    usd: Optional[Tuple[float, float]] = None
+    usd_seen = False
+    rows = list(csv.reader(text_data.splitlines()))
+    for row in rows[1:]:
+        if len(row) < 3:
+            continue
+        currency = row[0].strip().upper()
+        rate = _parse_rate(row)
+        if currency == "USD" and not usd_seen:
+            usd_seen, usd = True, rate
+        if rate is not None:
+            table[currency] = rate
+    return table, usd
+
+
+class CsvRates:
+    """
+    Таблица курсов из CSV_URL в памяти процесса. Раз в ttl секунд — условный GET
+    (If-None-Match / If-Modified-Since): 304 или тот же текст — без разбора.
+    Одновременные перепроверки склеиваются в один запрос; при ошибке отдаётся
+    последняя удачная таблица.
+    """
+
+    def __init__(self, url: Optional[str] = CSV_URL, ttl: float = CSV_RATES_TTL):
+        self.url = url
+        self.ttl = ttl
+        self.table: Dict[str, Tuple[float, float]] = {}
+        self.usd: Optional[Tuple[float, float]] = None
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        self._digest: Optional[str] = None
+        self._checked_at: Optional[float] = None
+        self._flight = SingleFlight()
+
+    async def get(self) -> Dict[str, Tuple[float, float]]:
+        if self._checked_at is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self.table
+        return await self._flight.do("csv", self._revalidate)
+
+    async def _revalidate(self) -> Dict[str, Tuple[float, float]]:
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        try:
+            async with get_session().get(self.url, headers=headers) as resp:
+                if resp.status == 304:
+                    return self.table
                 if resp.status != 200:
-                    print(f"CSV недоступен, статус {resp.status}")
-                    return 38.50, 38.80
+                    logger.warning(f"[fiat_rates] CSV недоступен, статус {resp.status}")
+                    return self.table
                 text_data = await resp.text()
-                rows = list(csv.reader(text_data.splitlines()))
-                for row in rows[1:]:
-                    if len(row) < 3:
-                        continue
-                    name = row[0].strip().upper()
-                    if name == "USD":
-                        try:
-                            buy = float(row[1].replace(",", "."))
-                            sell = float(row[2].replace(",", "."))
-                            return buy, sell
-                        except Exception:
-                            return 38.50, 38.80
-    except Exception as e:
-        print(f"Ошибка при получении USD из CSV: {e}")
+                self._etag = resp.headers.get("ETag")
+                self._last_modified = resp.headers.get("Last-Modified")
+            digest = hashlib.sha1(text_data.encode()).hexdigest()
+            if digest != self._digest:
+                self.table, self.usd = parse_csv_rates(text_data)
+                self._digest = digest
+                logger.info(f"[fiat_rates] Курсы из CSV обновлены: {len(self.table)} валют")
+        except Exception as e:
+            logger.error(f"[fiat_rates] Ошибка при получении CSV: {e}")
+        finally:
+            # и при ошибке: следующая попытка — через ttl, а не на каждом запросе курса
+            self._checked_at = time.monotonic()
+        return self.table
+
+
+csv_rates = CsvRates()
+
+
+async def _get_usd_from_csv() -> Tuple[float, float]:
+    await csv_rates.get()
+    if csv_rates.usd:
+        return csv_rates.usd
     return 38.50, 38.80
 
 
@@ -89,26 +159,11 @@ async def get_all_currency_rates(wholesale: bool = False) -> Dict[str, Dict[str,
 
 
 async def _get_all_from_csv() -> Dict[str, Dict[str, float]]:
-    rates: Dict[str, Dict[str, float]] = {}
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(CSV_URL) as resp:
-                if resp.status != 200:
-                    raise RuntimeError(f"CSV недоступен, статус {resp.status}")
-                text_data = await resp.text()
-                rows = list(csv.reader(text_data.splitlines()))
-                for row in rows[1:]:
-                    if len(row) >= 3:
-                        try:
-                            cur = row[0].strip().upper()
-                            buy = float(row[1].replace(",", "."))
-                            sell = float(row[2].replace(",", "."))
-                        except Exception:
-                            continue
-                        if cur in ("USD", "EUR", "GBP", "PLN"):
-                            rates[f"{cur}-UAH"] = {"buy": buy, "sell": sell}
-    except Exception as e:
-        print(f"Ошибка при получении курсов из CSV: {e}")
+    table = await csv_rates.get()
+    rates: Dict[str, Dict[str, float]] = {
+        f"{cur}-UAH": {"buy": table[cur][0], "sell": table[cur][1]}
+        for cur in ("USD", "EUR", "GBP", "PLN") if cur in table
+    }
 
     if not rates:
         rates = {
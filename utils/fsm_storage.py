@@ -0,0 +1,77 @@
+import asyncio
+import json
+import weakref
+from datetime import timedelta
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from redis.exceptions import WatchError
+from config import REDIS_DB_FSM, logger
+from utils.redis_pool import new_async_redis
+
+# Одна RedisStorage на event loop (бот, фоновый loop воркера Celery, verifier)
+_storages: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, RedisStorage]" = weakref.WeakKeyDictionary()
+
+
+def new_fsm_storage() -> RedisStorage:
+    # свой пул: RedisStorage.close() закрывает его вместе с клиентом
+    return RedisStorage(redis=new_async_redis(REDIS_DB_FSM, decode=False))
+
+
+def get_fsm_storage() -> RedisStorage:
+    """Общая RedisStorage текущего event loop; закрывает её close_fsm_storage() при остановке"""
+    loop = asyncio.get_running_loop()
+    storage = _storages.get(loop)
+    if storage is None:
+        storage = new_fsm_storage()
+        _storages[loop] = storage
+    return storage
+
+
+async def close_fsm_storage():
+    loop = asyncio.get_running_loop()
+    storage = _storages.pop(loop, None)
+    if storage is not None:
+        await storage.close()
+
+
+def _ttl(value) -> int:
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    return int(value or 0)
+
+
+# Смена состояния FSM и дополнение данных одной транзакцией: данные читаются
+# под WATCH, extra сливается в Python и записывается вместе с состоянием в
+# MULTI/EXEC (JSON тот же, что у RedisStorage — пустые списки, числа не меняются).
+# Ключи строит key_builder той же RedisStorage, что и у бота, поэтому бот видит
+# результат как свой.
+async def advance_state(key: StorageKey, next_state, extra: dict | None = None) -> None:
+    """set_state + get_data/update/set_data одной транзакцией"""
+    storage = get_fsm_storage()
+    state = next_state.state if isinstance(next_state, State) else next_state
+    state_key = storage.key_builder.build(key, "state")
+    data_key = storage.key_builder.build(key, "data")
+
+    async with storage.redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                data = None
+                if extra:
+                    # данные изменились между GET и EXEC — EXEC не выполнится, читаем заново
+                    await pipe.watch(data_key)
+                    raw = await pipe.get(data_key)
+                    data = {**(json.loads(raw) if raw else {}), **extra}
+                pipe.multi()
+                if state is None:
+                    pipe.delete(state_key)
+                else:
+                    pipe.set(state_key, state, ex=_ttl(storage.state_ttl) or None)
+                if data is not None:
+                    pipe.set(data_key, json.dumps(data, ensure_ascii=False, default=str), ex=_ttl(storage.data_ttl) or None)
+                await pipe.execute()
+                break
+            except WatchError:
+                continue
+    logger.info(f"[fsm_storage] {key.chat_id}/{key.user_id} -> {state}")
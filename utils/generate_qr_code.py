@@ -1,22 +1,67 @@
+import asyncio
+import hashlib
+import os
+import threading
 from html import escape as quote_html
+from typing import Dict, Optional, Tuple
+
 import qrcode
 from PIL import Image
 from io import BytesIO
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import BufferedInputFile
+from cachetools import LRUCache
+
+from config import QR_CACHE_DIR, QR_CACHE_SIZE, logger
 from localization import get_message
+from utils.redis_pool import get_async_redis
 
-async def generate_wallet_qr(bot, chat_id: int, address: str, network: str, logo_path: str, lang: str = "ru"):
+# Адрес кошелька принимает лишь несколько значений (Лист3), поэтому QR рисуется
+# один раз на (сеть, адрес, логотип): PNG хранится в памяти процесса (LRU) и на
+# диске (QR_CACHE_DIR — переживает перезапуск). После первой отправки file_id
+# фото из ответа Telegram кладётся в Redis: следующие отправки ссылаются на него
+# и ничего не загружают. file_id действителен только для бота, который его
+# получил, поэтому ключ включает id бота.
+QR_RENDER_VERSION = 1          # менять при изменении параметров отрисовки
+QR_FILE_ID_KEY = "qr_file_id:{bot_id}:{render_key}"
+_FILE_ID_ERRORS = ("file identifier", "file_id", "file reference")
+
+_png_cache: LRUCache = LRUCache(maxsize=QR_CACHE_SIZE)
+_png_lock = threading.Lock()
+_logo_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def _qr_data(address: str, network: str) -> str:
     if network.strip().upper() == 'TRC20':
-        qr_data = f"tron:{address}"
+        return f"tron:{address}"
     elif network.strip().upper() == 'ERC20':
-        qr_data = f"ethereum:{address}"
+        return f"ethereum:{address}"
     elif network.strip().upper() == 'BEP20':
-        qr_data = f"bnb:{address}"
-    else:
-        qr_data = address  # fallback
+        return f"bnb:{address}"
+    return address  # fallback
+
 
+def _logo_hash(logo_path: str) -> str:
+    """Хеш содержимого логотипа; файл перечитывается, только если изменились mtime или размер"""
+    stat = os.stat(logo_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _logo_hashes.get(logo_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(logo_path, 'rb') as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    _logo_hashes[logo_path] = (signature, digest)
+    return digest
+
+
+def render_key(address: str, network: str, logo_path: str) -> str:
+    raw = f"{QR_RENDER_VERSION}|{network.strip().upper()}|{address}|{_logo_hash(logo_path)}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def _render_png(address: str, network: str, logo_path: str) -> bytes:
     qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H, version=1, box_size=10, border=5)
-    qr.add_data(qr_data)
+    qr.add_data(_qr_data(address, network))
     qr.make(fit=True)
 
     img = qr.make_image(fill_color="black", back_color="white").convert('RGB')
@@ -35,13 +80,98 @@ async def generate_wallet_qr(bot, chat_id: int, address: str, network: str, logo
 
     bio = BytesIO()
     img.save(bio, format="PNG")
-    bio.seek(0)
+    return bio.getvalue()
+
+
+def _read_disk(key: str) -> Optional[bytes]:
+    try:
+        with open(os.path.join(QR_CACHE_DIR, f"{key}.png"), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_disk(key: str, png: bytes):
+    try:
+        os.makedirs(QR_CACHE_DIR, exist_ok=True)
+        path = os.path.join(QR_CACHE_DIR, f"{key}.png")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        # атомарная замена: параллельный процесс не прочитает недописанный файл
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"[qr] Не удалось сохранить QR на диск: {e}")
+
+
+def wallet_qr_png(address: str, network: str, logo_path: str) -> Tuple[str, bytes]:
+    """(ключ отрисовки, PNG): память -> диск -> отрисовка. Блокирующая — из корутин через asyncio.to_thread"""
+    key = render_key(address, network, logo_path)
+    with _png_lock:
+        png = _png_cache.get(key)
+    if png is not None:
+        return key, png
+
+    png = _read_disk(key)
+    if png is None:
+        png = _render_png(address, network, logo_path)
+        _write_disk(key, png)
+        logger.info(f"[qr] Нарисован QR для {network}:{address}")
+    with _png_lock:
+        _png_cache[key] = png
+    return key, png
+
+
+async def _cached_file_id(redis_key: str) -> Optional[str]:
+    try:
+        return await get_async_redis().get(redis_key)
+    except Exception as e:
+        logger.warning(f"[qr] Не удалось прочитать file_id из Redis: {e}")
+        return None
+
+
+async def _remember_file_id(redis_key: str, file_id: Optional[str]):
+    try:
+        if file_id:
+            await get_async_redis().set(redis_key, file_id)
+        else:
+            await get_async_redis().delete(redis_key)
+    except Exception as e:
+        logger.warning(f"[qr] Не удалось сохранить file_id в Redis: {e}")
+
+
+def _is_file_id_error(error: TelegramBadRequest) -> bool:
+    """Telegram отклонил сам file_id: «wrong file identifier», «wrong remote file identifier», «file reference expired»"""
+    text = (error.message or "").lower()
+    return any(marker in text for marker in _FILE_ID_ERRORS)
+
+
+async def generate_wallet_qr(bot, chat_id: int, address: str, network: str, logo_path: str, lang: str = "ru"):
+    caption = get_message("qr_caption", lang, address=address)
+    key = await asyncio.to_thread(render_key, address, network, logo_path)
+    redis_key = QR_FILE_ID_KEY.format(bot_id=bot.id, render_key=key)
+
+    file_id = await _cached_file_id(redis_key)
+    if file_id:
+        try:
+            return await bot.send_photo(chat_id, photo=file_id, caption=caption, parse_mode="Markdown")
+        except TelegramBadRequest as e:
+            # остальные ошибки (чат не найден, битая разметка подписи) загрузка не исправит
+            if not _is_file_id_error(e):
+                raise
+            # file_id больше не принимается (например, файл удалён) — загружаем заново
+            logger.warning(f"[qr] file_id отклонён Telegram, загружаю картинку заново: {e}")
+            await _remember_file_id(redis_key, None)
 
-    photo_file = BufferedInputFile(bio.getvalue(), filename="qr.png")
+    key, png = await asyncio.to_thread(wallet_qr_png, address, network, logo_path)
+    photo_file = BufferedInputFile(png, filename="qr.png")
 
-    await bot.send_photo(
+    sent = await bot.send_photo(
         chat_id,
         photo=photo_file,
-        caption=get_message("qr_caption", lang, address=address),
+        caption=caption,
         parse_mode="Markdown"
     )
+    if sent.photo:
+        await _remember_file_id(redis_key, sent.photo[-1].file_id)
+    return sent
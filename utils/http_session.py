@@ -0,0 +1,64 @@
+import asyncio
+import weakref
+from typing import Dict, List
+
+import aiohttp
+
+from config import HTTP_POOL_LIMIT, HTTP_POOL_LIMIT_PER_HOST, logger
+
+HTTP_TIMEOUT = aiohttp.ClientTimeout(total=10)
+
+# Одна долгоживущая сессия на event loop (бот и фоновый loop воркера Celery)
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+def _new_session() -> aiohttp.ClientSession:
+    connector = aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,                     # всего соединений в пуле
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,   # на один API (Etherscan, Tronscan, ...)
+        ttl_dns_cache=300,
+        keepalive_timeout=30,
+    )
+    return aiohttp.ClientSession(timeout=HTTP_TIMEOUT, connector=connector)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Общая ClientSession текущего event loop.
+    Соединения (TCP + TLS) переиспользуются между запросами; закрывать
+    сессию вызывающему коду не нужно — это делает close_session() при остановке.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _new_session()
+        _sessions[loop] = session
+        logger.info(f"[http] Created pooled ClientSession {hex(id(session))}")
+    return session
+
+
+async def close_session():
+    """Закрывает сессию текущего event loop (при остановке бота/воркера)"""
+    loop = asyncio.get_running_loop()
+    session = _sessions.pop(loop, None)
+    if session is not None and not session.closed:
+        await session.close()
+        logger.info(f"[http] Closed pooled ClientSession {hex(id(session))}")
+
+
+def pool_stats(session: aiohttp.ClientSession) -> Dict[str, int]:
+    """Занятость пула соединений сессии"""
+    connector = session.connector
+    if connector is None or connector.closed:
+        return {"limit": 0, "limit_per_host": 0, "in_use": 0, "idle": 0}
+    idle = sum(len(conns) for conns in getattr(connector, "_conns", {}).values())
+    return {
+        "limit": connector.limit,
+        "limit_per_host": connector.limit_per_host,
+        "in_use": len(getattr(connector, "_acquired", ())),
+        "idle": idle,
+    }
+
+
+def all_pool_stats() -> List[Dict[str, int]]:
+    return [{"session": hex(id(s)), **pool_stats(s)} for s in list(_sessions.values())]
@@ -0,0 +1,59 @@
+import asyncio
+import weakref
+
+import aiohttp
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from config import TOKEN, TELEGRAM_API_SERVER, NOTIFY_POOL_LIMIT, logger
+
+# Один Bot на event loop (фоновый loop воркера Celery, verifier): уведомления
+# идут через пул соединений его aiohttp сессии, а не через новый TLS handshake
+# к Bot API на каждое сообщение. Сессия aiohttp привязана к loop, поэтому и Bot — тоже.
+_bots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Bot]" = weakref.WeakKeyDictionary()
+_client_sessions: "weakref.WeakSet[aiohttp.ClientSession]" = weakref.WeakSet()
+
+
+class _NotifierSession(AiohttpSession):
+    """AiohttpSession, которая запоминает созданные ею ClientSession (для bot_sessions)"""
+
+    async def create_session(self) -> aiohttp.ClientSession:
+        session = await super().create_session()
+        _client_sessions.add(session)
+        return session
+
+
+def _new_bot() -> Bot:
+    session_kwargs = {"limit": NOTIFY_POOL_LIMIT}
+    if TELEGRAM_API_SERVER:
+        session_kwargs["api"] = TelegramAPIServer.from_base(TELEGRAM_API_SERVER)
+    return Bot(token=TOKEN, session=_NotifierSession(**session_kwargs))
+
+
+def get_bot() -> Bot:
+    """
+    Общий Bot текущего event loop для отправки уведомлений.
+    Закрывать его вызывающему коду не нужно — это делает close_bot() при остановке.
+    """
+    loop = asyncio.get_running_loop()
+    bot = _bots.get(loop)
+    if bot is None:
+        bot = _new_bot()
+        _bots[loop] = bot
+        logger.info(f"[notifier] Created shared Bot session {hex(id(bot.session))}")
+    return bot
+
+
+def bot_sessions() -> set:
+    """aiohttp сессии общих Bot (для utils/aiohttp_debug)"""
+    return {session for session in list(_client_sessions) if not session.closed}
+
+
+async def close_bot():
+    """Закрывает Bot текущего event loop (при остановке воркера)"""
+    loop = asyncio.get_running_loop()
+    bot = _bots.pop(loop, None)
+    if bot is not None:
+        await bot.session.close()
+        logger.info(f"[notifier] Closed shared Bot session {hex(id(bot.session))}")
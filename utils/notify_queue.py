@@ -0,0 +1,263 @@
+import asyncio
+import json
+import time
+from typing import List, Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from cachetools import LRUCache
+
+from config import (
+    ADMIN_CHAT_ID, NOTIFY_GLOBAL_RATE, NOTIFY_GLOBAL_BURST, NOTIFY_CHAT_RATE, NOTIFY_GROUP_RATE, NOTIFY_FLUSH_MAX_ITEMS,
+    NOTIFY_FLUSH_MAX_SECONDS, NOTIFY_DIGEST_THRESHOLD, NOTIFY_MAX_ATTEMPTS, logger
+)
+from utils.notifier import get_bot
+from utils.rate_limiter import TokenBucketLimiter
+from utils.redis_pool import get_async_redis, new_lock_token, release_lock, extend_lock
+
+# Очередь исходящих сообщений Telegram: у каждого чата свой Redis list (FIFO),
+# а READY_KEY (sorted set) хранит для чатов с сообщениями время, с которого им
+# можно отправлять. Отправляет один sender (Redis lock) с учётом лимитов Bot API:
+# общий (~30 сообщений/с) и на чат (~1/с в личке, ~20/мин в группе). Чат, упёршийся
+# в лимит или получивший 429 с retry_after, откладывается в READY_KEY и не
+# задерживает остальные; сообщения одного чата уходят строго по порядку.
+CHAT_QUEUE_KEY = "notify:outbox:chat:{chat_id}"
+READY_KEY = "notify:outbox:ready"
+DEAD_LETTER_KEY = "notify:outbox:dead"
+SENDER_LOCK_KEY = "notify:sender_lock"
+FLUSH_TRIGGER_KEY = "notify:flush_triggered"
+
+SENDER_LOCK_TTL = int(NOTIFY_FLUSH_MAX_SECONDS) + 30
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n➖➖➖➖➖\n\n"
+ERROR_RETRY_DELAY = 1.0        # сек до повтора после сетевой ошибки
+
+# Снимает count отправленных сообщений из головы очереди чата и переносит чат
+# в READY_KEY на ready_at; пустая очередь удаляется из READY_KEY. Атомарно, чтобы
+# сообщение, поставленное в очередь между проверкой длины и ZREM, не потерялось.
+_SETTLE_LUA = """
+if tonumber(ARGV[1]) > 0 then
+    redis.call('LTRIM', KEYS[1], ARGV[1], -1)
+end
+if redis.call('LLEN', KEYS[1]) == 0 then
+    return redis.call('ZREM', KEYS[2], ARGV[2])
+end
+return redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+"""
+
+global_limiter = TokenBucketLimiter("telegram", NOTIFY_GLOBAL_RATE, max(1, NOTIFY_GLOBAL_BURST))
+_chat_limiters = LRUCache(maxsize=10_000)
+
+
+def _chat_limiter(chat_id: str) -> TokenBucketLimiter:
+    limiter = _chat_limiters.get(chat_id)
+    if limiter is None:
+        # у групп и каналов id отрицательный — у них свой, более строгий лимит
+        rate = NOTIFY_GROUP_RATE if chat_id.startswith("-") else NOTIFY_CHAT_RATE
+        limiter = TokenBucketLimiter(f"telegram:{chat_id}", rate, 1)
+        _chat_limiters[chat_id] = limiter
+    return limiter
+
+
+def _item(chat_id, text: str, parse_mode: Optional[str], digest: bool) -> dict:
+    return {"chat_id": str(chat_id), "text": text, "parse_mode": parse_mode, "digest": digest, "attempts": 0}
+
+
+def _send_flush_task():
+    from celery_app import celery_app
+    celery_app.send_task("tasks.flush_notifications")
+
+
+async def _trigger_flush():
+    """Запускает отправку сразу, не дожидаясь beat (не чаще раза в секунду)"""
+    try:
+        if await get_async_redis().set(FLUSH_TRIGGER_KEY, 1, nx=True, ex=1):
+            await asyncio.to_thread(_send_flush_task)
+    except Exception as e:
+        # без Celery очередь разбирает run_sender (main.py, verifier.py)
+        logger.debug(f"[notify_queue] Не удалось запустить отправку: {e}")
+
+
+async def enqueue_message(chat_id, text: str, parse_mode: Optional[str] = None, digest: bool = False) -> bool:
+    """
+    Ставит сообщение в очередь отправки.
+    digest=True — сводка для админов: при длинной очереди склеивается с соседними в одно сообщение.
+    """
+    item = _item(chat_id, text, parse_mode, digest)
+    try:
+        pipe = get_async_redis().pipeline()
+        pipe.rpush(CHAT_QUEUE_KEY.format(chat_id=item["chat_id"]), json.dumps(item, ensure_ascii=False))
+        # чат, уже ждущий лимита, не переносится раньше времени
+        pipe.zadd(READY_KEY, {item["chat_id"]: time.time()}, nx=True)
+        await pipe.execute()
+    except Exception as e:
+        # Redis недоступен — отправляем сразу, чтобы не потерять сообщение
+        logger.error(f"[notify_queue] Redis недоступен, отправляю напрямую: {e}")
+        try:
+            await get_bot().send_message(chat_id=chat_id, text=text, parse_mode=parse_mode)
+            return True
+        except Exception as e:
+            logger.error(f"[notify_queue] Прямая отправка не удалась: {e}")
+            return False
+    await _trigger_flush()
+    return True
+
+
+async def enqueue_admin(text: str, parse_mode: Optional[str] = None) -> bool:
+    """Сводка/заявка в админ-чат ADMIN_CHAT_ID"""
+    return await enqueue_message(ADMIN_CHAT_ID, text, parse_mode, digest=True)
+
+
+def collapse_digests(items: List[dict]) -> List[dict]:
+    """
+    Склеивает идущие подряд сводки (digest=True) одного чата и parse_mode в
+    сообщения до 4096 символов. Любое другое сообщение прерывает склейку, поэтому
+    порядок сообщений не меняется; merged — сколько элементов вошло в сообщение.
+    """
+    result: List[dict] = []
+    for item in items:
+        last = result[-1] if result else None
+        if (
+            item.get("digest") and last is not None and last.get("digest")
+            and (last["chat_id"], last.get("parse_mode")) == (item["chat_id"], item.get("parse_mode"))
+            and len(last["text"]) + len(DIGEST_SEPARATOR) + len(item["text"]) <= MESSAGE_LIMIT
+        ):
+            last["text"] += DIGEST_SEPARATOR + item["text"]
+            last["merged"] = last.get("merged", 1) + 1
+            continue
+        result.append(dict(item))
+    return result
+
+
+def _settle(client, chat_id: str, count: int, ready_at: float):
+    """Снимает count сообщений из головы очереди чата и откладывает чат до ready_at (подходит для pipeline)"""
+    return client.eval(
+        _SETTLE_LUA, 2, CHAT_QUEUE_KEY.format(chat_id=chat_id), READY_KEY, int(count), chat_id, ready_at
+    )
+
+
+def _parse_head(raw_items: list) -> List[dict]:
+    """Элементы из головы очереди до первого битого"""
+    items = []
+    for raw in raw_items:
+        try:
+            items.append(json.loads(raw))
+        except ValueError:
+            break
+    return items
+
+
+async def _send_next(redis_client, chat_id: str) -> int:
+    """
+    Отправляет следующее сообщение чата (при длинной очереди — склеенные сводки).
+    Возвращает 1, если сообщение отправлено, иначе 0; чат, которому сейчас
+    отправлять нельзя, откладывается в READY_KEY.
+    """
+    wait = await _chat_limiter(chat_id).try_acquire()
+    if wait > 0:
+        await _settle(redis_client, chat_id, 0, time.time() + wait)
+        return 0
+
+    queue_key = CHAT_QUEUE_KEY.format(chat_id=chat_id)
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.lrange(queue_key, 0, 0)
+    pipe.llen(queue_key)
+    raw_items, length = await pipe.execute()
+    items = _parse_head(raw_items)
+    collapse = bool(items) and items[0].get("digest") and length >= NOTIFY_DIGEST_THRESHOLD
+    if collapse:
+        # длинная очередь админ-чата: подряд идущие сводки уходят одним сообщением
+        raw_items = await redis_client.lrange(queue_key, 0, NOTIFY_FLUSH_MAX_ITEMS - 1)
+        items = _parse_head(raw_items)
+    if not items:
+        if raw_items:
+            logger.error(f"[notify_queue] Битый элемент очереди: {raw_items[0]}")
+            pipe = redis_client.pipeline()
+            pipe.rpush(DEAD_LETTER_KEY, raw_items[0])
+            _settle(pipe, chat_id, 1, time.time())
+            await pipe.execute()
+        else:
+            await _settle(redis_client, chat_id, 0, time.time())
+        return 0
+
+    message = collapse_digests(items)[0] if collapse else items[0]
+    count = message.get("merged", 1)
+
+    async def to_dead_letter(error: Exception):
+        pipe = redis_client.pipeline()
+        pipe.rpush(DEAD_LETTER_KEY, *[json.dumps({**i, "error": str(error)}, ensure_ascii=False) for i in items[:count]])
+        _settle(pipe, chat_id, count, time.time())
+        await pipe.execute()
+
+    await global_limiter.acquire()
+    try:
+        await get_bot().send_message(chat_id=chat_id, text=message["text"], parse_mode=message.get("parse_mode"))
+    except TelegramRetryAfter as e:
+        logger.warning(f"[notify_queue] 429 для чата {chat_id}, пауза {e.retry_after}с")
+        await _settle(redis_client, chat_id, 0, time.time() + e.retry_after)
+        return 0
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # бот заблокирован, чат не найден, битая разметка — повтор не поможет
+        logger.error(f"[notify_queue] Сообщение в чат {chat_id} не доставлено: {e}")
+        await to_dead_letter(e)
+        return 0
+    except Exception as e:
+        head = items[0]
+        head["attempts"] = head.get("attempts", 0) + 1
+        logger.warning(f"[notify_queue] Ошибка отправки в чат {chat_id} (попытка {head['attempts']}): {e}")
+        if head["attempts"] >= NOTIFY_MAX_ATTEMPTS:
+            await to_dead_letter(e)
+        else:
+            pipe = redis_client.pipeline()
+            pipe.lset(queue_key, 0, json.dumps(head, ensure_ascii=False))
+            _settle(pipe, chat_id, 0, time.time() + ERROR_RETRY_DELAY)
+            await pipe.execute()
+        return 0
+
+    await _settle(redis_client, chat_id, count, time.time())
+    return 1
+
+
+async def flush_outbox(max_seconds: float = NOTIFY_FLUSH_MAX_SECONDS) -> int:
+    """
+    Отправляет очередь с максимальной скоростью, которую допускают лимиты:
+    по сообщению каждому готовому чату за проход, пока готовые чаты не кончатся
+    или не выйдет max_seconds. Не ждёт лимитов и retry_after — отложенные чаты
+    заберёт следующий запуск (beat, run_sender). Работает только один sender
+    одновременно (Redis lock). Возвращает количество отправленных сообщений.
+    """
+    redis_client = get_async_redis()
+    token = new_lock_token()
+    if not await redis_client.set(SENDER_LOCK_KEY, token, nx=True, ex=SENDER_LOCK_TTL):
+        return 0
+
+    sent = 0
+    # отправка прекращается на deadline, а lock продлевается перед каждым проходом —
+    # TTL (max_seconds + 30) не истекает, пока sender работает
+    deadline = time.monotonic() + max_seconds
+    try:
+        while time.monotonic() < deadline:
+            if not await extend_lock(redis_client, SENDER_LOCK_KEY, token, SENDER_LOCK_TTL):
+                logger.error("[notify_queue] Lock отправки потерян, останавливаю sender")
+                break
+            chat_ids = await redis_client.zrangebyscore(
+                READY_KEY, "-inf", time.time(), start=0, num=NOTIFY_FLUSH_MAX_ITEMS
+            )
+            if not chat_ids:
+                break
+            for chat_id in chat_ids:
+                if time.monotonic() >= deadline:
+                    break
+                sent += await _send_next(redis_client, chat_id)
+    finally:
+        await release_lock(redis_client, SENDER_LOCK_KEY, token)
+    return sent
+
+
+async def run_sender(interval: float = 1.0):
+    """Постоянная отправка очереди (для процессов без Celery beat: бот без Celery, verifier.py)"""
+    while True:
+        try:
+            await flush_outbox()
+        except Exception as e:
+            logger.error(f"[notify_queue] Ошибка отправки очереди: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,434 @@
+import secrets
+import time
+from datetime import datetime, timezone, timedelta
+from zoneinfo import ZoneInfo
+
+from aiogram.fsm.storage.base import StorageKey
+
+from config import (
+    REDIS_KEY_PREFIX_ERC, REDIS_KEY_PREFIX_TRC,
+    PENDING_RECHECK_INTERVAL, PENDING_DUE_BATCH, logger
+)
+from handlers.crypto import CryptoFSM, send_telegram_notification
+from utils.fsm_storage import advance_state
+from utils.poll_policy import next_delay
+from utils.redis_pool import get_async_redis, release_lock, extend_lock
+from utils.sheets_queue import aenqueue_update
+
+# Общая обработка pending транзакций для Celery beat (tasks.py) и asyncio-воркера (verifier.py)
+
+PENDING_TTL = 3 * 60 * 60                  # 3 часа TTL ключа
+MAX_PENDING_DURATION = timedelta(minutes=2)  # в тексте так и было – 2 часа
+
+ERC20_STAGES = ("in_block", "is_erc20", "recipient", "transfer_params", "confirmations")
+
+# Проверенные неизменные данные ERC20 транзакции в pending hash (поле -> ключ facts)
+FACT_FIELDS = {
+    "tx_block": "block_number",
+    "tx_recipient": "recipient",
+    "tx_amount": "amount",
+    "tx_timestamp": "timestamp",
+}
+
+KYIV_TZ = ZoneInfo("Europe/Kyiv")
+
+# Расписание: sorted set «ключ pending транзакции -> unix-время следующей проверки».
+# Тик забирает только наступившие проверки, а не сканирует всю базу Redis.
+SCHEDULE_KEY = "pending:due"
+# Забранная тиком транзакция не выдаётся повторно, пока не пройдёт CLAIM_LEASE
+# (после обработки время перезаписывается результатом).
+CLAIM_LEASE = 120
+
+# Аренда транзакции (SET NX EX): пока она у одного обработчика, другие его пропускают
+LEASE_KEY = "pending:lease:{tx_hash}"
+LEASE_TTL = 300
+# Тик beat — один одновременно, даже если предыдущий затянулся. Тик продлевает
+# lock перед каждым этапом (пакетная проверка сети — до 120 с, затем обработка ключей)
+TICK_LOCK_KEY = "pending:tick_lock"
+TICK_LOCK_TTL = 180
+
+_CLAIM_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+    redis.call('ZADD', KEYS[1], ARGV[3], member)
+end
+return due
+"""
+
+
+def pending_patterns() -> list:
+    return [f"{REDIS_KEY_PREFIX_ERC}*", f"{REDIS_KEY_PREFIX_TRC}*"]
+
+
+def tx_hash_from_key(key: str) -> str:
+    return key.split(":")[1]
+
+
+def parse_stage_list(s: str):
+    return [x for x in (s or "").split(",") if x]
+
+
+def stage_set_for(tx_data: dict) -> set:
+    stage_list = parse_stage_list(tx_data.get("stage"))
+    return set(stage_list) if stage_list else set(ERC20_STAGES)
+
+
+def facts_mapping(facts: dict | None) -> dict:
+    """Поля pending hash для сохранения facts из результата проверки"""
+    if not facts:
+        return {}
+    return {field: facts[name] for field, name in FACT_FIELDS.items() if facts.get(name) not in (None, "")}
+
+
+def load_facts(tx_data: dict) -> dict:
+    facts = {name: tx_data[field] for field, name in FACT_FIELDS.items() if tx_data.get(field)}
+    if "amount" in facts:
+        try:
+            facts["amount"] = float(facts["amount"])
+        except ValueError:
+            facts.pop("amount")
+    return facts
+
+
+def next_check_delay(network: str | None = None, result: dict | None = None, attempt: int = 0) -> float:
+    """
+    Через сколько секунд проверить транзакцию снова: по коду результата
+    (utils/poll_policy.py), без результата — PENDING_RECHECK_INTERVAL.
+    """
+    if not result:
+        return PENDING_RECHECK_INTERVAL
+    return next_delay(network, result, attempt)
+
+
+def poll_attempt(tx_data: dict, result: dict) -> int:
+    """Сколько проверок подряд вернули тот же код (0 — код новый)"""
+    if tx_data.get("poll_code") != (result.get("code") or ""):
+        return 0
+    try:
+        return int(tx_data.get("poll_attempt") or 0) + 1
+    except ValueError:
+        return 0
+
+
+def schedule_sync(redis_client, key: str, delay: float = 0.0):
+    redis_client.zadd(SCHEDULE_KEY, {key: time.time() + delay})
+
+
+async def schedule(key: str, delay: float = 0.0):
+    await get_async_redis().zadd(SCHEDULE_KEY, {key: time.time() + delay})
+
+
+def postpone_sync(redis_client, keys: list, delay: float):
+    """Откладывает проверку ключей, которые ещё в расписании (ZADD XX): удалённые туда не вернутся"""
+    if keys:
+        redis_client.zadd(SCHEDULE_KEY, {key: time.time() + delay for key in keys}, xx=True)
+
+
+async def postpone(keys: list, delay: float):
+    if keys:
+        await get_async_redis().zadd(SCHEDULE_KEY, {key: time.time() + delay for key in keys}, xx=True)
+
+
+def drop_sync(redis_client, key: str):
+    pipe = redis_client.pipeline()
+    pipe.delete(key)
+    pipe.zrem(SCHEDULE_KEY, key)
+    pipe.execute()
+
+
+async def drop(key: str):
+    pipe = get_async_redis().pipeline()
+    pipe.delete(key)
+    pipe.zrem(SCHEDULE_KEY, key)
+    await pipe.execute()
+
+
+def _split_loaded(keys: list, rows: list):
+    loaded = [(key, tx_data) for key, tx_data in zip(keys, rows) if tx_data]
+    # ключ истёк по TTL — убираем из расписания
+    stale = [key for key, tx_data in zip(keys, rows) if not tx_data]
+    return loaded, stale
+
+
+def claim_due_sync(redis_client, limit: int = PENDING_DUE_BATCH) -> list:
+    """
+    Забирает наступившие проверки (ZRANGEBYSCORE) и сдвигает их время на CLAIM_LEASE
+    атомарно: параллельные тики и воркеры получают непересекающиеся ключи.
+    """
+    now = time.time()
+    return redis_client.eval(_CLAIM_DUE_LUA, 1, SCHEDULE_KEY, now, limit, now + CLAIM_LEASE) or []
+
+
+async def claim_due(limit: int = PENDING_DUE_BATCH) -> list:
+    now = time.time()
+    return await get_async_redis().eval(_CLAIM_DUE_LUA, 1, SCHEDULE_KEY, now, limit, now + CLAIM_LEASE) or []
+
+
+def load_pending_sync(redis_client, keys: list) -> list:
+    """[(key, tx_data), ...]: HGETALL одним pipeline"""
+    if not keys:
+        return []
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    loaded, stale = _split_loaded(keys, pipe.execute())
+    if stale:
+        redis_client.zrem(SCHEDULE_KEY, *stale)
+    return loaded
+
+
+async def load_pending(keys: list) -> list:
+    if not keys:
+        return []
+    redis_client = get_async_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+    loaded, stale = _split_loaded(keys, await pipe.execute())
+    if stale:
+        await redis_client.zrem(SCHEDULE_KEY, *stale)
+    return loaded
+
+
+def lease_and_load_sync(redis_client, keys: list) -> tuple:
+    """
+    Берёт аренду на транзакции и только потом читает их hash: обработчик, получивший
+    аренду после того, как другой подтвердил и удалил ключ, увидит, что ключа нет,
+    а не устаревшие tx_data. Занятые другим обработчиком откладываются.
+    Возвращает (аренды {tx_hash: token}, [(key, tx_data), ...]).
+    """
+    leases = acquire_leases_sync(redis_client, [tx_hash_from_key(key) for key in keys])
+    postpone_sync(redis_client, [key for key in keys if tx_hash_from_key(key) not in leases], next_check_delay())
+    try:
+        return leases, load_pending_sync(redis_client, [key for key in keys if tx_hash_from_key(key) in leases])
+    except Exception:
+        release_leases_sync(redis_client, leases)
+        raise
+
+
+async def lease_and_load(keys: list) -> tuple:
+    leases = await acquire_leases([tx_hash_from_key(key) for key in keys])
+    await postpone([key for key in keys if tx_hash_from_key(key) not in leases], next_check_delay())
+    try:
+        return leases, await load_pending([key for key in keys if tx_hash_from_key(key) in leases])
+    except Exception:
+        await release_leases(leases)
+        raise
+
+
+def acquire_leases_sync(redis_client, tx_hashes: list, ttl: int = LEASE_TTL) -> dict:
+    """Берёт аренду на хеши одним pipeline. Возвращает {tx_hash: token} для полученных"""
+    if not tx_hashes:
+        return {}
+    tokens = {tx_hash: secrets.token_hex(8) for tx_hash in tx_hashes}
+    pipe = redis_client.pipeline(transaction=False)
+    for tx_hash, token in tokens.items():
+        pipe.set(LEASE_KEY.format(tx_hash=tx_hash), token, nx=True, ex=ttl)
+    acquired = pipe.execute()
+    return {tx_hash: token for (tx_hash, token), ok in zip(tokens.items(), acquired) if ok}
+
+
+async def acquire_leases(tx_hashes: list, ttl: int = LEASE_TTL) -> dict:
+    if not tx_hashes:
+        return {}
+    tokens = {tx_hash: secrets.token_hex(8) for tx_hash in tx_hashes}
+    pipe = get_async_redis().pipeline(transaction=False)
+    for tx_hash, token in tokens.items():
+        pipe.set(LEASE_KEY.format(tx_hash=tx_hash), token, nx=True, ex=ttl)
+    acquired = await pipe.execute()
+    return {tx_hash: token for (tx_hash, token), ok in zip(tokens.items(), acquired) if ok}
+
+
+def release_leases_sync(redis_client, leases: dict):
+    """Снимает только свою аренду (если она истекла и её взял другой — не трогаем)"""
+    if not leases:
+        return
+    pipe = redis_client.pipeline(transaction=False)
+    for tx_hash, token in leases.items():
+        release_lock(pipe, LEASE_KEY.format(tx_hash=tx_hash), token)
+    pipe.execute()
+
+
+async def release_leases(leases: dict):
+    if not leases:
+        return
+    pipe = get_async_redis().pipeline(transaction=False)
+    for tx_hash, token in leases.items():
+        release_lock(pipe, LEASE_KEY.format(tx_hash=tx_hash), token)
+    await pipe.execute()
+
+
+def acquire_tick_lock_sync(redis_client) -> str | None:
+    token = secrets.token_hex(8)
+    return token if redis_client.set(TICK_LOCK_KEY, token, nx=True, ex=TICK_LOCK_TTL) else None
+
+
+def extend_tick_lock_sync(redis_client, token: str | None):
+    if token:
+        extend_lock(redis_client, TICK_LOCK_KEY, token, TICK_LOCK_TTL)
+
+
+def release_tick_lock_sync(redis_client, token: str):
+    release_lock(redis_client, TICK_LOCK_KEY, token)
+
+
+def backfill_schedule_sync(redis_client) -> int:
+    """
+    Разово ставит в расписание pending ключи, созданные до его появления
+    (SCAN по префиксам; уже запланированные не трогает).
+    """
+    added = 0
+    for pattern in pending_patterns():
+        for key in redis_client.scan_iter(match=pattern, count=500):
+            added += redis_client.zadd(SCHEDULE_KEY, {key: time.time()}, nx=True)
+    if added:
+        logger.info(f"[pending_tx] В расписание добавлено ключей: {added}")
+    return added
+
+
+async def backfill_schedule() -> int:
+    redis_client = get_async_redis()
+    added = 0
+    for pattern in pending_patterns():
+        async for key in redis_client.scan_iter(match=pattern, count=500):
+            added += await redis_client.zadd(SCHEDULE_KEY, {key: time.time()}, nx=True)
+    if added:
+        logger.info(f"[pending_tx] В расписание добавлено ключей: {added}")
+    return added
+
+
+def now_kyiv() -> str:
+    return datetime.now(KYIV_TZ).strftime("%d.%m.%Y %H:%M:%S")
+
+
+async def advance_fsm_state(username: int, chat_id: int, bot_id: int, next_state, extra: dict | None = None):
+    try:
+        key = StorageKey(bot_id=bot_id, chat_id=chat_id, user_id=username)
+        await advance_state(key, next_state, extra)
+    except Exception as e:
+        logger.error(f"Ошибка в _advance_fsm_state: {e}")
+
+
+async def handle_result(key: str, tx_data: dict, result: dict, now: str | None = None) -> str:
+    """
+    Применяет результат проверки pending транзакции: уведомление, запись
+    в таблицу, FSM и Redis-ключ. Возвращает итог: confirmed / failed / expired / pending.
+    """
+    redis_client = get_async_redis()
+    now = now or now_kyiv()
+    tx_hash = tx_hash_from_key(key)
+    username = tx_data.get("username")
+    lang = tx_data.get("lang")
+    chat_id = tx_data.get("chat_id")
+    bot_id = tx_data.get("bot_id")
+    target_address = tx_data.get("target_address")
+    first_seen_str = tx_data.get("first_seen")
+    amount = tx_data.get("amount", "N/A")
+    network = tx_data.get("network", "N/A")
+
+    if result.get("success") and result.get("status") == "confirmed":
+        if network == "ERC20":
+            google_update_params = {"status": [result.get("status"), 6], "date_confirmation": [now, 5]}
+        if network == "TRC20":
+            google_update_params = {
+                "status": [result.get("status"), 6],
+                "date_confirmation": [now, 5],
+                "timestamp": [result.get("timestamp", "N/A"), 4],
+                "amount": [result.get("amount", "N/A"), 7],
+                "error": ['', 8]
+            }
+        msg = {
+            "msg_status": "tx_confirmed",
+            "lang": lang,
+            "amount_result": amount,
+            "target_address": target_address,
+            "timestamp": result.get("timestamp", "N/A"),
+        }
+        await send_telegram_notification(chat_id, msg)
+        await aenqueue_update(tx_hash, google_update_params)
+        await advance_fsm_state(
+            username=username,
+            chat_id=chat_id,
+            bot_id=bot_id,
+            next_state=CryptoFSM.contact,
+            extra={
+                "amount_result": amount,
+                "tx_hash": tx_hash,
+                "target_address": target_address,
+                "timestamp": result.get("timestamp", "N/A"),
+            },
+        )
+        await drop(key)
+        return "confirmed"
+
+    # обновим стадии/ошибку
+    if network == "ERC20":
+        await redis_client.hset(key, mapping={
+            "stage": ",".join(result.get("stage", [])),
+            "last_error_code": result.get("code", "") or "",
+            "last_error_text": result.get("error", "") or "",
+            **facts_mapping(result.get("facts")),
+        })
+
+    code = result.get("code")
+
+    # фатальные кейсы — сразу уведомление и чистим
+    if code in ("invalid_token", "invalid_recipient"):
+        msg = {
+            "lang": lang,
+            "amount_result": amount,
+            "target_address": target_address,
+            "timestamp": result.get("timestamp", "N/A"),
+        }
+        if code == "invalid_token":
+            if network == "ERC20":
+                msg.update({"msg_status": "invalid_token_erc"})
+            if network == "TRC20":
+                msg.update({"msg_status": "invalid_token_trc"})
+        else:
+            msg.update({"msg_status": "invalid_recipient"})
+
+        google_update_params = {"status": [result.get("status"), 6], "error": [result.get("error",""), 8]}
+        await send_telegram_notification(chat_id, msg)
+        await aenqueue_update(tx_hash, google_update_params)
+        await drop(key)
+        return "failed"
+
+    # просрочка ожидания
+    if first_seen_str:
+        first_seen = datetime.fromisoformat(first_seen_str)
+        if datetime.now(timezone.utc) - first_seen > MAX_PENDING_DURATION:
+            msg = {
+                "msg_status": "expired",
+                "lang": lang,
+                "amount_result": amount,
+                "target_address": target_address,
+                "timestamp": result.get("timestamp", "N/A"),
+            }
+            error_msg = f"Транзакция удалена: не получено подтверждение в течение 2 часов\n{result.get('error','')}"
+            google_update_params = {"status": ["expired", 6], "date_confirmation": [now, 5], "error": [error_msg, 8]}
+            await send_telegram_notification(chat_id, msg)
+            await aenqueue_update(tx_hash, google_update_params)
+            await drop(key)
+            return "expired"
+
+    # если просто pending — оставляем ключ с продлённым TTL и планируем следующую проверку
+    attempt = poll_attempt(tx_data, result)
+    delay = next_check_delay(network, result, attempt)
+    if first_seen_str:
+        # не проспать момент просрочки
+        remaining = (first_seen + MAX_PENDING_DURATION - datetime.now(timezone.utc)).total_seconds()
+        delay = min(delay, max(remaining, 1.0))
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={"poll_code": result.get("code") or "", "poll_attempt": attempt})
+    pipe.expire(key, PENDING_TTL)
+    await pipe.execute()
+    await schedule(key, delay)
+    return "pending"
+
+
+async def record_error(key: str, code: str, text: str):
+    redis_client = get_async_redis()
+    await redis_client.hset(key, mapping={"last_error_code": code or "", "last_error_text": text or ""})
+    await redis_client.expire(key, PENDING_TTL)
+    await schedule(key, next_check_delay())
@@ -0,0 +1,59 @@
+import random
+
+from config import (
+    ERC20_CONFIRMATIONS, TRC20_CONFIRMATIONS, ETH_BLOCK_TIME, TRON_BLOCK_TIME,
+    TRON_SOLIDIFY_BLOCKS, POLL_MIN_DELAY, POLL_MAX_DELAY, POLL_BACKOFF_BASE
+)
+
+# Через сколько проверять pending транзакцию снова — по стадии/коду последней проверки:
+#   not_found / ошибки API    — экспоненциальный backoff с jitter (хеш может так и не появиться)
+#   not_in_block              — ждём ближайшие блоки
+#   not_confirmed (Tron)      — ждём solidification (~TRON_SOLIDIFY_BLOCKS блоков)
+#   low_confirmations         — столько блоков, сколько подтверждений не хватает
+
+BLOCK_TIME = {"ERC20": ETH_BLOCK_TIME, "TRC20": TRON_BLOCK_TIME}
+REQUIRED_CONFIRMATIONS = {"ERC20": int(ERC20_CONFIRMATIONS), "TRC20": int(TRC20_CONFIRMATIONS)}
+
+
+def _clamp(delay: float) -> float:
+    return max(POLL_MIN_DELAY, min(POLL_MAX_DELAY, delay))
+
+
+def _backoff(attempt: int) -> float:
+    """Экспоненциальный backoff с full jitter: случайно в [base, base * 2^attempt]"""
+    cap = min(POLL_MAX_DELAY, POLL_BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(min(POLL_BACKOFF_BASE, cap), cap)
+
+
+def _blocks_wait(blocks: int, block_time: float) -> float:
+    # небольшой jitter, чтобы транзакции из одного блока не проверялись одной пачкой секунда в секунду
+    return blocks * block_time * random.uniform(1.0, 1.1)
+
+
+def next_delay(network: str, result: dict, attempt: int = 0) -> float:
+    """
+    Пауза до следующей проверки, сек.
+    attempt — сколько проверок подряд вернули тот же код (0 — первая).
+    """
+    code = (result or {}).get("code")
+    block_time = BLOCK_TIME.get(network, ETH_BLOCK_TIME)
+
+    if code == "low_confirmations":
+        required = REQUIRED_CONFIRMATIONS.get(network, 1)
+        try:
+            confirmations = int(result.get("confirmations") or 0)
+        except (TypeError, ValueError):
+            confirmations = 0
+        return _clamp(_blocks_wait(max(1, required - confirmations), block_time))
+
+    if code == "not_in_block":
+        # в мемпуле: обычно попадает в один из ближайших блоков, дальше — реже
+        return _clamp(_blocks_wait(2 ** min(attempt, 4), block_time))
+
+    if code == "not_confirmed":
+        # Tronscan отдаёт confirmed после solidification; если не успела — чаще, потом реже
+        blocks = TRON_SOLIDIFY_BLOCKS if attempt == 0 else 2 ** min(attempt, 5)
+        return _clamp(_blocks_wait(blocks, block_time))
+
+    # not_found, api_error и прочее неизвестное
+    return _clamp(_backoff(attempt))
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from config import logger
+from utils.redis_pool import get_async_redis
+
+# Token bucket в Redis: общий лимит для всех корутин и всех процессов воркеров.
+# Возвращает 0, если токен выдан, иначе — сколько миллисекунд подождать.
+_TOKEN_BUCKET_LUA = """
+local key = KEYS[1]
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+
+tokens = math.min(capacity, tokens + (now - ts) * rate / 1000)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+
+redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+class TokenBucketLimiter:
+    """
+    Ограничитель запросов «rate в секунду, всплеск до capacity».
+    Состояние хранится в Redis, поэтому лимит общий для бота и всех воркеров.
+    Если Redis недоступен — работает локальный bucket этого процесса.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: int):
+        self.key = f"ratelimit:{name}"
+        self.rate = float(rate)
+        self.capacity = int(capacity)
+        self._local_tokens = float(capacity)
+        self._local_ts = time.monotonic()
+
+    def _local_wait(self) -> float:
+        now = time.monotonic()
+        self._local_tokens = min(self.capacity, self._local_tokens + (now - self._local_ts) * self.rate)
+        self._local_ts = now
+        if self._local_tokens >= 1:
+            self._local_tokens -= 1
+            return 0.0
+        return (1 - self._local_tokens) / self.rate
+
+    async def _wait_time(self) -> float:
+        try:
+            wait_ms = await get_async_redis().eval(_TOKEN_BUCKET_LUA, 1, self.key, self.rate, self.capacity)
+            return int(wait_ms) / 1000
+        except Exception as e:
+            logger.debug(f"[rate_limiter] Redis недоступен, локальный лимит: {e}")
+            return self._local_wait()
+
+    async def try_acquire(self) -> float:
+        """Берёт токен, если он есть: 0 — выдан, иначе сколько секунд ждать"""
+        return await self._wait_time()
+
+    async def acquire(self):
+        """Ждёт, пока не будет выдан токен"""
+        while True:
+            wait = await self._wait_time()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых запросов «в полёте»: пока первый вызов с ключом
+    не завершился, остальные ждут его результат вместо своего HTTP запроса.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def do(self, key, coro_factory):
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = loop.create_future()
+        self._inflight[flight_key] = future
+        try:
+            result = await coro_factory()
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # чтобы не было "exception was never retrieved", если никто не ждал
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(flight_key, None)
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import (
+    RATES_FRESH_TTL, RATES_MEMORY_TTL, RATES_STALE_TTL, RATES_REFRESH_LOCK_TTL, RATES_COLD_WAIT, logger
+)
+from utils.rate_limiter import SingleFlight
+from utils.redis_pool import get_async_redis, new_lock_token, release_lock
+
+# Кэш курсов в два уровня: копия в памяти процесса (RATES_MEMORY_TTL) перед
+# снимком в Redis. Снимок — {"version", "fetched_at", "rates"}; version растёт
+# с каждым разбором канала (общий счётчик в Redis), fetched_at — unix время разбора.
+# Устаревший снимок (старше RATES_FRESH_TTL) продолжает отдаваться, пока его
+# обновляет один процесс — тот, что взял Redis lock; остальные канал не трогают.
+# Каждый новый снимок публикуется в RATES_UPDATES_CHANNEL: подписанные процессы
+# (listen) меняют копию в памяти сразу. Пока запущен rates_ingest.py, lock держит
+# он (INGEST_HOLDER) — курсы приходят от него, остальные процессы канал не разбирают.
+RATES_KEY = "currency_rates"
+RATES_VERSION_KEY = "currency_rates:version"
+RATES_LOCK_KEY = "currency_rates:refresh_lock"
+RATES_UPDATES_CHANNEL = "currency_rates:updates"
+LOCK_FAILED = "failed"
+INGEST_HOLDER = "ingest"
+
+Refresher = Callable[[], Awaitable[Optional[Dict[str, Dict]]]]
+
+
+def decode_snapshot(raw) -> Optional[dict]:
+    """Снимок из значения RATES_KEY; старый формат (просто курсы) — версия 0, сразу устаревший"""
+    if not raw:
+        return None
+    data = json.loads(raw)
+    if "rates" not in data:
+        return {"version": 0, "fetched_at": 0.0, "rates": data}
+    return data
+
+
+def is_stale(snapshot: dict, fresh_ttl: float = RATES_FRESH_TTL) -> bool:
+    return time.time() - snapshot.get("fetched_at", 0) >= fresh_ttl
+
+
+class RatesCache:
+    """
+    Курсы для хендлеров: попадание в кэш — чтение из памяти без обращения к Redis.
+    refresher — корутина разбора источника (канала), возвращает курсы или None.
+    """
+
+    def __init__(self, refresher: Refresher, fresh_ttl: float = RATES_FRESH_TTL, memory_ttl: float = RATES_MEMORY_TTL):
+        self.refresher = refresher
+        self.fresh_ttl = fresh_ttl
+        self.memory_ttl = memory_ttl
+        self._snapshot: Optional[dict] = None
+        self._memory_until = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_after = 0.0
+        self._flight = SingleFlight()
+
+    @property
+    def snapshot(self) -> Optional[dict]:
+        """Снимок в памяти (без проверки свежести и обращения к Redis)"""
+        return self._snapshot
+
+    async def get(self) -> Optional[dict]:
+        """Текущий снимок (возможно устаревший — тогда запускается фоновое обновление) или None"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._memory_until:
+            if is_stale(snapshot, self.fresh_ttl):
+                self._refresh_in_background()
+            return snapshot
+        return await self._flight.do("load", self._load)
+
+    def remember(self, snapshot: dict) -> bool:
+        """Кладёт снимок в память, если он не старее текущего. True — снимок новый"""
+        current = self._snapshot
+        self._memory_until = time.monotonic() + self.memory_ttl
+        if current is not None and snapshot["version"] < current["version"]:
+            return False
+        self._snapshot = snapshot
+        return current is None or snapshot["version"] != current["version"]
+
+    async def _load(self) -> Optional[dict]:
+        try:
+            snapshot = decode_snapshot(await get_async_redis().get(RATES_KEY))
+        except Exception as e:
+            # Redis недоступен — отдаём то, что есть в памяти
+            logger.error(f"[rates_cache] Не удалось прочитать курсы из Redis: {e}")
+            if self._snapshot is not None:
+                self._memory_until = time.monotonic() + self.memory_ttl
+            return self._snapshot
+
+        if snapshot is None:
+            # снимка нет совсем — ждём разбор (свой или чужой)
+            return await self.refresh()
+        self.remember(snapshot)
+        if is_stale(snapshot, self.fresh_ttl):
+            self._refresh_in_background()
+        return self._snapshot
+
+    def _refresh_in_background(self):
+        # не чаще раза в memory_ttl: если обновляет другой процесс, его снимок придёт со следующим чтением Redis
+        if time.monotonic() < self._refresh_after or (self._refresh_task and not self._refresh_task.done()):
+            return
+        self._refresh_after = time.monotonic() + self.memory_ttl
+        self._refresh_task = asyncio.create_task(self._background_refresh())
+
+    async def _background_refresh(self):
+        try:
+            await self._refresh_once(wait=False)
+        except Exception as e:
+            logger.error(f"[rates_cache] Ошибка фонового обновления курсов: {e}")
+
+    async def refresh(self) -> Optional[dict]:
+        """Обновляет снимок сейчас (если обновляет другой процесс — ждёт его результат)"""
+        return await self._flight.do("refresh", lambda: self._refresh_once(wait=True))
+
+    async def _refresh_once(self, wait: bool) -> Optional[dict]:
+        redis_client = get_async_redis()
+        token = new_lock_token()
+        try:
+            locked = await redis_client.set(RATES_LOCK_KEY, token, nx=True, ex=RATES_REFRESH_LOCK_TTL)
+        except Exception as e:
+            logger.error(f"[rates_cache] Redis недоступен для обновления курсов: {e}")
+            return self._snapshot
+
+        if not locked:
+            return await self._wait_for_other() if wait else self._snapshot
+
+        try:
+            rates = await self.refresher()
+        except Exception as e:
+            logger.error(f"[rates_cache] Ошибка разбора курсов: {e}")
+            rates = None
+        if not rates:
+            # lock остаётся до истечения TTL (следующий разбор не раньше, чем через
+            # RATES_REFRESH_LOCK_TTL), а ждущие по метке понимают, что ждать нечего
+            logger.warning("[rates_cache] Курсы не получены, отдаю последний снимок")
+            await redis_client.set(RATES_LOCK_KEY, LOCK_FAILED, xx=True, keepttl=True)
+            return self._snapshot
+        try:
+            return await self.store(rates)
+        finally:
+            await release_lock(redis_client, RATES_LOCK_KEY, token)
+
+    async def _wait_for_other(self) -> Optional[dict]:
+        """Ждёт снимок от процесса, который держит lock (до RATES_COLD_WAIT)"""
+        known = self._snapshot["version"] if self._snapshot else -1
+        deadline = time.monotonic() + RATES_COLD_WAIT
+        while time.monotonic() < deadline:
+            # снимок пишется до снятия lock: если lock уже снят, прочитанный после — окончательный
+            holder = await get_async_redis().get(RATES_LOCK_KEY)
+            snapshot = decode_snapshot(await get_async_redis().get(RATES_KEY))
+            if snapshot is not None and snapshot["version"] > known:
+                self.remember(snapshot)
+                return self._snapshot
+            if holder == INGEST_HOLDER:
+                # курсы приносит rates_ingest по событиям канала — разбора, которого стоит ждать, нет
+                self._memory_until = time.monotonic() + self.memory_ttl
+                return self._snapshot
+            if holder is None or holder == LOCK_FAILED:
+                break
+            await asyncio.sleep(0.25)
+        return self._snapshot
+
+    async def store(self, rates: Dict[str, Dict]) -> dict:
+        """Записывает новые курсы в Redis следующей версией и кладёт в память"""
+        redis_client = get_async_redis()
+        snapshot = {
+            "version": int(await redis_client.incr(RATES_VERSION_KEY)),
+            "fetched_at": time.time(),
+            "rates": rates,
+        }
+        payload = json.dumps(snapshot)
+        await redis_client.set(RATES_KEY, payload, ex=RATES_STALE_TTL)
+        await redis_client.publish(RATES_UPDATES_CHANNEL, payload)
+        self.remember(snapshot)
+        logger.info(f"[rates_cache] Курсы обновлены, версия {snapshot['version']}")
+        return snapshot
+
+    async def listen(self):
+        """Подписка на новые снимки: копия в памяти обновляется без запросов к Redis на пути хендлеров"""
+        while True:
+            pubsub = get_async_redis().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(RATES_UPDATES_CHANNEL)
+                # снимки, опубликованные до подписки, подхватит следующее чтение Redis
+                self._memory_until = 0.0
+                while True:
+                    message = await pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    snapshot = json.loads(message["data"])
+                    if self.remember(snapshot):
+                        logger.info(f"[rates_cache] Получены курсы версии {snapshot['version']}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[rates_cache] Подписка на курсы прервана: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
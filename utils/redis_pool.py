@@ -0,0 +1,296 @@
+import asyncio
+import bisect
+import secrets
+import threading
+import time
+import weakref
+from typing import Dict, Optional, Tuple
+
+import redis
+from redis.asyncio import Redis as AsyncRedis
+from redis.asyncio import BlockingConnectionPool as AsyncBlockingConnectionPool
+from redis.asyncio.client import Pipeline as AsyncPipeline
+from redis.client import Pipeline
+
+from config import (
+    REDIS_URL, REDIS_DB, REDIS_MAX_CONNECTIONS, REDIS_POOL_TIMEOUT, REDIS_SOCKET_TIMEOUT, REDIS_SLOW_MS,
+    REDIS_STATS_INTERVAL, logger
+)
+
+# Единая точка доступа к Redis. Пулы настраиваются здесь один раз из REDIS_URL/REDIS_DB*:
+#   get_redis(db)       — sync клиент на процесс (задачи Celery, код в asyncio.to_thread);
+#   get_async_redis(db) — async клиент на event loop (соединения привязаны к loop).
+# В корутинах — только get_async_redis: sync клиент блокирует весь loop на время запроса.
+# Пулы ограничены REDIS_MAX_CONNECTIONS: при нехватке соединений команда ждёт
+# свободное (до REDIS_POOL_TIMEOUT), а не открывает новое. Каждая команда и pipeline
+# замеряются — занятость пулов и задержки отдаёт redis_stats().
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Lock в Redis: SET key <токен> NX EX ttl. Снять или продлить его может только
+# владелец токена — lock, истёкший и взятый другим процессом, не трогаем.
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+_EXTEND_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+class _Latency:
+    """Задержки команд одной базы: счётчики и гистограмма по LATENCY_BUCKETS_MS"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, label: str, command, elapsed_ms: float, failed: bool):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+        if elapsed_ms >= REDIS_SLOW_MS:
+            logger.warning(f"[redis_pool] {label}: медленная команда {command} — {elapsed_ms:.0f} мс")
+
+    def _percentile(self, q: float) -> float:
+        """Верхняя граница корзины, в которую попадает q-й перцентиль"""
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return float(min(bound, round(self.max_ms, 1)))
+        return round(self.max_ms, 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            if not self.calls:
+                return {"calls": 0, "errors": 0}
+            return {
+                "calls": self.calls,
+                "errors": self.errors,
+                "avg_ms": round(self.total_ms / self.calls, 2),
+                "p50_ms": self._percentile(0.5),
+                "p99_ms": self._percentile(0.99),
+                "max_ms": round(self.max_ms, 1),
+            }
+
+
+_latency: Dict[str, _Latency] = {}
+_latency_lock = threading.Lock()
+
+
+def _latency_for(label: str) -> _Latency:
+    with _latency_lock:
+        if label not in _latency:
+            _latency[label] = _Latency()
+        return _latency[label]
+
+
+def _label(kind: str, db) -> str:
+    return f"{kind}:db{db}" if db is not None else f"{kind}:default"
+
+
+class _SyncPool(redis.BlockingConnectionPool):
+    label = "sync"
+    latency: _Latency
+
+    def usage(self) -> Tuple[int, int]:
+        """(занято, свободно) соединений"""
+        available = sum(1 for connection in list(self.pool.queue) if connection is not None)
+        return len(self._connections) - available, available
+
+
+class _AsyncPool(AsyncBlockingConnectionPool):
+    label = "async"
+    latency: _Latency
+
+    def usage(self) -> Tuple[int, int]:
+        return len(self._in_use_connections), len(self._available_connections)
+
+
+class _MeteredPipeline(Pipeline):
+    def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(raise_on_error)
+            failed = False
+            return result
+        finally:
+            pool = self.connection_pool
+            pool.latency.record(pool.label, "PIPELINE", (time.perf_counter() - started) * 1000, failed)
+
+
+class _MeteredRedis(redis.Redis):
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute_command(*args, **options)
+            failed = False
+            return result
+        finally:
+            pool = self.connection_pool
+            pool.latency.record(pool.label, args[0], (time.perf_counter() - started) * 1000, failed)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> Pipeline:
+        return _MeteredPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class _MeteredAsyncPipeline(AsyncPipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await super().execute(raise_on_error)
+            failed = False
+            return result
+        finally:
+            pool = self.connection_pool
+            pool.latency.record(pool.label, "PIPELINE", (time.perf_counter() - started) * 1000, failed)
+
+
+class _MeteredAsyncRedis(AsyncRedis):
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = await super().execute_command(*args, **options)
+            failed = False
+            return result
+        finally:
+            pool = self.connection_pool
+            pool.latency.record(pool.label, args[0], (time.perf_counter() - started) * 1000, failed)
+
+    def pipeline(self, transaction=True, shard_hint=None) -> AsyncPipeline:
+        return _MeteredAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def _pool_kwargs(db, decode: bool) -> dict:
+    return {
+        "db": db,
+        "decode_responses": decode,
+        "socket_timeout": REDIS_SOCKET_TIMEOUT,
+        "max_connections": REDIS_MAX_CONNECTIONS,
+        "timeout": REDIS_POOL_TIMEOUT,
+    }
+
+
+# sync: по клиенту на (db, decode) в процессе; async: то же, но на каждый event loop
+_sync_clients: Dict[Tuple[Optional[str], bool], redis.Redis] = {}
+_sync_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[tuple, AsyncRedis]]" = weakref.WeakKeyDictionary()
+_async_pools: "weakref.WeakSet[_AsyncPool]" = weakref.WeakSet()
+
+
+def get_redis(db=REDIS_DB, decode: bool = True) -> redis.Redis:
+    """Sync клиент базы db (общий пул процесса). Из корутин не вызывать — только через asyncio.to_thread"""
+    key = (db, decode)
+    client = _sync_clients.get(key)
+    if client is None:
+        with _sync_lock:
+            client = _sync_clients.get(key)
+            if client is None:
+                pool = _SyncPool.from_url(REDIS_URL, **_pool_kwargs(db, decode))
+                pool.label = _label("sync", db)
+                pool.latency = _latency_for(pool.label)
+                client = _MeteredRedis(connection_pool=pool)
+                _sync_clients[key] = client
+    return client
+
+
+def new_async_redis(db=REDIS_DB, decode: bool = True) -> AsyncRedis:
+    """
+    Отдельный async клиент со своим пулом — для владельцев, которые сами его
+    закрывают (RedisStorage бота). Создавать можно и до запуска event loop.
+    """
+    pool = _AsyncPool.from_url(REDIS_URL, **_pool_kwargs(db, decode))
+    pool.label = _label("async", db)
+    pool.latency = _latency_for(pool.label)
+    _async_pools.add(pool)
+    return _MeteredAsyncRedis(connection_pool=pool)
+
+
+def get_async_redis(db=REDIS_DB, decode: bool = True) -> AsyncRedis:
+    """Async клиент базы db, общий для текущего event loop; закрывает close_async_redis()"""
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        clients = _async_clients[loop] = {}
+    key = (db, decode)
+    client = clients.get(key)
+    if client is None:
+        client = clients[key] = new_async_redis(db, decode)
+    return client
+
+
+async def close_async_redis():
+    """Закрывает async клиенты текущего event loop (при остановке воркера)"""
+    clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.aclose(close_connection_pool=True)
+
+
+def redis_stats() -> Dict[str, dict]:
+    """
+    {база: занятость пулов и задержки}, например
+    {"async:db0": {"pools": 2, "in_use": 1, "available": 4, "max_per_pool": 50, "calls": 1200, "p99_ms": 5.0, ...}}
+    """
+    pools = [client.connection_pool for client in list(_sync_clients.values())] + list(_async_pools)
+    stats: Dict[str, dict] = {}
+    for pool in pools:
+        in_use, available = pool.usage()
+        entry = stats.setdefault(pool.label, {"pools": 0, "in_use": 0, "available": 0, "max_per_pool": pool.max_connections})
+        entry["pools"] += 1
+        entry["in_use"] += in_use
+        entry["available"] += available
+    with _latency_lock:
+        latencies = dict(_latency)
+    for label, latency in latencies.items():
+        stats.setdefault(label, {"pools": 0, "in_use": 0, "available": 0}).update(latency.snapshot())
+    return stats
+
+
+_last_stats_log = 0.0
+
+
+def log_redis_stats(force: bool = False):
+    """Пишет redis_stats() в лог не чаще раза в REDIS_STATS_INTERVAL секунд"""
+    global _last_stats_log
+    now = time.monotonic()
+    if not force and (REDIS_STATS_INTERVAL <= 0 or now - _last_stats_log < REDIS_STATS_INTERVAL):
+        return
+    _last_stats_log = now
+    for label, entry in sorted(redis_stats().items()):
+        logger.info(f"[redis_pool] {label}: {entry}")
+
+
+def new_lock_token() -> str:
+    return secrets.token_hex(8)
+
+
+def release_lock(client, key: str, token: str):
+    """
+    Снимает lock, если он всё ещё принадлежит token. Подходит для sync и async
+    клиента и для pipeline (у async клиента результат нужно await).
+    """
+    return client.eval(_RELEASE_LOCK_LUA, 1, key, token)
+
+
+def extend_lock(client, key: str, token: str, ttl: int):
+    """Продлевает свой lock на ttl секунд; 0 — lock уже не наш"""
+    return client.eval(_EXTEND_LOCK_LUA, 1, key, token, int(ttl))
@@ -0,0 +1,147 @@
+import re
+from typing import Dict, Iterable, Optional
+
+from gspread.utils import rowcol_to_a1
+
+from config import logger
+from utils.redis_pool import get_redis
+from utils.sheets_client import get_worksheet
+
+# Индекс «хеш транзакции -> номер строки» по листам (Redis hash на лист)
+ROW_INDEX_KEY = 'sheets:row_index:{sheet}'
+
+# Колонка с хешем транзакции в листах, которые обновляются по хешу
+HASH_COLUMNS = {'Лист4': 2}
+
+_RANGE_ROWS_RE = re.compile(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+
+r = get_redis()
+
+
+def _key(sheet_name: str) -> str:
+    return ROW_INDEX_KEY.format(sheet=sheet_name)
+
+
+def first_row_from_response(response: dict) -> Optional[int]:
+    """
+    Номер первой строки, в которую легло добавление
+    (из updates.updatedRange ответа values:append, например "'Лист4'!A12:H13").
+    """
+    try:
+        updated_range = response["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    match = _RANGE_ROWS_RE.search(updated_range)
+    return int(match.group(1)) if match else None
+
+
+def get_rows(sheet_name: str, tx_hashes: Iterable[str]) -> Dict[str, int]:
+    """Строки для известных хешей (неизвестные не попадают в результат)"""
+    tx_hashes = list(tx_hashes)
+    if not tx_hashes:
+        return {}
+    try:
+        rows = r.hmget(_key(sheet_name), tx_hashes)
+    except Exception as e:
+        logger.warning(f"[row_index] Redis недоступен: {e}")
+        return {}
+    return {h: int(row) for h, row in zip(tx_hashes, rows) if row}
+
+
+def record_rows(sheet_name: str, rows: Dict[str, int]):
+    if not rows:
+        return
+    try:
+        r.hset(_key(sheet_name), mapping=rows)
+    except Exception as e:
+        logger.warning(f"[row_index] Не удалось сохранить индекс строк: {e}")
+
+
+def record_appended(sheet_name: str, tx_hashes: list, response: dict):
+    """
+    Запоминает строки после append_rows: строки идут подряд с первой,
+    tx_hashes — хеши в порядке добавления (None для строк без хеша).
+    """
+    first_row = first_row_from_response(response)
+    if first_row is None:
+        return
+    record_rows(sheet_name, {h: first_row + i for i, h in enumerate(tx_hashes) if h})
+
+
+def scan_rows(sheet_name: str, tx_hashes: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """
+    Одно чтение колонки хешей листа. Возвращает строки для tx_hashes
+    (или для всех хешей листа) и сразу дописывает их в индекс.
+    """
+    sheet = get_worksheet(sheet_name)
+    values = sheet.col_values(HASH_COLUMNS.get(sheet_name, 2))
+    wanted = set(tx_hashes) if tx_hashes is not None else None
+    rows = {}
+    for idx, value in enumerate(values, start=1):
+        if not value:
+            continue
+        value = str(value)
+        if wanted is None or value in wanted:
+            # первая строка с хешем — как у sheet.find
+            rows.setdefault(value, idx)
+    record_rows(sheet_name, rows)
+    return rows
+
+
+def forget_rows(sheet_name: str, tx_hashes: Iterable[str]):
+    tx_hashes = list(tx_hashes)
+    if not tx_hashes:
+        return
+    try:
+        r.hdel(_key(sheet_name), *tx_hashes)
+    except Exception as e:
+        logger.warning(f"[row_index] Не удалось удалить строки из индекса: {e}")
+
+
+def _verified(sheet_name: str, rows: Dict[str, int]) -> Dict[str, int]:
+    """
+    Сверяет строки из индекса с листом одним batch_get ячеек хеша: после ручной
+    сортировки или удаления строк в ячейке окажется другой хеш. Такие записи
+    удаляются из индекса, и их строки ищутся заново.
+    """
+    if not rows:
+        return rows
+    col = HASH_COLUMNS.get(sheet_name, 2)
+    items = list(rows.items())
+    cells = get_worksheet(sheet_name).batch_get([rowcol_to_a1(row, col) for _, row in items])
+    stale = [h for (h, _), cell in zip(items, cells) if not cell or not cell[0] or str(cell[0][0]) != h]
+    if stale:
+        logger.warning(f"[row_index] Индекс '{sheet_name}' устарел для {len(stale)} хешей, ищу строки заново")
+        forget_rows(sheet_name, stale)
+    return {h: row for h, row in rows.items() if h not in stale}
+
+
+def resolve_rows(sheet_name: str, tx_hashes: Iterable[str], verify: bool = True) -> Dict[str, int]:
+    """
+    Строки из индекса (сверенные с листом, если verify), а для промахов —
+    одно чтение колонки хешей.
+    """
+    tx_hashes = list(dict.fromkeys(tx_hashes))
+    rows = get_rows(sheet_name, tx_hashes)
+    if verify:
+        rows = _verified(sheet_name, rows)
+    missing = [h for h in tx_hashes if h not in rows]
+    if missing:
+        rows.update(scan_rows(sheet_name, missing))
+    return rows
+
+
+def backfill(sheet_name: str = 'Лист4') -> int:
+    """
+    Разовая индексация уже существующих строк листа (индекс пересобирается с нуля).
+    После ручной сортировки/удаления строк не обязательна: resolve_rows сверяет
+    строки с листом и сам находит сдвинутые.
+    """
+    rows = scan_rows(sheet_name)
+    pipe = r.pipeline()
+    pipe.delete(_key(sheet_name))
+    if rows:
+        pipe.hset(_key(sheet_name), mapping=rows)
+    pipe.execute()
+    logger.info(f"[row_index] Проиндексировано строк в '{sheet_name}': {len(rows)}")
+    return len(rows)
@@ -0,0 +1,92 @@
+import os
+import threading
+from typing import Dict, Optional
+
+import gspread
+from oauth2client.service_account import ServiceAccountCredentials
+
+from config import GOOGLE_CREDENTIALS, logger
+
+# Основная таблица бота (кошельки, транзакции, заявки, комиссии, курсы)
+SPREADSHEET_KEY = '1qUhwJPPDJE-NhcHoGQsIRebSCm_gE8H6K7XSKxGVcIo'
+
+SCOPES = ['https://spreadsheets.google.com/feeds',
+          'https://www.googleapis.com/auth/drive']
+
+
+class SheetsClient:
+    """
+    Общий на процесс клиент Google Sheets.
+
+    Авторизуется один раз и держит клиент, таблицу и листы открытыми.
+    Токен обновляется самим gspread (google-auth AuthorizedSession) только
+    когда он истёк, поэтому обычный запрос к листу — это один HTTP вызов.
+    После fork (prefork-воркеры Celery) клиент создаётся заново, чтобы
+    процессы не делили одно HTTP-соединение.
+    """
+
+    def __init__(self, credentials_info: dict, spreadsheet_key: str = SPREADSHEET_KEY):
+        self.credentials_info = credentials_info
+        self.spreadsheet_key = spreadsheet_key
+        self._lock = threading.RLock()
+        self._pid: Optional[int] = None
+        self._client: Optional[gspread.Client] = None
+        self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+
+    def _check_pid(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            if self._pid is not None:
+                logger.info(f"[sheets] fork обнаружен ({self._pid} -> {pid}), пересоздаю клиент")
+            self._pid = pid
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+
+    def client(self) -> gspread.Client:
+        with self._lock:
+            self._check_pid()
+            if self._client is None:
+                creds = ServiceAccountCredentials.from_json_keyfile_dict(self.credentials_info, SCOPES)
+                self._client = gspread.authorize(creds)
+                logger.info("[sheets] Клиент Google Sheets авторизован")
+            return self._client
+
+    def spreadsheet(self) -> gspread.Spreadsheet:
+        with self._lock:
+            client = self.client()
+            if self._spreadsheet is None:
+                self._spreadsheet = client.open_by_key(self.spreadsheet_key)
+            return self._spreadsheet
+
+    def worksheet(self, title: str) -> gspread.Worksheet:
+        """Возвращает закэшированный лист по названию"""
+        with self._lock:
+            spreadsheet = self.spreadsheet()
+            sheet = self._worksheets.get(title)
+            if sheet is None:
+                sheet = spreadsheet.worksheet(title)
+                self._worksheets[title] = sheet
+            return sheet
+
+    def invalidate(self, title: Optional[str] = None):
+        """
+        Сбрасывает закэшированные дескрипторы: один лист или всё сразу
+        (например, если лист переименовали или удалили).
+        """
+        with self._lock:
+            if title is not None:
+                self._worksheets.pop(title, None)
+                return
+            self._client = None
+            self._spreadsheet = None
+            self._worksheets = {}
+
+
+# Глобальный экземпляр (один на процесс: бот или воркер Celery)
+sheets_client = SheetsClient(GOOGLE_CREDENTIALS)
+
+
+def get_worksheet(title: str) -> gspread.Worksheet:
+    return sheets_client.worksheet(title)
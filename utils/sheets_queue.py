@@ -0,0 +1,321 @@
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import requests
+from gspread.exceptions import APIError
+from gspread.utils import rowcol_to_a1
+
+from config import (
+    SHEETS_FLUSH_INTERVAL, SHEETS_FLUSH_BATCH_SIZE, SHEETS_FLUSH_MAX_ITEMS,
+    SHEETS_FLUSH_MAX_ATTEMPTS, logger
+)
+from utils.sheets_client import get_worksheet
+from utils import row_index
+from utils.redis_pool import get_redis, get_async_redis, new_lock_token, release_lock, extend_lock
+
+# Очередь отложенной записи в Google Sheets (Redis list, FIFO)
+QUEUE_KEY = 'sheets:write_queue'
+DEAD_LETTER_KEY = 'sheets:write_queue:dead'
+FLUSH_LOCK_KEY = 'sheets:flush_lock'
+FLUSH_PAUSE_KEY = 'sheets:flush_paused'
+FLUSH_ATTEMPTS_KEY = 'sheets:flush_attempts'
+FLUSH_TRIGGER_KEY = 'sheets:flush_triggered'
+
+FLUSH_LOCK_TTL = 120
+BACKOFF_BASE = 5
+BACKOFF_MAX = 300
+
+TRANSACTIONS_SHEET = 'Лист4'
+
+r = get_redis()
+
+# Очередь выгружает Celery beat (tasks.flush_sheets_queue); без Celery — run_flusher
+# в боте и verifier.py, а внеочередной flush идёт в отдельном потоке
+try:
+    from celery_app import celery_app
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+
+
+def _append_item(sheet_name: str, row: list, tx_hash: Optional[str] = None) -> dict:
+    return {"op": "append", "sheet": sheet_name, "row": row, "tx_hash": tx_hash}
+
+
+def _update_item(tx_hash: str, updates: Dict[str, list], sheet_name: str = TRANSACTIONS_SHEET) -> dict:
+    # updates: {"status": [значение, номер_колонки], ...} — как google_update_params
+    return {"op": "update", "sheet": sheet_name, "tx_hash": tx_hash, "updates": updates}
+
+
+def _trigger_flush_if_needed(queue_len: int):
+    """Запускает внеочередной flush, если очередь доросла до порога"""
+    if queue_len < SHEETS_FLUSH_BATCH_SIZE:
+        return
+    try:
+        if r.set(FLUSH_TRIGGER_KEY, 1, nx=True, ex=2):
+            if CELERY_AVAILABLE:
+                celery_app.send_task("tasks.flush_sheets_queue")
+            else:
+                threading.Thread(target=_flush_logged, name="sheets-flush", daemon=True).start()
+    except Exception as e:
+        logger.warning(f"[sheets_queue] Не удалось запустить flush: {e}")
+
+
+def _enqueue(item: dict) -> bool:
+    try:
+        queue_len = r.rpush(QUEUE_KEY, json.dumps(item, ensure_ascii=False, default=str))
+    except Exception as e:
+        # Redis недоступен — пишем напрямую, чтобы не потерять запись
+        logger.error(f"[sheets_queue] Redis недоступен, пишу в таблицу напрямую: {e}")
+        try:
+            _apply_items([item])
+            return True
+        except Exception as e:
+            logger.error(f"[sheets_queue] Прямая запись не удалась: {e}")
+            return False
+    _trigger_flush_if_needed(queue_len)
+    return True
+
+
+async def _aenqueue(item: dict) -> bool:
+    try:
+        queue_len = await get_async_redis().rpush(QUEUE_KEY, json.dumps(item, ensure_ascii=False, default=str))
+    except Exception as e:
+        logger.error(f"[sheets_queue] Redis недоступен, пишу в таблицу напрямую: {e}")
+        try:
+            await asyncio.to_thread(_apply_items, [item])
+            return True
+        except Exception as e:
+            logger.error(f"[sheets_queue] Прямая запись не удалась: {e}")
+            return False
+    if queue_len >= SHEETS_FLUSH_BATCH_SIZE:
+        await asyncio.to_thread(_trigger_flush_if_needed, queue_len)
+    return True
+
+
+def enqueue_append(sheet_name: str, row: list, tx_hash: Optional[str] = None) -> bool:
+    """Ставит в очередь добавление строки в лист"""
+    return _enqueue(_append_item(sheet_name, row, tx_hash))
+
+
+def enqueue_update(tx_hash: str, updates: Dict[str, list], sheet_name: str = TRANSACTIONS_SHEET) -> bool:
+    """Ставит в очередь обновление колонок строки транзакции"""
+    return _enqueue(_update_item(tx_hash, updates, sheet_name))
+
+
+async def aenqueue_append(sheet_name: str, row: list, tx_hash: Optional[str] = None) -> bool:
+    return await _aenqueue(_append_item(sheet_name, row, tx_hash))
+
+
+async def aenqueue_update(tx_hash: str, updates: Dict[str, list], sheet_name: str = TRANSACTIONS_SHEET) -> bool:
+    return await _aenqueue(_update_item(tx_hash, updates, sheet_name))
+
+
+def _append_sheet(sheet_name: str, sheet_items: List[dict]):
+    response = get_worksheet(sheet_name).append_rows(
+        [i["row"] for i in sheet_items], value_input_option='USER_ENTERED'
+    )
+    # Запоминаем строки транзакций для последующих обновлений
+    row_index.record_appended(sheet_name, [i.get("tx_hash") for i in sheet_items], response)
+    logger.info(f"[sheets_queue] Добавлено строк в '{sheet_name}': {len(sheet_items)}")
+
+
+def _apply_appends(items: List[dict]):
+    items_by_sheet: "OrderedDict[str, list]" = OrderedDict()
+    for item in items:
+        items_by_sheet.setdefault(item["sheet"], []).append(item)
+
+    for sheet_name, sheet_items in items_by_sheet.items():
+        _append_sheet(sheet_name, sheet_items)
+
+
+def _apply_updates(items: List[dict]):
+    # Склеиваем обновления: по каждой (лист, хеш, колонка) побеждает последнее значение
+    merged: "OrderedDict[tuple, Dict[int, object]]" = OrderedDict()
+    for item in items:
+        cols = merged.setdefault((item["sheet"], item["tx_hash"]), {})
+        for value, col in item["updates"].values():
+            cols[int(col)] = value
+
+    by_sheet: "OrderedDict[str, list]" = OrderedDict()
+    for (sheet_name, tx_hash), cols in merged.items():
+        by_sheet.setdefault(sheet_name, []).append((tx_hash, cols))
+
+    for sheet_name, entries in by_sheet.items():
+        sheet = get_worksheet(sheet_name)
+        # Строки из индекса; колонку хешей читаем только для промахов
+        row_by_hash = row_index.resolve_rows(sheet_name, [tx_hash for tx_hash, _ in entries])
+
+        data = []
+        for tx_hash, cols in entries:
+            row = row_by_hash.get(tx_hash)
+            if not row:
+                logger.warning(f"[sheets_queue] Транзакция {tx_hash} не найдена в '{sheet_name}', пропускаю")
+                continue
+            for col, value in cols.items():
+                data.append({"range": rowcol_to_a1(row, col), "values": [[value]]})
+
+        if data:
+            sheet.batch_update(data, value_input_option='USER_ENTERED')
+            logger.info(f"[sheets_queue] Обновлено ячеек в '{sheet_name}': {len(data)}")
+
+
+def _apply_items(items: List[dict]):
+    """
+    Применяет пачку: сначала все добавления, потом обновления.
+    Строка транзакции всегда ставится в очередь раньше её обновлений,
+    поэтому порядок по каждому хешу сохраняется.
+    """
+    appends = [i for i in items if i.get("op") == "append"]
+    updates = [i for i in items if i.get("op") == "update"]
+    if appends:
+        _apply_appends(appends)
+    if updates:
+        _apply_updates(updates)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, APIError):
+        status = getattr(error.response, "status_code", None) or error.code
+        return status == 429 or (isinstance(status, int) and status >= 500)
+    # повторяем только сетевые ошибки и таймауты; битый элемент, неизвестный лист,
+    # неверная строка (KeyError, WorksheetNotFound, TypeError...) — фатально
+    return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, OSError))
+
+
+def _pause_flush():
+    attempt = r.incr(FLUSH_ATTEMPTS_KEY)
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    r.set(FLUSH_PAUSE_KEY, 1, ex=int(delay))
+    logger.warning(f"[sheets_queue] Пауза записи на {delay}с (попытка {attempt})")
+    return attempt
+
+
+def _replace_head(pipe, head_count: int, remaining: List[str]):
+    """Снимает head_count элементов пачки из головы очереди и возвращает туда remaining в том же порядке"""
+    pipe.ltrim(QUEUE_KEY, head_count, -1)
+    if remaining:
+        pipe.lpush(QUEUE_KEY, *reversed(remaining))
+
+
+def _settle(head_count: int, pending: List[tuple]) -> int:
+    """Оставляет в голове очереди только ещё не записанные элементы пачки; возвращает их число"""
+    pipe = r.pipeline()
+    _replace_head(pipe, head_count, [raw for raw, _ in pending])
+    pipe.execute()
+    return len(pending)
+
+
+def flush_queue(max_items: int = SHEETS_FLUSH_MAX_ITEMS) -> int:
+    """
+    Выгружает очередь в Google Sheets: один append_rows на лист и один batch_update.
+    Работает только один flusher одновременно (Redis lock, продлевается перед
+    каждым запросом к таблице). Записанная часть снимается из очереди сразу,
+    поэтому повтор после ошибки не дописывает строки ещё раз.
+    Возвращает количество записанных элементов.
+    """
+    if r.exists(FLUSH_PAUSE_KEY):
+        return 0
+    token = new_lock_token()
+    if not r.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL):
+        return 0
+
+    def still_owner() -> bool:
+        if extend_lock(r, FLUSH_LOCK_KEY, token, FLUSH_LOCK_TTL):
+            return True
+        logger.error("[sheets_queue] Lock записи потерян, останавливаю flush")
+        return False
+
+    try:
+        raw_items = r.lrange(QUEUE_KEY, 0, max_items - 1)
+        if not raw_items:
+            return 0
+
+        # (raw, item) в порядке очереди; битые и неизвестные элементы снимаются с первой записанной частью
+        pending = []
+        for raw in raw_items:
+            try:
+                item = json.loads(raw)
+            except ValueError:
+                logger.error(f"[sheets_queue] Битый элемент очереди: {raw}")
+                continue
+            if item.get("op") in ("append", "update"):
+                pending.append((raw, item))
+        head_count = len(raw_items)
+        written = 0
+
+        appends_by_sheet: "OrderedDict[str, list]" = OrderedDict()
+        for entry in pending:
+            if entry[1]["op"] == "append":
+                appends_by_sheet.setdefault(entry[1].get("sheet"), []).append(entry)
+
+        for sheet_name, entries in appends_by_sheet.items():
+            if not still_owner():
+                return written
+            try:
+                _append_sheet(sheet_name, [item for _, item in entries])
+            except Exception as e:
+                _handle_flush_error(e, head_count, pending, entries)
+                return written
+            # Лист записан: снимаем его элементы, остальное остаётся в голове очереди
+            done_ids = {id(entry) for entry in entries}
+            pending = [entry for entry in pending if id(entry) not in done_ids]
+            head_count = _settle(head_count, pending)
+            written += len(entries)
+
+        # остались только обновления
+        if pending:
+            if not still_owner():
+                return written
+            try:
+                _apply_updates([item for _, item in pending])
+            except Exception as e:
+                _handle_flush_error(e, head_count, pending, pending)
+                return written
+            written += len(pending)
+
+        _settle(head_count, [])
+        r.delete(FLUSH_ATTEMPTS_KEY)
+        return written
+    finally:
+        release_lock(r, FLUSH_LOCK_KEY, token)
+
+
+def _handle_flush_error(error: Exception, head_count: int, pending: List[tuple], failed: List[tuple]):
+    """
+    pending — элементы пачки, которые сейчас в голове очереди (head_count штук вместе с битыми),
+    failed — те из них, на которых запись упала.
+    """
+    retryable = _is_retryable(error)
+    logger.error(f"[sheets_queue] Ошибка записи в таблицу ({'повторим' if retryable else 'фатально'}): {error}")
+    attempt = _pause_flush()
+    if not retryable and attempt >= SHEETS_FLUSH_MAX_ATTEMPTS:
+        # Не даём одной «ядовитой» пачке заблокировать очередь навсегда
+        failed_ids = {id(entry) for entry in failed}
+        pipe = r.pipeline()
+        pipe.rpush(DEAD_LETTER_KEY, *[raw for raw, _ in failed])
+        _replace_head(pipe, head_count, [entry[0] for entry in pending if id(entry) not in failed_ids])
+        pipe.delete(FLUSH_ATTEMPTS_KEY, FLUSH_PAUSE_KEY)
+        pipe.execute()
+        logger.error(f"[sheets_queue] {len(failed)} элементов перенесено в {DEAD_LETTER_KEY}")
+
+
+def _flush_logged() -> int:
+    try:
+        written = flush_queue()
+        if written:
+            logger.info(f"[sheets_queue] Записано элементов: {written}")
+        return written
+    except Exception as e:
+        logger.error(f"[sheets_queue] Ошибка выгрузки очереди: {e}")
+        return 0
+
+
+async def run_flusher(interval: float = SHEETS_FLUSH_INTERVAL):
+    """Постоянная выгрузка очереди (для процессов без Celery beat: бот без Celery, verifier.py)"""
+    while True:
+        await asyncio.to_thread(_flush_logged)
+        await asyncio.sleep(interval)
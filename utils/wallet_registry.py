@@ -0,0 +1,146 @@
+import asyncio
+import time
+from typing import Dict, Optional
+
+from config import WALLET_REFRESH_INTERVAL, logger
+from utils.redis_pool import get_redis
+from utils.sheets_client import get_worksheet
+
+WALLET_SHEET = 'Лист3'
+REDIS_WALLETS_KEY = 'wallet_addresses'
+SHEET_FALLBACK_INTERVAL = 60   # промах в снимке: лист перечитывается не чаще раза в столько секунд
+
+
+def _normalize_network(network: str) -> str:
+    return (network or '').strip().upper()
+
+
+class WalletRegistry:
+    """
+    Реестр адресов кошельков по сетям (Лист3).
+
+    Снимок держится в памяти, поиск — обычный dict lookup без I/O.
+    Фоновая asyncio-задача перечитывает лист раз в refresh_interval секунд
+    (в отдельном потоке, чтобы не блокировать event loop) и зеркалит снимок
+    в Redis, откуда его берут воркеры Celery. Если обновление не удалось,
+    продолжаем отдавать последний удачный снимок.
+    """
+
+    def __init__(self, refresh_interval: int = WALLET_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._addresses: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._mirror_read_at: Optional[float] = None
+        self._sheet_retry_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        # sync клиент: из async кода — только через asyncio.to_thread
+        self.redis_client = get_redis()
+
+    def get(self, network: str) -> Optional[str]:
+        """Адрес кошелька для сети из снимка в памяти (None, если нет)"""
+        return self._addresses.get(_normalize_network(network))
+
+    def snapshot(self) -> Dict[str, str]:
+        return dict(self._addresses)
+
+    def _load_from_sheet(self) -> Dict[str, str]:
+        records = get_worksheet(WALLET_SHEET).get_all_records()
+        addresses = {}
+        for row in records:
+            # row[' Сеть'] должно совпадать с названием сети
+            network = _normalize_network(str(row.get(' Сеть', '')))
+            address = row.get('Адрес кошелька')
+            if network and address and network not in addresses:
+                addresses[network] = str(address).strip()
+        return addresses
+
+    def _mirror_to_redis(self, addresses: Dict[str, str]):
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.delete(REDIS_WALLETS_KEY)
+            pipe.hset(REDIS_WALLETS_KEY, mapping=addresses)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"[wallets] Не удалось сохранить адреса в Redis: {e}")
+
+    def _load_from_redis(self) -> Dict[str, str]:
+        try:
+            return self.redis_client.hgetall(REDIS_WALLETS_KEY) or {}
+        except Exception as e:
+            logger.warning(f"[wallets] Не удалось прочитать адреса из Redis: {e}")
+            return {}
+
+    def refresh_sync(self) -> bool:
+        """Перечитывает лист; при ошибке оставляет прежний снимок"""
+        try:
+            addresses = self._load_from_sheet()
+        except Exception as e:
+            logger.error(f"[wallets] Ошибка обновления адресов кошельков: {e}")
+            return False
+
+        if not addresses:
+            logger.warning("[wallets] Лист с адресами пуст, оставляю прежний снимок")
+            return False
+
+        self._addresses = addresses
+        self._loaded_at = time.time()
+        self._mirror_to_redis(addresses)
+        logger.info(f"[wallets] Адреса кошельков обновлены: {sorted(addresses)}")
+        return True
+
+    async def refresh(self) -> bool:
+        return await asyncio.to_thread(self.refresh_sync)
+
+    def lookup(self, network: str) -> Optional[str]:
+        """
+        Синхронный поиск для воркеров Celery: память -> зеркало в Redis -> лист.
+        Зеркало обновляет фоновая задача бота, поэтому снимок в памяти
+        перечитывается из него раз в refresh_interval. Лист на промах читается
+        не чаще раза в SHEET_FALLBACK_INTERVAL секунд.
+        """
+        now = time.monotonic()
+        if self._mirror_read_at is None or now - self._mirror_read_at >= self.refresh_interval:
+            self._mirror_read_at = now
+            mirrored = self._load_from_redis()
+            if mirrored:
+                self._addresses = mirrored
+
+        address = self.get(network)
+        if address or now < self._sheet_retry_at:
+            return address
+
+        self._sheet_retry_at = now + SHEET_FALLBACK_INTERVAL
+        if self.refresh_sync():
+            return self.get(network)
+        return None
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"[wallets] Ошибка в фоновом обновлении: {e}")
+
+    async def start(self):
+        """Первичная загрузка и запуск фонового обновления"""
+        if not await self.refresh():
+            mirrored = await asyncio.to_thread(self._load_from_redis)
+            if mirrored:
+                self._addresses = mirrored
+                logger.info("[wallets] Адреса загружены из зеркала в Redis")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Глобальный экземпляр
+wallet_registry = WalletRegistry()
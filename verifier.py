@@ -0,0 +1,144 @@
+"""
+Asyncio-воркер проверки pending транзакций.
+
+Замена Celery задачи tasks.periodic_check_pending_transactions: берёт те же
+ключи Redis (REDIS_KEY_PREFIX_ERC / REDIS_KEY_PREFIX_TRC) из общего расписания
+pending:due и проверяет наступившие транзакции одновременно на одном event loop,
+без моста поток -> loop.
+Запускать вместо beat-записи "check-pending-every-30s", а не вместе с ней.
+
+Запуск:  python verifier.py
+"""
+import asyncio
+import time
+
+from config import VERIFIER_INTERVAL, VERIFIER_CONCURRENCY, logger
+from networks.eth_watcher import check_erc20_transactions_batch
+from networks.tron_watcher import check_tron_transactions_batch
+from utils.http_session import close_session
+from utils.notifier import close_bot
+from utils.fsm_storage import close_fsm_storage
+from utils.notify_queue import run_sender
+from utils.sheets_queue import run_flusher
+from utils.pending_tx import (
+    PENDING_TTL, tx_hash_from_key, stage_set_for, load_facts, now_kyiv, handle_result,
+    record_error, next_check_delay, schedule, drop, claim_due, backfill_schedule,
+    lease_and_load, release_leases
+)
+from utils.redis_pool import get_async_redis, close_async_redis, log_redis_stats
+
+
+async def verify_once(concurrency: int = VERIFIER_CONCURRENCY) -> dict:
+    """Один обход pending транзакций. Возвращает счётчики итогов"""
+    now = now_kyiv()
+    outcomes = {"confirmed": 0, "failed": 0, "expired": 0, "pending": 0, "error": 0}
+
+    # аренда на каждую транзакцию, затем чтение: занятые другим обработчиком проверим позже
+    leases, loaded = await lease_and_load(await claim_due())
+    try:
+        pending = []
+        for key, tx_data in loaded:
+            if not tx_data.get("username") or not tx_data.get("target_address"):
+                logger.warning(f"[verifier] Пропускаю {key} — нет username/target_address")
+                await drop(key)
+                continue
+            pending.append((key, tx_data))
+        if not pending:
+            return outcomes
+        return await _verify_leased(pending, outcomes, now, concurrency)
+    finally:
+        await release_leases(leases)
+
+
+async def _verify_leased(pending: list, outcomes: dict, now: str, concurrency: int) -> dict:
+    redis_client = get_async_redis()
+
+    erc20 = [(key, tx_data) for key, tx_data in pending if tx_data.get("network") == "ERC20"]
+    trc20 = [(key, tx_data) for key, tx_data in pending if tx_data.get("network") == "TRC20"]
+
+    async def check_trc20():
+        items = [(tx_hash_from_key(key), tx_data["target_address"]) for key, tx_data in trc20]
+        return await check_tron_transactions_batch(items, concurrency) if items else {}
+
+    async def check_erc20():
+        items = [
+            (tx_hash_from_key(key), tx_data["target_address"], stage_set_for(tx_data), load_facts(tx_data))
+            for key, tx_data in erc20
+        ]
+        return await check_erc20_transactions_batch(items, concurrency) if items else {}
+
+    erc20_results, trc20_results = await asyncio.gather(check_erc20(), check_trc20(), return_exceptions=True)
+    if isinstance(erc20_results, Exception):
+        logger.error(f"[verifier] Ошибка пакетной проверки ERC20: {erc20_results}")
+        erc20_results = {}
+    if isinstance(trc20_results, Exception):
+        logger.error(f"[verifier] Ошибка пакетной проверки TRC20: {trc20_results}")
+        trc20_results = {}
+
+    results = {}
+    for key, tx_data in erc20:
+        results[key] = erc20_results.get(tx_hash_from_key(key))
+    for key, tx_data in trc20:
+        results[key] = trc20_results.get(tx_hash_from_key(key))
+
+    async def apply(key, tx_data):
+        result = results.get(key)
+        if result is None:
+            # проверка не отработала — попробуем на следующем обходе
+            await redis_client.expire(key, PENDING_TTL)
+            await schedule(key, next_check_delay())
+            return "error"
+        try:
+            return await handle_result(key, tx_data, result, now)
+        except Exception as e:
+            logger.error(f"[verifier] Ошибка при обработке {key}: {e}")
+            await record_error(key, "internal_error", str(e))
+            return "error"
+
+    for outcome in await asyncio.gather(*(apply(key, tx_data) for key, tx_data in pending)):
+        outcomes[outcome] += 1
+    return outcomes
+
+
+async def run(interval: float = VERIFIER_INTERVAL):
+    logger.info(f"[verifier] Запущен: интервал {interval}с, параллельность {VERIFIER_CONCURRENCY}")
+    # ключи, созданные до появления расписания
+    await backfill_schedule()
+    # уведомления и записи в таблицу из handle_result уходят через очереди — разбираем их здесь же
+    background = [asyncio.create_task(run_sender()), asyncio.create_task(run_flusher())]
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                outcomes = await verify_once()
+                if any(outcomes.values()):
+                    logger.info(f"[verifier] Обход за {time.monotonic() - started:.2f}с: {outcomes}")
+            except Exception as e:
+                logger.error(f"[verifier] Ошибка обхода: {e}")
+            log_redis_stats()
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+    finally:
+        # очереди должны остановиться до закрытия Bot и клиентов Redis в main()
+        for task in background:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+async def main():
+    try:
+        await run()
+    finally:
+        await close_session()
+        await close_bot()
+        await close_fsm_storage()
+        await close_async_redis()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print('👋 Verifier остановлен')